@@ -19,6 +19,7 @@ from server.routers.states import router as states_router
 from server.routers.text import router as text_router
 from server.routers.texts import router as texts_router
 from server.routers.texts import remove_texts
+from swegram_main.pipeline.lib.engine import get_engine
 
 
 # Add Background scheduler to automatically remove expired texts in the database
@@ -29,6 +30,8 @@ scheduler.start()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # load the efselab models before the first annotation request
+    get_engine()
     yield
     scheduler.shutdown()
 
@@ -12,81 +12,15 @@ import glob
 import os
 from codecs import open
 
+from .lexicon import load_lexicon
+
 # Paths to input and output files are given as arguments
 
 
 def enggram_spellcheck(inputFileName, outputFileName):
 
-    current_path = os.path.dirname(os.path.abspath(__file__))
-
-    # Paths to dictionaries are given below:
-    dic = current_path + '/WordNetDictionary'
-    corpus = current_path + '/bnc.mono.en.freqs'
-    wfiles = os.listdir(dic)
-
-    wdict = []
-
-    for w in wfiles:
-        with open(os.path.join(dic, w), 'r', encoding='utf8') as f:
-            if u'exc' in w:
-                for line in f:
-                    if not re.search(u'_', line):
-                        line = line.lower()
-                        line = line.rstrip()
-                        line = line.split(u' ')
-                        for i in line:
-                            wdict.append(i)
-            if u'data' in w:
-                if u'verb' in w:
-                    for line in f:
-                        if not re.search(u'_', line):
-                            line = line.lower()
-                            line = line.split(u' ')
-                            i = line[4]
-                            wdict.append(i)
-    #                    wdict.append(i+'s')
-    #                    if i[-1] == 'e':
-    #                        wdict.append(i[0:-1]+'ing')
-    #                        wdict.append(i[0:-1]+'ed')
-    #                    else:
-    #                        wdict.append(i+'ing')
-    #                        wdict.append(i+'ed')
-                if u'noun' in w:
-                    for line in f:
-                        if not re.search(u'_', line):
-                            line = line.lower()
-                            line = line.split(u' ')
-                            i = line[4]
-                            wdict.append(i)
-    #                    wdict.append(i+'s')
-                else:
-                    for line in f:
-                        if not re.search(u'_', line):
-                            line = line.lower()
-                            line = line.split(u' ')
-                            i = line[4]
-                            wdict.append(i)
-
-    wdictset = set(wdict)
-    wdicts = list(wdictset)
-
-    wdictfreq = {}
-    for word in wdicts:
-        wdictfreq[word] = 0
-
-    #wdictfreq[''] = 0
-    #wdictfreq['<'] = 0
-    #wdictfreq['>'] = 0
-    #wdictfreq["''"] = 0
-    #wdictfreq["``"] = 0
-    #wdictfreq['/title'] = 0
-
-    with open(corpus, 'r', encoding='utf8') as g:
-        for line in g:
-            lineMatch = re.search(r'^\s*(\d+)\s+(.+?)\s*$', line)
-            freq = lineMatch.group(1)
-            token = lineMatch.group(2)
-            wdictfreq[token] = freq
+    # the lexicon (WordNet dictionary and BNC frequencies) is loaded once per process
+    wdictfreq = load_lexicon()
 
     out = {}
     outcandi = {}
@@ -101,8 +35,8 @@ def enggram_spellcheck(inputFileName, outputFileName):
                 i = i.rstrip()
                 i = re.sub(r'^\d+\t([^\t]+)\t.+$', r'\1', i)
 
-                if i not in wdictfreq.keys():
-                    if not i.lower() in wdictfreq.keys():
+                if i not in wdictfreq:
+                    if not i.lower() in wdictfreq:
                         if not re.findall(r'-', i):  # why exclude compounds with hyphen?
                             if not re.findall(r'\d+', i):
                                 levencandi.append(i)
@@ -111,9 +45,9 @@ def enggram_spellcheck(inputFileName, outputFileName):
 
     # print u'OOV words: ',len(levencandi),u'\n',levencandi
 
-    # Gestalt approach
-    for l in levencandi:
-        out[l] = difflib.get_close_matches(l, wdictfreq.keys(), 6)
+    # Gestalt approach, the candidates are found with the index of the lexicon, see lexicon.py
+    for l in dict.fromkeys(levencandi):
+        out[l] = wdictfreq.close_matches(l, 6)
     #    print(out[l])
 
     # phonetic similarity using the Metaphone algorithm
@@ -166,7 +100,7 @@ def enggram_spellcheck(inputFileName, outputFileName):
             sub = u''
             splitter = c.split(u'/')
             for s in splitter:
-                submatch = difflib.get_close_matches(s, wdictfreq.keys(), 1)[0]
+                submatch = wdictfreq.close_matches(s, 1)[0]
                 sub = sub + submatch + u'-'
             outcandi[c] = sub[0:-1]
     #    else:
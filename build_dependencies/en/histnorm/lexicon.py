@@ -0,0 +1,117 @@
+# Lexicon and candidate search for the English spelling normalization
+
+"""The lexicon of engGramp2 is read from the WordNet dictionary and the BNC
+frequency list once per process, see load_lexicon.
+
+Lexicon.close_matches returns the same words as
+difflib.get_close_matches(word, lexicon, n, cutoff) without scoring every word
+of the lexicon. The score of difflib, the ratio 2 * M / (len(a) + len(b)) of
+the matching characters M, is bounded by the number of characters the two
+words have in common. An inverted index from (character, n-th occurrence) to
+the words gives that bound for all words at once. The words are then scored
+with difflib in the order of their bound, until no word left can reach the
+n best scores.
+"""
+from __future__ import absolute_import
+import heapq
+import os
+import re
+from codecs import open
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+import numpy as np
+
+
+CURRENT_PATH = os.path.dirname(os.path.abspath(__file__))
+DICTIONARY = os.path.join(CURRENT_PATH, 'WordNetDictionary')
+CORPUS = os.path.join(CURRENT_PATH, 'bnc.mono.en.freqs')
+
+
+class Lexicon:
+
+    def __init__(self, frequencies):
+        # word -> frequency, 0 for the words which are only in WordNet
+        self.frequencies = frequencies
+        self.words = list(frequencies)
+        self.lengths = np.array([len(word) for word in self.words], dtype=np.int64)
+        postings = defaultdict(list)
+        for index, word in enumerate(self.words):
+            for char, count in Counter(word).items():
+                for occurrence in range(1, count + 1):
+                    postings[(char, occurrence)].append(index)
+        self.postings = {key: np.array(indices, dtype=np.int64) for key, indices in postings.items()}
+
+    def __contains__(self, word):
+        return word in self.frequencies
+
+    def __getitem__(self, word):
+        return self.frequencies[word]
+
+    def close_matches(self, word, n=6, cutoff=0.6):
+        """difflib.get_close_matches over the lexicon"""
+        common = np.zeros(len(self.words), dtype=np.int64)
+        for char, count in Counter(word).items():
+            for occurrence in range(1, count + 1):
+                indices = self.postings.get((char, occurrence))
+                if indices is None:
+                    break
+                common[indices] += 1
+        # the quick_ratio of difflib, an upper bound of the ratio
+        bounds = 2.0 * common / (self.lengths + len(word))
+        candidates = np.nonzero(bounds >= cutoff)[0]
+        candidates = candidates[np.argsort(-bounds[candidates], kind='stable')]
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(word)
+        best = []
+        for index in candidates:
+            if len(best) == n and bounds[index] < best[0][0]:
+                break
+            candidate = self.words[index]
+            matcher.set_seq1(candidate)
+            score = matcher.ratio()
+            if score >= cutoff:
+                if len(best) < n:
+                    heapq.heappush(best, (score, candidate))
+                else:
+                    heapq.heappushpop(best, (score, candidate))
+        return [candidate for _, candidate in sorted(best, reverse=True)]
+
+
+def read_wordnet(dictionary):
+    wdict = []
+    for w in os.listdir(dictionary):
+        with open(os.path.join(dictionary, w), 'r', encoding='utf8') as f:
+            if u'exc' in w:
+                for line in f:
+                    if not re.search(u'_', line):
+                        line = line.lower()
+                        line = line.rstrip()
+                        line = line.split(u' ')
+                        for i in line:
+                            wdict.append(i)
+            if u'data' in w:
+                for line in f:
+                    if not re.search(u'_', line):
+                        line = line.lower()
+                        line = line.split(u' ')
+                        wdict.append(line[4])
+    return set(wdict)
+
+
+@lru_cache(maxsize=None)
+def load_lexicon(dictionary=DICTIONARY, corpus=CORPUS):
+    """Read the WordNet words and the BNC frequencies, once per process"""
+    wdictfreq = {}
+    for word in read_wordnet(dictionary):
+        wdictfreq[word] = 0
+
+    with open(corpus, 'r', encoding='utf8') as g:
+        for line in g:
+            lineMatch = re.search(r'^\s*(\d+)\s+(.+?)\s*$', line)
+            freq = lineMatch.group(1)
+            token = lineMatch.group(2)
+            wdictfreq[token] = freq
+    return Lexicon(wdictfreq)
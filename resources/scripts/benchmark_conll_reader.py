@@ -0,0 +1,135 @@
+"""Benchmark of the conll readers
+
+The line-by-line reader (read_conll_file through FileContent, before
+iter_conll_texts) is compared with iter_conll_texts, both up to the columns of
+the token lines which load_token takes.
+
+python -m resources.scripts.benchmark_conll_reader resources/corpus/annotated/10-sv.conll --copies 1000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Union
+
+from swegram_main.lib.logger import get_logger
+from swegram_main.lib.utils import (
+    ConllFormatError, FileContent, FT, MetaFormatError, T, iter_conll_texts
+)
+
+
+logger = get_logger(__name__)
+
+
+def _initialize_conllu_reading(file_content: FT) -> Tuple[Union[None, Dict[str, str]], Union[str, Dict[str, str]]]:
+    component = next(file_content)
+    while True:
+        # Skip blank lines in the beginning of the file content
+        if isinstance(component, str):
+            if not component.strip():
+                component = next(file_content)
+            else:
+                return None, component
+        elif isinstance(component, dict):
+            return component, next(file_content)
+        else:
+            raise MetaFormatError(f"Invalid format, got {type(component)}:{component}")
+
+
+def legacy_read_conll_file(input_path: Path) -> T:
+    """read_conll_file before iter_conll_texts, the lines of the file through FileContent"""
+    texts: T = []
+    paragraphs, sentences, sentence, = [], [], []
+    file_content = FileContent(input_path).get()
+
+    def _append_paragraph() -> None:
+        if sentence:
+            sentences.append(sentence)
+        if sentences:
+            paragraphs.append(sentences)
+
+    def _append_text(meta: Dict[str, str]) -> None:
+        _append_paragraph()
+        if paragraphs:
+            texts.append((paragraphs, meta))
+        elif meta:
+            logger.warning(f"Medata data {meta}: text is empty")
+
+    try:  # pylint: disable=too-many-try-statements
+        meta, component = _initialize_conllu_reading(file_content)
+        while True:
+            newline = 0
+            while True:
+                if isinstance(component, str):
+                    if component == "\n":
+                        newline += 1
+                    elif component.startswith("#"):
+                        pass
+                    elif not newline:
+                        sentence.append(component)
+                    elif newline == 2:
+                        _append_paragraph()
+                        sentences, sentence = [], [component]
+                        newline = 0
+                    elif newline == 1 and sentence:
+                        sentences.append(sentence)
+                        sentence = [component]
+                        newline = 0
+                    else:
+                        raise ConllFormatError(f"Too many blank lines, max 2 newlines , but got {newline}")
+                elif isinstance(component, dict):
+                    _append_text(meta)
+                    meta = component
+                    paragraphs, sentences, sentence = [], [], []
+                    break
+                else:
+                    raise MetaFormatError(f"Invalid format, got {type(component)}:{component}")
+                component = next(file_content)
+            component = next(file_content)
+
+    except StopIteration:
+        _append_text(meta)
+    return texts
+
+
+def line_reader(input_path: Path) -> int:
+    """The reader before iter_conll_texts, the lines are split as by load_token"""
+    texts = [
+        [[[line.strip().split("\t") for line in sentence] for sentence in p] for p in text]
+        for text, _ in legacy_read_conll_file(input_path)
+    ]
+    return sum(len(sentence) for text in texts for p in text for sentence in p)
+
+
+def block_reader(input_path: Path) -> int:
+    return sum(len(sentence) for text in iter_conll_texts(input_path) for p in text.paragraphs for sentence in p)
+
+
+def benchmark(reader: Callable[[Path], int], input_path: Path, repeat: int) -> float:
+    """Return the tokens per second of the best run"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        num_tokens = reader(input_path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return num_tokens / best
+
+
+def main(arguments: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input_path", type=Path, help="conll file")
+    parser.add_argument("--copies", type=int, default=1, help="Read the file concatenated with itself n times")
+    parser.add_argument("--repeat", type=int, default=3, help="Best of n runs")
+    args = parser.parse_args(arguments)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = Path(tmp_dir).joinpath(args.input_path.name)
+        content = args.input_path.read_text(encoding="utf-8")
+        input_path.write_text("\n\n".join([content.rstrip("\n")] * args.copies) + "\n", encoding="utf-8")
+        for name, reader in [("line reader", line_reader), ("iter_conll_texts", block_reader)]:
+            print(f"{name:>16}: {benchmark(reader, input_path, args.repeat):,.0f} tokens/s")
+
+
+if __name__ == "__main__":
+    main()
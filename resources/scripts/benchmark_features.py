@@ -0,0 +1,108 @@
+"""Benchmark of the feature evaluation
+
+The scalars of the features of the linguistic aspects are computed for every
+sentence, paragraph and text of a corpus loaded with its fields, with parse_args
+on the declarations of the features (before CompiledFeature) and with the
+compiled features. parse_args extended the argument list of the declaration on
+every call, so the legacy rounds get slower and the memory grows, while the
+rounds of the compiled features take the same time and memory.
+
+python -m resources.scripts.benchmark_features resources/corpus/annotated/10-sv.conll --copies 10 --rounds 5
+"""
+import argparse
+import gc
+import tempfile
+import time
+import tracemalloc
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from swegram_main.handler.handler import load
+from swegram_main.lib.counts import CountArray
+from swegram_main.data.sentences import Sentence
+from swegram_main.statistics.statistic import LINGUISTIC_ASPECTS, get_language_features
+from swegram_main.statistics.statistic_types import F
+
+
+def legacy_parse_args(kwarg_list: Dict[str, List[Tuple[str, Any]]], func: Callable, content: Any, **kwargs) -> Dict:
+    """parse_args before CompiledFeature, the argument list of the declaration is extended on every call"""
+    args = kwarg_list.get("arg", [])
+    args.extend([(key, func(content, attribute, **kwargs)) for key, attribute in kwarg_list.get("attribute", [])])
+    return {key: value.to_dict() if isinstance(value, CountArray) else value for key, value in args}
+
+
+def legacy_scalar(instance: Any, feature: F) -> Any:
+    _, func, attr_func, kwarg_list, attribute_kwargs = feature
+    if isinstance(instance, Sentence):
+        return func(**legacy_parse_args(kwarg_list, getattr, instance))
+    return func(**legacy_parse_args(kwarg_list, attr_func, getattr(instance, instance.elements), **attribute_kwargs))
+
+
+def compute_legacy(units: List[Any], language: str) -> Callable[[], None]:
+    suffix = "ENGLISH" if language == "en" else "SWEDISH"
+    # a copy of the declarations, which the legacy evaluation extends
+    features = deepcopy([feature for aspect in LINGUISTIC_ASPECTS for feature in getattr(aspect, f"{suffix}_FEATURES")])
+
+    def _round() -> None:
+        for unit in units:
+            for feature in features:
+                legacy_scalar(unit, feature)
+    return _round
+
+
+def compute_compiled(units: List[Any], language: str) -> Callable[[], None]:
+    features = [feature for aspect in LINGUISTIC_ASPECTS for feature in get_language_features(aspect, language)]
+
+    def _round() -> None:
+        for unit in units:
+            record = {}  # the merged fields of the elements of the unit, shared by its features as in load_statistic
+            for feature in features:
+                feature.get_scalar(unit, record)
+    return _round
+
+
+def benchmark(compute: Callable[[], None], rounds: int, num_units: int) -> List[Tuple[float, float]]:
+    """The microseconds per unit and the memory growth in KiB of every round"""
+    results = []
+    gc.collect()
+    tracemalloc.start()
+    memory = tracemalloc.get_traced_memory()[0]
+    for _ in range(rounds):
+        start = time.perf_counter()
+        compute()
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        current = tracemalloc.get_traced_memory()[0]
+        results.append((elapsed * 1e6 / num_units, (current - memory) / 1024))
+        memory = current
+    tracemalloc.stop()
+    return results
+
+
+def main(arguments: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input_path", type=Path, help="conll file")
+    parser.add_argument("-l", "--language", choices=["en", "sv"], default="sv")
+    parser.add_argument("--copies", type=int, default=1, help="Read the file concatenated with itself n times")
+    parser.add_argument("--rounds", type=int, default=5, help="Compute the features of all units n times")
+    args = parser.parse_args(arguments)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = Path(tmp_dir).joinpath(args.input_path.name)
+        content = args.input_path.read_text(encoding="utf-8")
+        input_path.write_text("\n\n".join([content.rstrip("\n")] * args.copies) + "\n", encoding="utf-8")
+        corpus = load(input_path, args.language, parsed=False)
+
+    units = [
+        unit for text in corpus.texts
+        for unit in (*(s for p in text.paragraphs for s in p.sentences), *text.paragraphs, text)
+    ]
+    print(f"{len(units)} units, {len(corpus.texts)} texts")
+    for name, compute in [("parse_args", compute_legacy), ("compiled", compute_compiled)]:
+        results = benchmark(compute(units, args.language), args.rounds, len(units))
+        print(f"{name:>10}: " + ", ".join(f"{us:,.1f} us/unit {kib:+,.0f} KiB" for us, kib in results))
+
+
+if __name__ == "__main__":
+    main()
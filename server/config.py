@@ -1,4 +1,9 @@
 """Configuration for server"""
+import os
 
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 MAX_DAYS = 7  # Days texts will be saved in the system
+
+# Directory and size limit (MB) of the annotation cache, the cache is disabled if the directory is not set
+ANNOTATION_CACHE_DIR = os.environ.get("SWEGRAM_ANNOTATION_CACHE")
+ANNOTATION_CACHE_SIZE = int(os.environ.get("SWEGRAM_ANNOTATION_CACHE_SIZE", "1024"))
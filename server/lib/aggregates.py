@@ -0,0 +1,103 @@
+"""Aggregates of the freq dicts of the activated texts
+
+The frequencies and lengths are counted from the freq dicts of the activated and
+parsed texts of a language. Instead of merging the dicts of all these texts on
+every request, a FieldAggregate of them is kept per language and category, see
+query_texts, and updated with the texts activated, deactivated or deleted, see
+update_aggregates and remove_text. Before an aggregate is read, the ids of its
+texts are compared with the database, e.g. for the texts changed by another
+worker process, and only the texts which differ are added or removed.
+"""
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from server.lib.utils import query_texts
+from server.models import Text
+from swegram_main.statistics.aggregate import FieldAggregate
+from swegram_main.statistics.features.general import CountFeatures as CF
+
+
+CATEGORIES = (None, "norm", "lemma")
+
+
+class TextAggregate:
+    """The merged freq dicts of texts, with the ids of the texts"""
+
+    def __init__(self) -> None:
+        self.fields = FieldAggregate(CF.FREQ_FIELDS)
+        self.text_ids: Set[int] = set()
+
+    def add(self, text: Text) -> None:
+        if text.id not in self.text_ids:
+            self.fields.add(text)
+            self.text_ids.add(text.id)
+
+    def remove(self, text: Text) -> None:
+        if text.id in self.text_ids:
+            self.fields.remove(text)
+            self.text_ids.remove(text.id)
+
+    def get_freq_dict(self, category: str, tagset: str) -> Dict[str, int]:
+        return self.fields.fields[f"freq_{category}_dict_{tagset}"]
+
+
+AGGREGATES: Dict[Tuple[str, Optional[str]], TextAggregate] = {}
+
+
+def _get_category(category: Optional[str]) -> Optional[str]:
+    return category if category in CATEGORIES else None
+
+
+def is_aggregated(text: Text, category: Optional[str]) -> bool:
+    """The text is counted in the frequencies of the category, see query_texts"""
+    if not (text.activated and text.parsed):
+        return False
+    if category == "norm":
+        return bool(text.normalized)
+    if category == "lemma":
+        return bool(text.tagged)
+    return True
+
+
+def get_aggregate(db: Session, language: str, category: Optional[str] = None) -> TextAggregate:
+    """The aggregate of the activated and parsed texts of the language and category, updated with the database"""
+    key = (language, _get_category(category))
+    aggregate = AGGREGATES.get(key, TextAggregate())
+    texts = query_texts(db, language, key[1]).filter(Text.parsed == True)  # pylint: disable=singleton-comparison
+    text_ids = {text_id for text_id, in texts.with_entities(Text.id)}
+
+    removed_ids = aggregate.text_ids - text_ids
+    removed_texts = db.query(Text).filter(Text.id.in_(removed_ids)).all() if removed_ids else []
+    if len(removed_texts) < len(removed_ids):
+        # the fields of the deleted texts can't be subtracted
+        aggregate, removed_texts = TextAggregate(), []
+    for text in removed_texts:
+        aggregate.remove(text)
+    added_ids = text_ids - aggregate.text_ids
+    if added_ids:
+        for text in texts.filter(Text.id.in_(added_ids)):
+            aggregate.add(text)
+
+    AGGREGATES[key] = aggregate
+    return aggregate
+
+
+def update_aggregates(texts: Iterable[Text]) -> None:
+    """Add or remove the texts of which the state changed, e.g. activated or deactivated"""
+    for text in texts:
+        for category in CATEGORIES:
+            aggregate = AGGREGATES.get((text.language, category))
+            if aggregate is None:
+                continue
+            if is_aggregated(text, category):
+                aggregate.add(text)
+            else:
+                aggregate.remove(text)
+
+
+def remove_text(text: Text) -> None:
+    """Remove a text before it is deleted"""
+    for (language, _), aggregate in AGGREGATES.items():
+        if language == text.language:
+            aggregate.remove(text)
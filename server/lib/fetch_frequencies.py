@@ -3,13 +3,14 @@ from typing import Any, Dict
 
 from sqlalchemy.orm import Session
 
-from server.lib.utils import get_texts, get_type_and_pos_dicts
+from server.lib.aggregates import get_aggregate
+from server.lib.utils import get_type_and_pos_dicts
 
 
 def fetch_frequencies(category: str, tagset: str, data: Dict[str, Any], db: Session) -> Dict[str, Any]:
     language = data["lang"]
-    texts = [text for text in get_texts(db, language, category=category) if text.parsed]
-    type_dict, pos_dict = get_type_and_pos_dicts(category=category, tagset=tagset, texts=texts)
+    aggregate = get_aggregate(db, language, category=category)
+    type_dict, pos_dict = get_type_and_pos_dicts(aggregate.get_freq_dict(category, tagset))
 
     return {
         f"{category}_pos": [
@@ -18,5 +19,5 @@ def fetch_frequencies(category: str, tagset: str, data: Dict[str, Any], db: Sess
             } for k, c in sorted(list(type_dict.items()), key=lambda x: x[1], reverse=True)
         ],
         "pos_list": sorted(pos_dict.items(), key=lambda x: x[1], reverse=True),
-        "number_of_texts": len(texts)
+        "number_of_texts": len(aggregate.text_ids)
     }
@@ -3,7 +3,8 @@ from typing import Any, Dict
 
 from sqlalchemy.orm import Session
 
-from server.lib.utils import get_texts, get_type_and_pos_dicts
+from server.lib.aggregates import get_aggregate
+from server.lib.utils import get_type_and_pos_dicts
 from swegram_main.config import PT_TAGS, SUC_TAGS
 
 
@@ -13,8 +14,8 @@ PUNCT_TAGS = [*SUC_TAGS[-3:], *PT_TAGS[-10:], "PUNCT"]
 def fetch_lengths(category: str, tagset: str, data: Dict[str, Any], db: Session) -> Dict[str, Any]:
     language = data["lang"]
     # breakpoint()
-    texts = [text for text in get_texts(db, language, category=category) if text.parsed]
-    type_dict, pos_dict = get_type_and_pos_dicts(category=category, tagset=tagset, texts=texts)
+    aggregate = get_aggregate(db, language, category=category)
+    type_dict, pos_dict = get_type_and_pos_dicts(aggregate.get_freq_dict(category, tagset))
 
     sorted_pos_list = [pos for pos, _ in sorted(pos_dict.items(), key=lambda x: x[1], reverse=True)]
     length_dict = {}  # {1: {PP: {word: count}}}
@@ -51,7 +52,7 @@ def fetch_lengths(category: str, tagset: str, data: Dict[str, Any], db: Session)
     } for length in sorted(length_dict.keys())]
 
     data = {
-        "number_of_texts": len(texts),
+        "number_of_texts": len(aggregate.text_ids),
         "pos_list": [
             {
                 "label": e, "prop": e
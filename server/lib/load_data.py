@@ -3,9 +3,11 @@ import tempfile
 import pytz
 from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, List, Dict, Union
+from typing import Any, List, Dict, Optional, Union
 
+from server.config import ANNOTATION_CACHE_DIR, ANNOTATION_CACHE_SIZE
 from server.lib.exceptions import ServerError
 from swegram_main.data.features import Feature
 from swegram_main.data.paragraphs import Paragraph
@@ -13,6 +15,8 @@ from swegram_main.data.sentences import Sentence
 from swegram_main.data.texts import Text
 from swegram_main.data.tokens import Token
 from swegram_main.handler.handler import load_dir
+from swegram_main.lib.counts import CountArray
+from swegram_main.pipeline.cache import AnnotationCache
 from swegram_main.pipeline.pipeline import Pipeline
 
 
@@ -32,6 +36,8 @@ def convert_attribute_value(value: Any) -> Union[int, bool, str, Any]:
         return value
     if isinstance(value, Path):
         return str(value)
+    if isinstance(value, CountArray):
+        return value.to_dict()
     if isinstance(value, OrderedDict):
         for k, v in value.items():
             if isinstance(v, Feature):
@@ -123,6 +129,13 @@ def save_text(raw_text: str, target_path: Path) -> None:
         f.write(raw_text)
 
 
+@lru_cache(maxsize=None)
+def get_annotation_cache() -> Optional[AnnotationCache]:
+    if not ANNOTATION_CACHE_DIR:
+        return None
+    return AnnotationCache(Path(ANNOTATION_CACHE_DIR), max_size=ANNOTATION_CACHE_SIZE * 1024 ** 2)
+
+
 def run_swegram(language: str, **kwargs) -> List[Dict[str, Any]]:
     """Annotate text and return a dict to be stored into database"""
     states = {
@@ -142,21 +155,20 @@ def run_swegram(language: str, **kwargs) -> List[Dict[str, Any]]:
             input_file.flush()
 
             pipeline = Pipeline(
-                input_path=Path(input_file.name), output_dir=Path(output_dir), language=language
+                input_path=Path(input_file.name), output_dir=Path(output_dir), language=language,
+                cache=get_annotation_cache()
             )
 
-            if normalize:
-                pipeline.normalize()
-
             # parse <- tag <- tokenize
             # tag is not an optional in frontend
             if parse:
-                pipeline.parse()
+                action = "parse"
             elif tokenize and not normalize:
-                pipeline.tokenize()
+                action = "tokenize"
             else:
                 raise ServerError(f"Invalid annotation request, {kwargs}")
-            pipeline.postprocess()
+            # the intermediate files are thrown away with the output dir, annotate in memory
+            pipeline.stream(action, normalize_tokens=bool(normalize))
 
             texts: List[Text] = load_dir(
                 input_dir=Path(output_dir), language=language, include_tags=[], exclude_tags=[], parsed=parse
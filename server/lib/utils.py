@@ -1,34 +1,33 @@
 """utils.py"""
 from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Query, Session
 
 from server.models import Text
 
 
-def get_texts(db: Session, language: str, category: Optional[str] = None) -> List[Text]:
-
+def query_texts(db: Session, language: str, category: Optional[str] = None) -> Query:
+    """The query of the activated texts of the language, of the category norm or lemma only the normalized or tagged"""
     texts = db.query(Text).filter(Text.language == language).filter(Text.activated == True)  # pylint: disable=singleton-comparison
 
     if category == "norm":
-        return [text for text in texts.filter(Text.normalized == True)]  # pylint: disable=unnecessary-comprehension, singleton-comparison
+        return texts.filter(Text.normalized == True)  # pylint: disable=singleton-comparison
     if category == "lemma":
-        return [text for text in texts.filter(Text.tagged == True)]  # pylint: disable=unnecessary-comprehension, singleton-comparison
-
-    return [text for text in texts]  # pylint: disable=unnecessary-comprehension
-
-
-def get_type_and_pos_dicts(category: str, tagset: str, texts: List[Text]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    type_dict, pos_dict = {}, {}
-    for text in texts:
-        for type_pos, count in text.as_dict()[f"freq_{category}_dict_{tagset}"].items():
-            _, pos = type_pos.rsplit("_", maxsplit=1)
-            if pos in pos_dict:
-                pos_dict[pos] += count
-            else:
-                pos_dict[pos] = count
-            if type_pos in type_dict:
-                type_dict[type_pos] += count
-            else:
-                type_dict[type_pos] = count
+        return texts.filter(Text.tagged == True)  # pylint: disable=singleton-comparison
+    return texts
+
+
+def get_texts(db: Session, language: str, category: Optional[str] = None) -> List[Text]:
+    return [text for text in query_texts(db, language, category)]  # pylint: disable=unnecessary-comprehension
+
+
+def get_type_and_pos_dicts(freq_dict: Dict[str, int]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """The counts of the types with their pos, e.g. "hund_NOUN", and of the pos, from a freq dict of the texts"""
+    type_dict, pos_dict = dict(freq_dict), {}
+    for type_pos, count in type_dict.items():
+        _, pos = type_pos.rsplit("_", maxsplit=1)
+        if pos in pos_dict:
+            pos_dict[pos] += count
+        else:
+            pos_dict[pos] = count
     return type_dict, pos_dict
@@ -5,6 +5,7 @@ from fastapi import APIRouter, Body, Depends
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
+from server.lib.aggregates import update_aggregates
 from server.lib.fetch_features import post_states as _post_states
 from server.routers.database import get_db
 from server.models import Text
@@ -16,14 +17,16 @@ router = APIRouter()
 @router.put("/")
 async def update_states(data: Dict[str, Any] = Body(...), db: Session = Depends(get_db)) -> JSONResponse:
     """Update states"""
-    text_states = data["textStates"]
+    text_states, texts = data["textStates"], []
     for _id, status in copy(text_states).items():
         text = db.query(Text).get(int(_id))
         if text:
             text.activated = status
+            texts.append(text)
         else:
             del text_states[_id]
     db.commit()
+    update_aggregates(texts)
     return JSONResponse(text_states)
 
 
@@ -2,6 +2,7 @@ from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, Pa
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
+from server.lib.aggregates import remove_text
 from server.lib.exceptions import ServerError
 from server.lib.fetch_current_sentences import fetch_current_sentences
 from server.lib.load_data import parse_payload, run_swegram
@@ -62,6 +63,7 @@ async def create_text(
 async def delete_text(text_id: int = Path(..., title="Text id"), db: Session = Depends(get_db)) -> JSONResponse:
 
     text = db.query(Text).get(ident=text_id)
+    remove_text(text)
     db.delete(text)
     db.commit()
     return JSONResponse(text.as_dict())
@@ -6,6 +6,7 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
 from server.config import MAX_DAYS, DATE_FORMAT
+from server.lib.aggregates import remove_text
 from server.lib.fetch_data import fetch_data
 from server.routers.database import get_db
 from server.models import Text
@@ -25,6 +26,7 @@ def remove_texts():
         if saved_time.days > MAX_DAYS:
             print(f"To delete expired file {text.filename}.")
             print(f"Created time: {text.date}; size: {text._filesize}")
+            remove_text(text)
             db.delete(text)
             db.commit()
 
@@ -25,6 +25,7 @@ setup(
     install_requires=get_requirements(),
     package_data={
         "swegram_main.statistics.kelly": ["kelly.en", "kelly.sv", "wpm.sv"],
+        "swegram_main.pipeline.lib": ["MaltParserWorker.java"],
         "build_dependencies": ["install.sh"],
         "build_dependencies.en.en": ["english-ud-2.0-170801.udpipe"],
         "build_dependencies.en.histnorm": ["bnc.mono.en.freqs"],
@@ -22,8 +22,12 @@ UDPIPE = UDPIPE_BASE.joinpath("udpipe")
 UDPIPE_MODEL = UDPIPE_BASE.joinpath("en", "english-ud-2.0-170801.udpipe")
 
 HISTNORM_EN = "histnorm"
+HISTNORM_EN_DIR = UDPIPE_BASE.joinpath("histnorm")
 HISTNORM_SV = TOOL_DIR.joinpath("HistNorm")
 
+# MISC attribute of the first token of a split compound, see pipeline/lib/compounds.py
+SPLIT_COMPOUND = "SplitCompound"
+
 
 # Lexical feature related variables
 KELLY_DIR = BASE_DIR.joinpath("swegram_main", "statistics", "kelly")
@@ -74,6 +78,7 @@ JSON_CONLL_CORPUS_KEY = "Corpus"
 JSON_CONLL_METADATA_KEY = "metadata"
 JSON_CONLL_TEXT_KEY = "text"
 XLSX_CONLL_SHEET_PREFIX = "text"
+MAX_VALIDATION_ERRORS = 1000  # the validation of an uploaded text stops after so many errors
 
 
 UD_TAGS = ["ADJ", "ADP", "ADV", "AUX", "CCONJ",
@@ -1,7 +1,24 @@
-from dataclasses import dataclass
+"""Module of token data structure
+
+A corpus holds millions of tokens, so the token has __slots__ instead of a
+__dict__, and load_token interns the columns, which are shared by the tokens
+with the same form, tag, head etc.
+"""
+from dataclasses import dataclass, fields
 from typing import Optional
 
 
+def _add_slots(cls: type) -> type:
+    """Recreate the dataclass with __slots__ of its fields, dataclass(slots=True) from Python 3.10"""
+    field_names = tuple(f.name for f in fields(cls))
+    namespace = {key: value for key, value in cls.__dict__.items() if key not in field_names}
+    namespace["__slots__"] = field_names
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+@_add_slots
 @dataclass
 class Token:  # pylint: disable=too-many-instance-attributes
     """Data structure for token instance"""
@@ -23,5 +40,9 @@ class Token:  # pylint: disable=too-many-instance-attributes
     length: Optional[int]     = None
     highlight: Optional[bool] = None
 
+    def __reduce__(self):
+        """Pickle the token as the tuple of its columns, e.g. in a snapshot"""
+        return self.__class__, tuple(getattr(self, f.name) for f in fields(self))
+
     def __str__(self):
         return self.form
@@ -1,10 +1,15 @@
 
 
 import os
+from argparse import Namespace
 
+from swegram_main.handler.handler import snapshot_files
 from swegram_main.handler.parser import main_parser
 from swegram_main.handler.visualization import Visualization
+from swegram_main.lib.counts import set_count_engine
 from swegram_main.lib.logger import get_logger
+from swegram_main.pipeline.cache import AnnotationCache
+from swegram_main.pipeline.lib.memo import enable_memo
 from swegram_main.pipeline.pipeline import Pipeline
 
 
@@ -21,6 +26,77 @@ class CommandLineError(Exception):
     """Command line error"""
 
 
+def annotate(args: Namespace) -> None:
+    """Annotate the texts of the input path, see Pipeline"""
+    logger.info(f"Normalization: {bool(args.NORMALIZE)}")
+    if args.SENTENCE_MEMO:
+        enable_memo(None if args.SENTENCE_MEMO is True else args.SENTENCE_MEMO)
+    cache = AnnotationCache(args.CACHE_DIR, max_size=args.CACHE_SIZE * 1024 ** 2) if args.CACHE_DIR else None
+    pipeline = Pipeline(
+        input_path=args.input_path, output_dir=args.output_dir, language=args.language, jobs=args.JOBS,
+        cache=cache, shard_size=args.SHARD_SIZE
+    )
+    if args.PARSE or (not args.NORMALIZE and not args.TAG and not args.TOKENIZE):
+        action = "parse"
+    elif args.TAG:
+        action = "tag"
+    elif not args.NORMALIZE:
+        action = "tokenize"
+    else:
+        action = "normalize"
+    logger.info(f"Annotation: {action}")
+    if args.COMPOUNDS and action not in {"tag", "parse"}:
+        raise CommandLineError("--compounds requires tagged texts, use it with --tag or --parse")
+    if args.SNAPSHOT and action != "parse":
+        raise CommandLineError("--snapshot requires parsed texts, use it with --parse")
+    if args.STREAM:
+        pipeline.stream(action, args.NORMALIZE, args.save_as, args.AGGREGATE, args.COMPOUNDS)
+    else:
+        if args.NORMALIZE:
+            pipeline.normalize()
+        if action != "normalize":
+            pipeline.run(action, post_action=False)
+        if args.COMPOUNDS:
+            pipeline.compounds()
+        pipeline.postprocess(args.save_as, args.AGGREGATE)
+    if args.SNAPSHOT:
+        snapshot_files([text.conll for text in pipeline.texts], args.language, args.JOBS, pipeline.aggregated_conll)
+    if cache:
+        logger.info(f"Annotation cache: {cache.stats}")
+
+
+def statistic(args: Namespace) -> None:
+    """Save the statistics of the annotated texts of the input path, see Visualization"""
+    logger.info("Swegram statistics")
+    set_count_engine(args.COUNT_ENGINE)
+
+    if args.include_metadata:
+        logger.info(f"Include metadata: {args.include_metadata}")
+    if args.exclude_metadata:
+        logger.info(f"Exclude metadata: {args.exclude_metadata}")
+
+    logger.info(f"UNITS: {args.UNITS}")
+    logger.info(f"Aspects: {args.ASPECTS}")
+
+    if args.include_features:
+        logger.info(f"Include features: {args.include_features}")
+    if args.exclude_features:
+        logger.info(f"Exclude features: {args.exclude_features}")
+    if args.SNAPSHOT:
+        logger.info("Reading the texts from the snapshots of the conll files")
+    Visualization(
+        args.input_path, language=args.language, output_dir=args.output_dir,
+        include_tags=args.include_metadata, exclude_tags=args.exclude_metadata, stream=args.STREAM,
+        jobs=args.JOBS, use_snapshots=args.SNAPSHOT
+    ).filter(
+        args.UNITS, args.ASPECTS,
+        include_features=args.include_features,
+        exclude_features=args.exclude_features,
+        pprint=args.PPRINT,
+        save_as=args.save_as
+    )
+
+
 def main():
     args = main_parser()
     logger.info(f"Command: {args.command}")
@@ -28,46 +104,8 @@ def main():
     logger.info(f"Output Directory: {args.output_dir if args.output_dir else os.getcwd()}")
 
     if args.command == "annotate":
-        logger.info(f"Normalization: {bool(args.NORMALIZE)}")
-        pipeline = Pipeline(input_path=args.input_path, output_dir=args.output_dir, language=args.language)
-        if args.NORMALIZE:
-            pipeline.normalize()
-        if args.PARSE or (not args.NORMALIZE and not args.TAG and not args.TOKENIZE):
-            logger.info("Annotation: parse")
-            pipeline.parse()
-        elif args.TAG:
-            logger.info("Annotation: tag")
-            pipeline.tag()
-        elif not args.NORMALIZE:
-            logger.info("Annotation: tokenize")
-            pipeline.tokenize()
-        pipeline.postprocess(args.save_as, args.AGGREGATE)
-
+        annotate(args)
     elif args.command == "statistic":
-        logger.info("Swegram statistics")
-
-        if args.include_metadata:
-            logger.info(f"Include metadata: {args.include_metadata}")
-        if args.exclude_metadata:
-            logger.info(f"Exclude metadata: {args.exclude_metadata}")
-
-        logger.info(f"UNITS: {args.UNITS}")
-        logger.info(f"Aspects: {args.ASPECTS}")
-
-        if args.include_features:
-            logger.info(f"Include features: {args.include_features}")
-        if args.exclude_features:
-            logger.info(f"Exclude features: {args.exclude_features}")
-        Visualization(
-            args.input_path, language=args.language, output_dir=args.output_dir,
-            include_tags=args.include_metadata, exclude_tags=args.exclude_metadata
-        ).filter(
-            args.UNITS, args.ASPECTS,
-            include_features=args.include_features,
-            exclude_features=args.exclude_features,
-            pprint=args.PPRINT,
-            save_as=args.save_as
-        )
-
+        statistic(args)
     else:
         raise CommandLineError(f"Unknown command, {args.command}")
@@ -1,19 +1,32 @@
 import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from sys import intern
 from pathlib import Path
-from typing import Dict, List, TypeVar, Optional
+from types import SimpleNamespace
+from typing import Deque, Dict, Iterable, Iterator, List, Tuple, TypeVar, Optional, Union
 
 from swegram_main.data.metadata import convert_labels_to_list
 from swegram_main.data.tokens import Token
 from swegram_main.data.sentences import Sentence
 from swegram_main.data.paragraphs import Paragraph
 from swegram_main.data.texts import Text, Corpus
-from swegram_main.lib.utils import read_conll_file, get_content_md5
-from swegram_main.statistics.statistic import StatisticLoading
+from swegram_main.handler.snapshot import read_snapshot, write_snapshot
+from swegram_main.lib.conll_index import load_index
+from swegram_main.lib.logger import get_logger
+from swegram_main.lib.utils import iter_conll_texts, ConllText
+from swegram_main.statistics.statistic import CorpusAggregate, StatisticLoading, StatisticPlan, get_unit_statistics
 
 
-ST = TypeVar("ST", bound=List[str])  # Sentence Line Type
-PT = TypeVar("PT", bound=List[List[str]]) # Paragraph Line Type
-TT = TypeVar("TT", bound=List[List[List[str]]]) # Text Line Type
+STATISTIC_CHUNK_TOKENS = 20000  # tokens of the texts loaded by a worker process at a time, see iter_text_statistics
+
+ST = TypeVar("ST", bound=List[List[str]])  # Sentence Line Type, the columns of the token lines
+PT = TypeVar("PT", bound=List[List[List[str]]]) # Paragraph Line Type
+TT = TypeVar("TT", ConllText, Text)  # Text Type, read or loaded texts
+
+logger = get_logger(__name__)
 
 
 class InputError(Exception):
@@ -26,46 +39,227 @@ def _load_token(text_index: str, token_index: str, form: str, norm: str, lemma:
     upos=upos, xpos=xpos, feats=feats, ufeats=ufeats, head=head, deprel=deprel, deps=deps, misc=misc)
 
 
-def load_token(line: str, language: str) -> Token:
-    """Load token"""
-    args = line.strip().split("\t")
+def load_token(columns: List[str], language: str) -> Token:
+    """Load token from the columns of the token line, the columns are interned to be shared across tokens"""
+    columns = [intern(column) for column in columns]
     if language == "en":
-        args.insert(8, None)
-    return _load_token(*args)
+        return _load_token(*columns[:8], None, *columns[8:])
+    return _load_token(*columns)
 
 
 @StatisticLoading
-def load_sentence(text_id: str, lines: ST, language: str, parsed: bool = True) -> Sentence:  # pylint: disable=unused-argument
+def load_sentence(  # pylint: disable=unused-argument
+    text_id: str, lines: ST, language: str, parsed: bool = True, plan: Optional[StatisticPlan] = None
+) -> Sentence:
     """Load sentence from conll text"""
-    return Sentence(text_id=text_id, language=language, tokens=[load_token(line, language) for line in lines])
+    return Sentence(text_id=text_id, language=language, tokens=[load_token(columns, language) for columns in lines])
 
 
 @StatisticLoading
-def load_paragraph(text_id: str, lines: PT, language: str, parsed: bool = True) -> Paragraph:
+def load_paragraph(
+    text_id: str, lines: PT, language: str, parsed: bool = True, plan: Optional[StatisticPlan] = None
+) -> Paragraph:
     """Load paragraph from conll text"""
-    return Paragraph(
-        text_id=text_id, language=language, sentences=[load_sentence(text_id, s, language, parsed=parsed) for s in lines]
-    )
+    return Paragraph(text_id=text_id, language=language, sentences=[
+        load_sentence(text_id, s, language, parsed=parsed, plan=plan) for s in lines
+    ])
 
 
 @StatisticLoading
-def load_text(text: TT, labels: Dict[str, str], language: str, filename: Path, parsed: bool = True) -> Text:
+def load_text(
+    text: ConllText, language: str, filename: Path, parsed: bool = True, plan: Optional[StatisticPlan] = None
+) -> Text:
     """Load text from conll text"""
-    # p: paragraph, s: sentence, t: token
-    text_id: str = get_content_md5("".join([t for p in text for s in p for t in s]).encode())
-    paragraphs: List[Paragraph] = [load_paragraph(text_id, p, language, parsed=parsed) for p in text]
-    return Text(paragraphs=paragraphs, text_id=text_id, language=language, filename=filename, labels=labels)
+    paragraphs: List[Paragraph] = [
+        load_paragraph(text.text_id, p, language, parsed=parsed, plan=plan) for p in text.paragraphs
+    ]
+    return Text(
+        paragraphs=paragraphs, text_id=text.text_id, language=language, filename=filename, labels=text.metadata
+    )
+
+
+def iter_file(
+    input_file: Path, language: str, include_tags: List[str], exclude_tags: List[str], parsed: bool = True,
+    use_snapshot: bool = False, plan: Optional[StatisticPlan] = None
+) -> Iterator[Text]:
+    """Load the texts of a conll file one at a time
+
+    use_snapshot: read the texts from the snapshot of the conll file if it is up to date, see snapshot.py
+    plan: only load the planned statistics, see StatisticPlan, the texts of a snapshot have all statistics
+    """
+    snapshot = read_snapshot(input_file, language) if use_snapshot and parsed else None
+    if snapshot is not None:
+        yield from (text for text in snapshot if is_text_included(text.labels, include_tags, exclude_tags))
+        return
+    for text in iter_selected_texts(input_file, include_tags, exclude_tags):
+        if is_text_included(text.metadata, include_tags, exclude_tags):
+            yield load_text(text, language, input_file, parsed=parsed, plan=plan)
+
+
+def iter_selected_texts(input_file: Path, include_tags: List[str], exclude_tags: List[str]) -> Iterator[ConllText]:
+    """Read the texts of a conll file, only the texts selected by metadata with the index, see conll_index.py"""
+    index = load_index(input_file) if include_tags or exclude_tags else None
+    if index is None:
+        yield from iter_conll_texts(input_file)
+        return
+    for indexed_text in index:
+        if is_text_included(indexed_text.labels, include_tags, exclude_tags):
+            yield from iter_conll_texts(input_file, byte_range=(indexed_text.start, indexed_text.end))
 
 
 def load_file(
     input_file: Path, language: str, include_tags: List[str], exclude_tags: List[str], parsed: bool = True
 ) -> List[Text]:
     """Load texts from conll file"""
-    return [
-        load_text(text, labels, language, input_file, parsed=parsed)
-        for text, labels in read_conll_file(input_file)
-        if is_text_included(labels, include_tags, exclude_tags)
-    ]
+    return list(iter_file(input_file, language, include_tags, exclude_tags, parsed))
+
+
+def get_conll_files(input_path: Path) -> List[Path]:
+    """The conll files of the input path, a conll file or a directory containing conll files"""
+    if input_path.is_dir():
+        conll_files = [
+            input_path.joinpath(filename) for filename in os.listdir(input_path) if filename.endswith(".conll")
+        ]
+        if not conll_files:
+            raise InputError(f"Input directory {input_path} doesn't contain any conll files")
+        return conll_files
+    if input_path.is_file():
+        if input_path.suffix != ".conll":
+            raise InputError(f"Only conll file valid, got {input_path.suffix.lstrip('.')}")
+        return [input_path]
+    raise InputError(f"Invalid input path: {input_path}")
+
+
+def iter_texts(
+    input_path: Path, language: str,
+    include_tags: Optional[List[str]] = None, exclude_tags: Optional[List[str]] = None, parsed: bool = True,
+    use_snapshots: bool = False, plan: Optional[StatisticPlan] = None
+) -> Iterator[Text]:
+    """Load the texts of a conll file or directory one at a time, the texts are not kept in a corpus
+
+    use_snapshots: read the texts from the up-to-date snapshots of the conll files, see iter_file
+    """
+    for conll_file in get_conll_files(input_path):
+        yield from iter_file(
+            conll_file, language, include_tags or [], exclude_tags or [], parsed, use_snapshots, plan
+        )
+
+
+def aggregate_texts(
+    texts: Iterable[Text], language: str, plan: Optional[StatisticPlan] = None
+) -> Tuple[CorpusAggregate, List[SimpleNamespace]]:
+    """The aggregate of the texts and the statistics of their units, without the tokens"""
+    aggregate, statistics = CorpusAggregate(language, plan), []
+    for text in texts:
+        aggregate.add(text)
+        statistics.append(get_unit_statistics(text, plan))
+    return aggregate, statistics
+
+
+def load_text_chunk(
+    texts: List[ConllText], language: str, filename: Path, plan: Optional[StatisticPlan] = None
+) -> Tuple[CorpusAggregate, List[SimpleNamespace]]:
+    """Load a chunk of texts of a conll file in a worker process, see iter_text_statistics"""
+    return aggregate_texts(
+        (load_text(text, language, filename, parsed=True, plan=plan) for text in texts), language, plan
+    )
+
+
+def _count_tokens(text: Union[ConllText, Text]) -> int:
+    if isinstance(text, Text):
+        return text.token_count
+    return sum(len(sentence) for paragraph in text.paragraphs for sentence in paragraph)
+
+
+def _iter_chunks(texts: Iterable[TT]) -> Iterator[List[TT]]:
+    chunk, tokens = [], 0
+    for text in texts:
+        chunk.append(text)
+        tokens += _count_tokens(text)
+        if tokens >= STATISTIC_CHUNK_TOKENS:
+            yield chunk
+            chunk, tokens = [], 0
+    if chunk:
+        yield chunk
+
+
+def iter_text_statistics(
+    input_path: Path, language: str, jobs: int,
+    include_tags: Optional[List[str]] = None, exclude_tags: Optional[List[str]] = None, use_snapshots: bool = False,
+    plan: Optional[StatisticPlan] = None
+) -> Iterator[Tuple[CorpusAggregate, List[SimpleNamespace]]]:
+    """Load the texts of a conll file or directory in jobs worker processes
+
+    The texts are loaded in chunks of about STATISTIC_CHUNK_TOKENS tokens, and the
+    aggregate of every chunk with the statistics of its texts is yielded in the
+    order of the texts, the aggregates are merged into the corpus by the caller.
+    With use_snapshots, the texts of the up-to-date snapshots are aggregated in the main process.
+    """
+    include_tags, exclude_tags = include_tags or [], exclude_tags or []
+    pending: Deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for conll_file in get_conll_files(input_path):
+            snapshot = read_snapshot(conll_file, language) if use_snapshots else None
+            if snapshot is not None:
+                while pending:
+                    yield pending.popleft().result()
+                for chunk in _iter_chunks(
+                    text for text in snapshot if is_text_included(text.labels, include_tags, exclude_tags)
+                ):
+                    yield aggregate_texts(chunk, language, plan)
+                continue
+            for chunk in _iter_chunks(
+                text for text in iter_selected_texts(conll_file, include_tags, exclude_tags)
+                if is_text_included(text.metadata, include_tags, exclude_tags)
+            ):
+                pending.append(executor.submit(load_text_chunk, chunk, language, conll_file, plan))
+                # keep a few chunks per worker in flight, the texts of the file are not read at once
+                if len(pending) >= jobs * 2:
+                    yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def snapshot_file(input_file: Path, language: str, texts: Optional[Iterable[Text]] = None) -> Path:
+    """Write the snapshot of the conll file, see snapshot.py
+
+    texts: texts loaded before, e.g. from the snapshots of the texts aggregated into the conll
+    file, which are taken over in order where they are the same as in the conll file
+    """
+    texts = iter(texts or [])
+    loaded_text = next(texts, None)
+
+    def _iter_texts() -> Iterator[Text]:
+        nonlocal loaded_text
+        for text in iter_conll_texts(input_file):
+            if loaded_text is not None and (loaded_text.text_id, loaded_text.labels) == (text.text_id, text.metadata):
+                yield loaded_text
+                loaded_text = next(texts, None)
+            else:
+                yield load_text(text, language, input_file, parsed=True)
+
+    return write_snapshot(input_file, language, _iter_texts())
+
+
+def snapshot_files(
+    conlls: List[Path], language: str, jobs: int = 1, aggregated_conll: Optional[Path] = None
+) -> None:
+    """Write the snapshots of the annotated conll files for statistic --snapshot, see snapshot.py
+
+    The snapshot of the aggregated conll file takes over the texts of the snapshots of the conll files.
+    """
+    start = time.perf_counter()
+    if jobs <= 1:
+        for conll in conlls:
+            snapshot_file(conll, language)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(partial(snapshot_file, language=language), conlls, chunksize=1))
+    if aggregated_conll:
+        snapshot_file(
+            aggregated_conll, language, (text for conll in conlls for text in read_snapshot(conll, language) or [])
+        )
+    logger.info(f"Snapshots of {len(conlls)} conll files written in {time.perf_counter() - start:.2f}s")
 
 
 def load_dir(
@@ -82,22 +276,19 @@ def load_dir(
 @StatisticLoading
 def load(
     input_path: Path, language: str,
-    include_tags: Optional[List[str]] = None, exclude_tags: Optional[List[str]] = None
+    include_tags: Optional[List[str]] = None, exclude_tags: Optional[List[str]] = None, parsed: bool = True,
+    use_snapshots: bool = False, plan: Optional[StatisticPlan] = None
 ) -> List[Text]:
+    """Load the texts of a conll file or directory into a corpus
 
-    include_tags = include_tags or []
-    exclude_tags = exclude_tags or []
-
-    if input_path.is_dir():
-        texts = load_dir(input_path, language, include_tags, exclude_tags)
-        if not texts:
-            raise InputError(f"Input directory {input_path} doesn't contain any conll files")
-    elif input_path.is_file():
-        if input_path.suffix != ".conll":
-            raise InputError(f"Only conll file valid, got {input_path.suffix.lstrip('.')}")
-        texts = load_file(input_path, language, include_tags, exclude_tags)
-    else:
-        raise InputError(f"Invalid input path: {input_path}")
+    The statistics of the linguistic aspects of the corpus are only loaded when
+    parsed is given as keyword argument, see StatisticLoading, and with a plan
+    only the planned statistics. With use_snapshots, the texts are read from the
+    snapshots of the conll files where they are up to date.
+    """
+    texts = list(iter_texts(input_path, language, include_tags, exclude_tags, parsed, use_snapshots, plan))
+    if not texts and input_path.is_dir():
+        raise InputError(f"Input directory {input_path} doesn't contain any conll files")
     return Corpus(texts=texts, language=language)
 
 
@@ -22,6 +22,7 @@ from argparse import ArgumentParser, Namespace
 from pathlib import Path
 
 from swegram_main.config import ASPECTS, UNITS
+from swegram_main.lib.counts import COUNT_ENGINES
 
 DESCRIPTION = """
 Swegram command line interface description
@@ -47,10 +48,45 @@ def _annotation_parser(annotation_parser: ArgumentParser) -> None:
         "--parse", dest="PARSE", action="store_true",
         help="Process syntactic dependency parsing."
     )
+    annotation_parser.add_argument(
+        "--compounds", dest="COMPOUNDS", action="store_true",
+        help="Mark compounds written as two words in Swedish texts, e.g. 'bil dörren', after tagging or parsing."
+    )
     annotation_parser.add_argument(
         "--aggregate", dest="AGGREGATE", action="store_true",
         help="Aggregate all annotated texts into one file."
     )
+    annotation_parser.add_argument(
+        "-j", "--jobs", dest="JOBS", type=int, default=1,
+        help="Number of processes annotating different texts at the same time."
+    )
+    annotation_parser.add_argument(
+        "--shard-size", dest="SHARD_SIZE", type=int, default=None,
+        help="Split texts larger than the given number of characters at paragraphs and annotate the parts"
+             " in parallel with --jobs."
+    )
+    annotation_parser.add_argument(
+        "--stream", dest="STREAM", action="store_true",
+        help="Annotate the texts in memory and only write the final files, without the intermediate files."
+    )
+    annotation_parser.add_argument(
+        "--cache-dir", dest="CACHE_DIR", type=Path, default=None,
+        help="Directory of the annotation cache, texts annotated before are restored from the cache."
+    )
+    annotation_parser.add_argument(
+        "--cache-size", dest="CACHE_SIZE", type=int, default=1024,
+        help="Size limit of the annotation cache in MB, the least recently used texts are removed first."
+    )
+    annotation_parser.add_argument(
+        "--sentence-memo", dest="SENTENCE_MEMO", nargs="?", type=Path, const=True, default=None,
+        help="Copy the annotation of repeated sentences instead of tagging and parsing them again."
+             " Given a path, the sentences are kept in a sqlite database across runs."
+    )
+    annotation_parser.add_argument(
+        "--snapshot", dest="SNAPSHOT", action="store_true",
+        help="Write a snapshot of each conll file with the loaded texts and statistics, which statistic"
+             " --snapshot reads instead of the conll file while it is unchanged. Requires parsed texts."
+    )
 
 
 def _statistic_parser(statistic_parser: ArgumentParser) -> None:
@@ -89,6 +125,23 @@ def _statistic_parser(statistic_parser: ArgumentParser) -> None:
         help="Certain features will be excluded."
     )
     statistic_parser.add_argument("--print", dest="PPRINT", action="store_true", help="Print statistic on console")
+    statistic_parser.add_argument(
+        "--stream", dest="STREAM", action="store_true",
+        help="Load the texts one at a time and only keep the aggregates of the corpus, for corpora larger than memory."
+    )
+    statistic_parser.add_argument(
+        "-j", "--jobs", dest="JOBS", type=int, default=1,
+        help="Number of processes loading the statistics of different texts at the same time."
+    )
+    statistic_parser.add_argument(
+        "--count-engine", dest="COUNT_ENGINE", choices=COUNT_ENGINES, default="dict",
+        help="Count the forms, norms, lemmas and tags in dicts, or in numpy arrays of interned ids."
+    )
+    statistic_parser.add_argument(
+        "--snapshot", dest="SNAPSHOT", action="store_true",
+        help="Read the texts from the snapshots written by annotate --snapshot where they are up to date."
+             " The snapshots are pickles, only use them for output directories of your own."
+    )
 
 
 def main_parser() -> Namespace:
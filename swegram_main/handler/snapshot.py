@@ -0,0 +1,90 @@
+"""Module of corpus snapshots
+
+The statistic command reads the conll files and computes the statistics of every
+text, paragraph and sentence, which takes far longer than the filtering by units,
+aspects and metadata. annotate --snapshot writes a snapshot next to each conll
+file, e.g. text.snapshot for text.conll, with a header of the snapshot format,
+the swegram version, the language and the md5 of the conll file, followed by the
+loaded texts with their statistics, pickled one text at a time.
+
+With statistic --snapshot, the snapshot is read instead of the conll file as
+long as the header matches, so an edited conll file is read again. The texts are
+unpickled one at a time, as the texts of a conll file are read with
+iter_conll_texts.
+
+The snapshots are pickles, and unpickling a file can run arbitrary code, so they
+are never read by default: only pass --snapshot, or use_snapshots, for output
+directories of your own.
+"""
+import os
+import pickle
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional
+
+from swegram_main.data.texts import Text
+from swegram_main.lib.logger import get_logger
+from swegram_main.lib.utils import change_suffix, get_md5
+from swegram_main.version import VERSION
+
+
+SNAPSHOT_SUFFIX = "snapshot"
+SNAPSHOT_FORMAT = 1
+
+logger = get_logger(__name__)
+
+
+def get_snapshot_path(conll: Path) -> Path:
+    return change_suffix(conll, SNAPSHOT_SUFFIX)
+
+
+def _get_header(conll: Path, language: str) -> Dict[str, Any]:
+    return {"format": SNAPSHOT_FORMAT, "version": VERSION, "language": language, "md5": get_md5(conll)}
+
+
+def write_snapshot(conll: Path, language: str, texts: Iterable[Text]) -> Path:
+    """Write the snapshot of the texts loaded from the conll file"""
+    snapshot_path = get_snapshot_path(conll)
+    tmp_path = snapshot_path.with_name(f"{snapshot_path.name}.tmp")
+    try:
+        with open(tmp_path, mode="wb") as snapshot_file:
+            pickle.dump(_get_header(conll, language), snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+            for text in texts:
+                pickle.dump(text, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return snapshot_path
+
+
+def read_snapshot(conll: Path, language: str) -> Optional[Iterator[Text]]:
+    """The texts of the snapshot of the conll file, None without a valid snapshot
+
+    Only called when the snapshots are explicitly used, see use_snapshots of iter_texts.
+    """
+    snapshot_path = get_snapshot_path(conll)
+    if not snapshot_path.exists():
+        return None
+    snapshot_file = open(snapshot_path, mode="rb")  # pylint: disable=consider-using-with
+    try:
+        header = pickle.load(snapshot_file)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as err:
+        snapshot_file.close()
+        logger.warning(f"Invalid snapshot {snapshot_path}, {err}")
+        return None
+    if header != _get_header(conll, language):
+        snapshot_file.close()
+        logger.info(f"Snapshot {snapshot_path} is outdated, reading {conll}")
+        return None
+    return _iter_snapshot(snapshot_file, conll)
+
+
+def _iter_snapshot(snapshot_file: BinaryIO, conll: Path) -> Iterator[Text]:
+    with snapshot_file:
+        while True:
+            try:
+                text = pickle.load(snapshot_file)
+            except EOFError:
+                return
+            text.filename = conll
+            yield text
@@ -1,80 +1,130 @@
 import json
 import os
-from copy import copy
+import shutil
+import sys
+import tempfile
+from contextlib import ExitStack, contextmanager
 from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Union
 
 from openpyxl import worksheet
 
+from swegram_main.config import UNITS
 from swegram_main.data.features import Feature
-from swegram_main.data.texts import Corpus
-from swegram_main.handler.handler import load
+from swegram_main.data.texts import Corpus, Text
+from swegram_main.handler.handler import iter_text_statistics, iter_texts, load
 from swegram_main.lib.utils import XlsxClient
+from swegram_main.statistics.statistic import CorpusAggregate, StatisticPlan
 
 
 class Visualization:
 
     def __init__(
         self, input_path: Path, language: str, output_dir: Optional[Path],
-        include_tags: Optional[List[str]], exclude_tags: Optional[List[str]]
+        include_tags: Optional[List[str]], exclude_tags: Optional[List[str]], stream: bool = False, jobs: int = 1,
+        use_snapshots: bool = False
     ) -> None:
         self.language = language
         self.input_path = input_path
-        include_labels = include_tags or []
-        exclude_labels = exclude_tags or []
-        self.labels = f"Include metadata: {' '.join(include_labels)}\n" if include_labels else ""
-        self.labels += f"Exclude metadata: {' '.join(exclude_labels)}\n" if exclude_labels else ""
-        self.corpus: Corpus = load(input_path, language, include_tags, exclude_tags)
+        # the keyword arguments of the texts loaded, selected by metadata and read from the snapshots with use_snapshots
+        self.text_options = {"include_tags": include_tags, "exclude_tags": exclude_tags, "use_snapshots": use_snapshots}
+        # The texts are loaded when the statistics are filtered, with only the statistics of the plan.
+        # With stream, the texts are loaded one at a time, with jobs > 1, the texts are loaded in worker
+        # processes, see iter_text_statistics, otherwise they are loaded into the corpus
+        self.stream = stream
+        self.jobs = jobs
+        self.corpus: Optional[Corpus] = None
+        self.plan: Optional[StatisticPlan] = None
         self.outdir = output_dir or Path(os.getcwd())
         os.makedirs(self.outdir, exist_ok=True)
+        self.pprint, self.save_as = False, "txt"
+
+    @property
+    def labels(self) -> str:
+        include_labels = self.text_options["include_tags"] or []
+        exclude_labels = self.text_options["exclude_tags"] or []
+        labels = f"Include metadata: {' '.join(include_labels)}\n" if include_labels else ""
+        labels += f"Exclude metadata: {' '.join(exclude_labels)}\n" if exclude_labels else ""
+        return labels
+
+    @property
+    def units(self) -> List[str]:
+        return self.plan.units
+
+    @property
+    def aspects(self) -> List[str]:
+        return self.plan.aspects
+
+    @property
+    def outfile_name(self) -> Path:
+        return self.outdir.joinpath(f"statistic-{self.input_path.with_suffix(f'.{self.save_as}').name}")
 
     def filter(
         self, units: List[str], aspects: List[str],
         include_features: List[str], exclude_features: List[str],
         pprint: bool = False, save_as: str = "txt"
     ) -> None:
-        self.units = units
         self.pprint = pprint
-        self.aspects = aspects
         self.save_as = save_as
-        data = OrderedDict()
-        if "corpus" in units:
-            data["corpus"] = self.filter_instance(self.corpus, include_features, exclude_features)
-        if "text" in units:
-            data["text"] = [
-                self.filter_instance(text, include_features, exclude_features) for text in self.corpus.texts
-            ]
-        if "paragraph" in units:
-            data["paragraph"] = [
-                [
-                    self.filter_instance(p, include_features, exclude_features)
-                    for p in text.paragraphs
-                ]
-                for text in self.corpus.texts
-            ]
-        if "sentence" in units:
-            data["sentence"] = [
-                [
-                    [
-                        self.filter_instance(s, include_features, exclude_features)
-                        for s in p.sentences
-                    ] for p in text.paragraphs
-                ] for text in self.corpus.texts
-            ]
-
-        self.outfile_name = self.outdir.joinpath(f"statistic-{self.input_path.with_suffix(f'.{save_as}').name}")
+        self.plan = StatisticPlan(self.language, units, aspects, include_features, exclude_features)
+        if not self.stream and self.jobs == 1:
+            self.corpus = load(self.input_path, self.language, parsed=True, plan=self.plan, **self.text_options)
+
+        if self.corpus is None and save_as == "txt":
+            self.save_stream()
+            return
+
+        data = self.load_data()
         if save_as == "txt" or pprint:
             self.save(data)
         if save_as == "json":
-            with open(self.outfile_name, code="w", encoding="utf-8") as output_file:
+            with open(self.outfile_name, mode="w", encoding="utf-8") as output_file:
                 data["metadata"] = self.get_json_info()
                 json_object = json.dumps(self.serialize_json_data(data), indent=4)
                 output_file.write(json_object)
         elif save_as == "xlsx":
             XlsxStatisticWriter(self.outfile_name).load(self.get_json_info(), self.aspects, data)
 
+    def load_data(self) -> OrderedDict:
+        """The statistics of the units, with stream or jobs only the statistics of the texts are kept"""
+        data = OrderedDict((unit, []) for unit in UNITS if unit in self.units)
+        aggregate = CorpusAggregate(self.language, self.plan)
+        for text in self.iter_texts(aggregate):
+            for unit, instance in self.filter_text(text).items():
+                data[unit].append(instance)
+        if "corpus" in data:
+            data["corpus"] = self.filter_instance(aggregate.load_corpus() if self.corpus is None else self.corpus)
+        return data
+
+    def iter_texts(self, aggregate: CorpusAggregate) -> Iterator[Union[Text, SimpleNamespace]]:
+        """The texts, or with jobs the statistics of their units, added to the aggregate without the corpus"""
+        if self.jobs > 1:
+            for chunk_aggregate, statistics in iter_text_statistics(
+                self.input_path, self.language, self.jobs, plan=self.plan, **self.text_options
+            ):
+                aggregate.merge(chunk_aggregate)
+                yield from statistics
+        elif self.stream:
+            for text in iter_texts(self.input_path, self.language, parsed=True, plan=self.plan, **self.text_options):
+                aggregate.add(text)
+                yield text
+        else:
+            yield from self.corpus.texts
+
+    def filter_text(self, text: Union[Text, SimpleNamespace]) -> OrderedDict:
+        """The statistics of the text, its paragraphs and sentences"""
+        data = OrderedDict()
+        if "text" in self.units:
+            data["text"] = self.filter_instance(text)
+        if "paragraph" in self.units:
+            data["paragraph"] = [self.filter_instance(p) for p in text.paragraphs]
+        if "sentence" in self.units:
+            data["sentence"] = [[self.filter_instance(s) for s in p.sentences] for p in text.paragraphs]
+        return data
+
     def serialize_json_data(self, data: Any) -> str:
         if isinstance(data, OrderedDict):
             for key, value in data.items():
@@ -87,10 +137,6 @@ class Visualization:
                 data[index] = self.serialize_json_data(instance)
         return data
 
-    def append_in_text(self, content: str, mode: str = "a+") -> None:
-        with open(self.outfile_name, mode, encoding="utf-8") as output_file:
-            output_file.write(f"{content}\n")
-
     def get_info(self) -> str:
         return "Swegram statistic\n" \
                f"Time: {str(datetime.now())}\n" \
@@ -110,46 +156,103 @@ class Visualization:
             instance_info.update({"Labels": self.labels})
         return instance_info
 
-    def filter_instance(
-        self, instance, include_features: List[str], exclude_features: List[str]
-    ) -> List[Dict[str, Dict[str, Union[int, float]]]]:
-        return [self.filter_aspect(instance, aspect, include_features, exclude_features) for aspect in self.aspects]
-
-    def filter_aspect(self, instance, aspect: str, include_features: List[str], exclude_features: List[str]):
-        aspect_dict = copy(getattr(instance, aspect))
-        if exclude_features:
-            for feature in exclude_features:
-                if feature in aspect_dict:
-                    del aspect_dict[feature]
-        if include_features:
-            for feature in aspect_dict:
-                if feature not in include_features:
-                    del aspect_dict[feature]
-        return aspect_dict
+    def filter_instance(self, instance) -> List[Dict[str, Dict[str, Union[int, float]]]]:
+        """The selected features of the aspects of the instance, computed on first access, see StatisticPlan"""
+        return [self.plan.select(getattr(instance, aspect)) for aspect in self.aspects]
+
+    def get_writer(self, output_file: Optional[TextIO]) -> "TextStatisticWriter":
+        """The writer on console with pprint, and in the output file opened with txt, see open_output"""
+        return TextStatisticWriter(self.aspects, sys.stdout if self.pprint else None, output_file)
 
     def save(self, data: OrderedDict) -> None:
-        if self.pprint:
-            print(self.get_info())
-        if self.save_as == "txt":
-            self.append_in_text(self.get_info(), mode="w")
-
-        for unit in data:
-            if unit == "corpus":
-                self.save_instance(None, unit, data[unit])
-            elif unit == "text":
-                for text_index, text_instance in enumerate(data[unit], 1):
-                    self.save_instance(str(text_index), unit, text_instance)
-            elif unit == "paragraph":
-                for ti, text_list in enumerate(data[unit], 1):
-                    for pi, paragraph_instance in enumerate(text_list, 1):
-                        self.save_instance(f"{ti}-{pi}", unit, paragraph_instance)
-            elif unit == "sentence":
-                for ti, text_list in enumerate(data[unit], 1):
-                    for pi, p_list in enumerate(text_list, 1):
-                        for si, sentence_instance in enumerate(p_list, 1):
-                            self.save_instance(f"{ti}-{pi}-{si}", unit, sentence_instance)
-            if self.pprint:
-                print()
+        with self.open_output() as output_file:
+            writer = self.get_writer(output_file)
+            writer.emit(self.get_info())
+            for unit in data:
+                if unit == "corpus":
+                    writer.save_instance(None, unit, data[unit])
+                else:
+                    for text_index, text_data in enumerate(data[unit], 1):
+                        writer.save_text_unit(unit, text_index, text_data)
+                writer.emit(text=False)
+
+    def save_stream(self) -> None:
+        """Save the statistics of the texts one at a time
+
+        The units of the texts are spooled into temporary files, in order to keep
+        the output of all texts of a unit together after the corpus.
+        """
+        aggregate = CorpusAggregate(self.language, self.plan)
+        text_units = [unit for unit in UNITS if unit != "corpus" and unit in self.units]
+        with ExitStack() as stack:
+            tmp_dir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+
+            def open_spool(name: str) -> TextIO:
+                return stack.enter_context(open(tmp_dir.joinpath(name), mode="w+", encoding="utf-8"))
+
+            spools = {
+                unit: TextStatisticWriter(
+                    self.aspects, open_spool(f"{unit}.console") if self.pprint else None, open_spool(f"{unit}.txt")
+                ) for unit in text_units
+            }
+            for text_index, text in enumerate(self.iter_texts(aggregate), 1):
+                for unit, text_data in self.filter_text(text).items():
+                    spools[unit].save_text_unit(unit, text_index, text_data)
+
+            with self.open_output() as output_file:
+                writer = self.get_writer(output_file)
+                writer.emit(self.get_info())
+                if "corpus" in self.units:
+                    writer.save_instance(None, "corpus", self.filter_instance(aggregate.load_corpus()))
+                    writer.emit(text=False)
+                for unit in text_units:
+                    writer.copy(spools[unit])
+                    writer.emit(text=False)
+
+    @contextmanager
+    def open_output(self) -> Iterator[Optional[TextIO]]:
+        """The output file with txt, otherwise None"""
+        if self.save_as != "txt":
+            yield None
+            return
+        with open(self.outfile_name, mode="w", encoding="utf-8") as output_file:
+            yield output_file
+
+
+class TextStatisticWriter:
+    """Write the statistics of the instances as tables, on console and in the txt output file
+
+    console, output_file: None if the statistics are not printed or written there
+    """
+
+    def __init__(self, aspects: List[str], console: Optional[TextIO], output_file: Optional[TextIO]) -> None:
+        self.aspects = aspects
+        self.console, self.output_file = console, output_file
+
+    def emit(self, content: str = "", console: bool = True, text: bool = True) -> None:
+        if self.console and console:
+            print(content, file=self.console)
+        if self.output_file and text:
+            self.output_file.write(f"{content}\n")
+
+    def copy(self, spool: "TextStatisticWriter") -> None:
+        """Copy the content written by the writer of spooled files"""
+        for source, target in ((spool.console, self.console), (spool.output_file, self.output_file)):
+            if source and target:
+                source.seek(0)
+                shutil.copyfileobj(source, target)
+
+    def save_text_unit(self, unit: str, text_index: int, text_data: Any) -> None:
+        """Save the statistics of a unit of the text, text, paragraph or sentence"""
+        if unit == "text":
+            self.save_instance(str(text_index), unit, text_data)
+        elif unit == "paragraph":
+            for pi, paragraph_instance in enumerate(text_data, 1):
+                self.save_instance(f"{text_index}-{pi}", unit, paragraph_instance)
+        elif unit == "sentence":
+            for pi, p_list in enumerate(text_data, 1):
+                for si, sentence_instance in enumerate(p_list, 1):
+                    self.save_instance(f"{text_index}-{pi}-{si}", unit, sentence_instance)
 
     def save_instance(self, index: Optional[str], unit: str, aspect_instances: List[OrderedDict]) -> None:
         self._save_instance_head()
@@ -157,30 +260,21 @@ class Visualization:
             self.save_aspect_title(unit, aspect_name, index)
             for fn, f in instance.items():
                 self.save_feature(fn, f)
-            if self.pprint:
-                print()
-        if self.pprint:
-            print()
-        if self.save_as == "txt":
-            self.append_in_text("")
+            self.emit(text=False)
+        self.emit(text=False)
+        self.emit(console=False)
 
     def save_aspect_title(self, unit: str, aspect_name: str, index: Optional[str]) -> None:
         title = f"{' ':>2}{'-'.join(e for e in (unit.title(), index, aspect_name) if e):>40}" \
                 f"{'|':>4}{'-'*13}|{'-'*13}|{'-'*13}|"
-        if self.pprint:
-            print(title)
-        if self.save_as == "txt":
-            self.append_in_text(title)
+        self.emit(title)
 
     def save_feature(self, fn: str, f: Feature) -> None:
         def c(v: Any) -> Any:
             return v or ""
 
         feature = f"{' ':>2}{fn:>40}{'|':>4}{c(f.scalar):>10}{'|':>4}{c(f.mean):>10}{'|':>4}{c(f.median):>10}{'|':>4}"
-        if self.pprint:
-            print(feature)
-        if self.save_as == "txt":
-            self.append_in_text(feature)
+        self.emit(feature)
 
     def _save_instance_head(self):
         af = "UNIT-ASPECT/Features"
@@ -189,10 +283,7 @@ class Visualization:
         median = "Median"
 
         heading = f"{' ':>2}{af:>40}{'|':>4}{scalar:>10}{'|':>4}{mean:>10}{'|':>4}{median:>10}{'|':>4}"
-        if self.pprint:
-            print(heading)
-        if self.save_as == "txt":
-            self.append_in_text(heading)
+        self.emit(heading)
 
 
 class XlsxStatisticWriter(XlsxClient):
@@ -0,0 +1,152 @@
+"""Module of the index of conll files
+
+The index of text.conll is written next to it as text.index, a json file with
+the byte ranges, metadata labels and ids of the texts of the conll file, and
+the byte ranges of the sentences of every paragraph. The texts selected by
+metadata are then read by seeking to their byte ranges, and a sentence is read
+without reading the file before it.
+
+The index is built by scanning the lines of the file with ConllLineScanner, as
+by iter_conll_texts, on the first read which needs it or when the conll files are
+aggregated, and is used as long as the size and modification time of the conll
+file are unchanged. The byte ranges are always parsed with iter_conll_texts.
+"""
+import json
+import os
+from hashlib import md5
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from swegram_main.lib.logger import get_logger
+from swegram_main.lib.utils import (
+    ConllFormatError, ConllLineScanner, ConllParagraphs, change_suffix, iter_conll_texts
+)
+
+
+INDEX_SUFFIX = "index"
+INDEX_FORMAT = 1
+
+logger = get_logger(__name__)
+
+
+class ConllIndexError(Exception):
+    """Conll Index Error"""
+
+
+class IndexedText(NamedTuple):
+    """A text of the index
+
+    start, end: byte range of the text, from its metadata line to the next text
+    paragraphs: byte ranges of the sentences of every paragraph
+    """
+    start: int
+    end: int
+    labels: Optional[Dict[str, str]]
+    text_id: str
+    paragraphs: List[List[Tuple[int, int]]]
+
+
+def get_index_path(conll: Path) -> Path:
+    return change_suffix(conll, INDEX_SUFFIX)
+
+
+def _get_file_state(conll: Path) -> Dict[str, int]:
+    stat = os.stat(conll)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _iter_lines(conll: Path) -> Iterator[Tuple[int, int, bytes, str]]:
+    """The byte range, the content without the newline and the newline of every line of the conll file"""
+    offset = 0
+    with open(conll, mode="rb") as conll_file:
+        for raw_line in conll_file:
+            line_start, offset = offset, offset + len(raw_line)
+            if raw_line.endswith(b"\r\n"):
+                raw_content, end = raw_line[:-2], "\n"
+            elif raw_line.endswith(b"\n"):
+                raw_content, end = raw_line[:-1], "\n"
+            else:
+                raw_content, end = raw_line, ""
+            if b"\r" in raw_content:
+                raise ConllIndexError(f"Carriage return without newline in {conll}, offset {line_start}")
+            yield line_start, offset, raw_content, end
+
+
+def build_index(conll: Path) -> List[IndexedText]:
+    """Scan the lines of the conll file for the byte ranges of its texts, paragraphs and sentences"""
+    texts: List[IndexedText] = []
+    scanner, paragraphs = ConllLineScanner(), ConllParagraphs()
+    text_start, labels, text_md5, offset = 0, None, md5(), 0
+
+    def _append_text(end: int) -> None:
+        # the byte ranges of the token lines of every sentence
+        line_ranges = paragraphs.close()
+        if line_ranges:
+            sentence_ranges = [
+                [[sentence[0][0], sentence[-1][1]] for sentence in sentences] for sentences in line_ranges
+            ]
+            texts.append(IndexedText(text_start, end, labels, text_md5.hexdigest(), sentence_ranges))
+
+    for line_start, offset, raw_content, end in _iter_lines(conll):
+        kind = scanner.scan(raw_content.decode("utf-8"))
+        if kind == ConllLineScanner.TEXT:
+            _append_text(line_start)
+            text_start, labels, text_md5 = line_start, scanner.metadata, md5()
+        elif kind != ConllLineScanner.SKIPPED:
+            paragraphs.add(kind, (line_start, offset))
+            text_md5.update(raw_content)
+            text_md5.update(end.encode())
+    _append_text(offset)
+    return texts
+
+
+def write_index(conll: Path) -> List[IndexedText]:
+    """Build the index of the conll file and write it next to the file"""
+    state = _get_file_state(conll)
+    texts = build_index(conll)
+    index_path = get_index_path(conll)
+    tmp_path = index_path.with_name(f"{index_path.name}.tmp")
+    try:
+        with open(tmp_path, mode="w", encoding="utf-8") as index_file:
+            json.dump({"format": INDEX_FORMAT, **state, "texts": [text._asdict() for text in texts]}, index_file)
+        os.replace(tmp_path, index_path)
+    except OSError as err:
+        logger.warning(f"Failed to write the index of {conll}, {err}")
+        tmp_path.unlink(missing_ok=True)
+    return texts
+
+
+def load_index(conll: Path) -> Optional[List[IndexedText]]:
+    """The index of the conll file, built if it is missing or outdated
+
+    None if the conll file can not be indexed, the file is then read from the beginning.
+    """
+    try:
+        with open(get_index_path(conll), mode="r", encoding="utf-8") as index_file:
+            index = json.load(index_file)
+        if index.get("format") == INDEX_FORMAT and all(
+            index.get(key) == value for key, value in _get_file_state(conll).items()
+        ):
+            return [IndexedText(**text) for text in index["texts"]]
+    except (OSError, ValueError, TypeError):
+        pass
+    try:
+        return write_index(conll)
+    except (ConllIndexError, ConllFormatError, UnicodeDecodeError) as err:
+        logger.warning(f"Failed to index {conll}, {err}")
+        return None
+
+
+def read_sentence(
+    conll: Path, text_index: int, paragraph_index: int, sentence_index: int, split_columns: bool = True
+) -> List[Union[str, Tuple[str, ...]]]:
+    """Read a sentence of the conll file by the indices of its text, paragraph and sentence, from 0"""
+    index = load_index(conll)
+    if index is None:
+        for position, text in enumerate(iter_conll_texts(conll, split_columns=split_columns)):
+            if position == text_index:
+                return text.paragraphs[paragraph_index][sentence_index]
+        raise IndexError(f"Text index out of range: {text_index}")
+    byte_range = index[text_index].paragraphs[paragraph_index][sentence_index]
+    text = next(iter_conll_texts(conll, split_columns=split_columns, byte_range=tuple(byte_range)))
+    return text.paragraphs[0][0]
@@ -6,21 +6,47 @@ Supported and tested formats:
 3. ODT
 4. RST
 
+docx and odt are zip files with the text in an xml document, which is read
+with an incremental parser, one paragraph (line) at a time. The other formats
+are converted with pandoc.
+
+The lines of a converted document are kept in memory by the md5 of the file,
+so that the same document uploaded again is not converted again.
+
 More on pandoc
 https://pandoc.org/MANUAL.html
 """
 import os
 import json
+import re
 import subprocess
+import threading
+import zipfile
+from collections import OrderedDict
+from hashlib import md5
 from itertools import chain
-from typing import Any
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional
 from pathlib import Path
+from xml.etree import ElementTree
 
 
 PANDOC = os.environ.get("PANDOC_PATH")  # SET PANDOC PATH  e.g. PANDOC = "./lib/pandoc-2.19.2/bin/pandoc"
 CONLLU_FOMRAT = "conll"
-VALID_FORMATS = ["docx", "rft", "odt", "rst"]
+VALID_FORMATS = ["docx", "rtf", "odt", "rst"]
 FORMAT_TYPES = ["Strong", "Emph", "MetaInlines"]
+CONVERSION_CACHE_SIZE = 64 * 1024 ** 2  # characters of the converted documents kept in memory
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+MARKUP_COMPATIBILITY_NS = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+ODF_TEXT_NS = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+ODF_OFFICE_NS = "{urn:oasis:names:tc:opendocument:xmlns:office:1.0}"
+# notes, comments, deleted text and descriptions of drawings are not part of the text
+ODF_IGNORED_TAGS = frozenset([
+    f"{ODF_TEXT_NS}note", f"{ODF_OFFICE_NS}annotation", f"{ODF_TEXT_NS}tracked-changes",
+    "{urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0}title",
+    "{urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0}desc"
+])
+WHITESPACE = re.compile(r"[ \t\r\n]+")
 
 
 class ConvertError(Exception):
@@ -31,21 +57,73 @@ class InvalidFormat(Exception):
     """Invalid format"""
 
 
+class ConversionCache:
+    """Lines of the converted documents by md5, the least recently used documents are removed first"""
+
+    def __init__(self, max_size: int = CONVERSION_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self._lines: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self.lock:
+            lines = self._lines.get(key)
+            if lines is not None:
+                self._lines.move_to_end(key)
+            return lines
+
+    def put(self, key: str, lines: List[str]) -> None:
+        size = sum(len(line) for line in lines)
+        with self.lock:
+            if key in self._lines or size > self.max_size:
+                return
+            self._lines[key] = lines
+            self.size += size
+            while self.size > self.max_size:
+                _, removed_lines = self._lines.popitem(last=False)
+                self.size -= sum(len(line) for line in removed_lines)
+
+
+_conversions = ConversionCache()
+
+
 class Converter:
     def __init__(self, filepath: Path) -> None:
         self.filepath = filepath 
 
     def parse(self):
-        converted = self._convert()
-        if isinstance(converted, dict):
-            meta = self.parse_meta(converted)
-            yield from chain(meta, self.parse_blocks(converted))
-        else:
+        suffix = self.filepath.suffix.lstrip(".")
+        if suffix in ["txt", CONLLU_FOMRAT]:
             with open(self.filepath, mode="r", encoding="utf-8") as input_file:
                 line = input_file.readline()
                 while line:
                     yield line
                     line = input_file.readline()
+            return
+
+        with open(self.filepath, mode="rb") as input_file:
+            key = md5(input_file.read()).hexdigest()
+        lines = _conversions.get(key)
+        if lines is not None:
+            yield from lines
+            return
+
+        lines = []
+        for line in self._extract(suffix):
+            lines.append(line)
+            yield line
+        _conversions.put(key, lines)
+
+    def _extract(self, suffix: str) -> Iterator[str]:
+        if suffix in EXTRACTORS:
+            try:
+                yield from EXTRACTORS[suffix](self.filepath)
+            except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as err:
+                raise ConvertError(f"Failed to covert: {err}") from err
+        else:
+            converted = self._convert()
+            yield from chain(self.parse_meta(converted), self.parse_blocks(converted))
 
     def _convert(self):
         try:  # pylint: disable=too-many-try-statements
@@ -91,3 +169,96 @@ class Converter:
         if tag == "Header":
             return "".join([self.parse_tag(c) for c in chunk["c"][2]])
         return ""
+
+
+def _paragraphs(
+    filepath: Path, member: str, paragraph_tags: FrozenSet[str],
+    get_text: Callable[[ElementTree.Element, List[ElementTree.Element]], str], ignored_tags: FrozenSet[str]
+) -> Iterator[str]:
+    """Parse the xml document of the zip file incrementally, yield the text of every paragraph as a line
+
+    A paragraph is cleared when it is read. get_text collects the text of the paragraph
+    and the paragraphs nested in it, e.g. in a text box, which are yielded after it.
+    The paragraphs in the ignored elements are skipped.
+    """
+    with zipfile.ZipFile(filepath) as archive, archive.open(member) as document:
+        depth, ignored = 0, 0
+        for event, element in ElementTree.iterparse(document, events=("start", "end")):
+            if element.tag in ignored_tags:
+                ignored += 1 if event == "start" else -1
+            if element.tag not in paragraph_tags or ignored:
+                continue
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth:
+                continue
+            nested: List[ElementTree.Element] = []
+            paragraphs = [get_text(element, nested)]
+            while nested:
+                paragraphs.append(get_text(nested.pop(0), nested))
+            for text in paragraphs:
+                # whitespace is collapsed as pandoc does, empty paragraphs are skipped
+                text = WHITESPACE.sub(" ", text).strip(" ")
+                if text:
+                    yield f"{text}\n"
+            element.clear()
+
+
+def _docx_text(paragraph: ElementTree.Element, nested: List[ElementTree.Element]) -> str:
+    """Text of a w:p, inserted text is kept and deleted text (w:delText) is skipped"""
+    parts = []
+
+    def walk(element: ElementTree.Element) -> None:
+        for child in element:
+            tag = child.tag
+            if tag == f"{WORD_NS}p":
+                nested.append(child)
+            elif tag == f"{WORD_NS}t":
+                parts.append(child.text or "")
+            elif tag in {f"{WORD_NS}tab", f"{WORD_NS}br", f"{WORD_NS}cr"}:
+                parts.append(" ")
+            elif tag == f"{WORD_NS}noBreakHyphen":
+                parts.append("-")
+            elif tag != f"{MARKUP_COMPATIBILITY_NS}Fallback":
+                # the fallback repeats the text of the drawing, e.g. a text box
+                walk(child)
+
+    walk(paragraph)
+    return "".join(parts)
+
+
+def _odt_text(paragraph: ElementTree.Element, nested: List[ElementTree.Element]) -> str:
+    """Text of a text:p or text:h, notes, annotations and tracked changes are skipped"""
+    parts = [paragraph.text or ""]
+
+    def walk(element: ElementTree.Element) -> None:
+        for child in element:
+            tag = child.tag
+            if tag in {f"{ODF_TEXT_NS}p", f"{ODF_TEXT_NS}h"}:
+                nested.append(child)
+            elif tag == f"{ODF_TEXT_NS}s":
+                parts.append(" " * int(child.get(f"{ODF_TEXT_NS}c", "1")))
+            elif tag in {f"{ODF_TEXT_NS}tab", f"{ODF_TEXT_NS}line-break"}:
+                parts.append(" ")
+            elif tag not in ODF_IGNORED_TAGS:
+                parts.append(child.text or "")
+                walk(child)
+            parts.append(child.tail or "")
+
+    walk(paragraph)
+    return "".join(parts)
+
+
+def extract_docx(filepath: Path) -> Iterator[str]:
+    return _paragraphs(filepath, "word/document.xml", frozenset([f"{WORD_NS}p"]), _docx_text, frozenset())
+
+
+def extract_odt(filepath: Path) -> Iterator[str]:
+    return _paragraphs(
+        filepath, "content.xml", frozenset([f"{ODF_TEXT_NS}p", f"{ODF_TEXT_NS}h"]), _odt_text, ODF_IGNORED_TAGS
+    )
+
+
+EXTRACTORS: Dict[str, Callable[[Path], Iterator[str]]] = {"docx": extract_docx, "odt": extract_odt}
@@ -0,0 +1,193 @@
+"""Module of the count arrays
+
+CountFeatures counts the forms, norms and lemmas with their tags, the tags and
+the words of every sentence in nine dicts, e.g. freq_form_dict_upos with keys
+like "hund_NOUN", and merges the dicts of the sentences into their paragraph,
+text and corpus, so the same keys are hashed again at every level.
+
+With the numpy count engine, the strings are interned into the vocabulary of the
+process, and the counts of a unit are kept as the ids of its keys with their
+counts. The id of a key of a string and a tag is the pair of their ids, string
+id << 32 | tag id. The count arrays of the units are merged by concatenating
+them, with np.unique and np.bincount. The ids of a sentence are only made unique
+when its counts are read, most are only merged into its paragraph. A count array
+is a mapping with the keys of the dict engine, decoded into a defaultdict on first
+access, which CompiledFeature gives the feature functions. It is pickled with its keys,
+as the ids are only valid in the process.
+
+The dict engine is the default. The numpy engine is enabled with
+set_count_engine("numpy"), or with the environment variable SWEGRAM_COUNT_ENGINE,
+which is also set for the worker processes.
+"""
+import os
+from collections import defaultdict
+from collections.abc import Mapping
+from itertools import chain
+from typing import DefaultDict, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+COUNT_ENGINES = ("dict", "numpy")
+COUNT_ENGINE_ENV = "SWEGRAM_COUNT_ENGINE"
+PAIR_SHIFT = 32
+TAG_MASK = (1 << PAIR_SHIFT) - 1
+
+
+class Vocabulary:
+    """Ids of the strings counted in the process, in the order they are first seen, "_" is 0"""
+
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {"_": 0}
+        self.strings: List[str] = ["_"]
+
+    def encode(self, strings: Iterable[str]) -> np.ndarray:
+        strings = list(strings)
+        encoded = [self.ids.get(string) for string in strings]
+        if None in encoded:  # new strings, or strings repeated after a new string
+            for index, string in enumerate(strings):
+                string_id = self.ids.get(string)
+                if string_id is None:
+                    string_id = self.ids[string] = len(self.strings)
+                    self.strings.append(string)
+                encoded[index] = string_id
+        return np.array(encoded, dtype=np.int64)
+
+
+VOCABULARY = Vocabulary()
+
+
+class CountArray(Mapping):
+    """Counts of the keys of a unit, as the ids of the keys and their counts
+
+    pair: the keys are pairs of a string and a tag, joined by "_" when decoded
+    unique: the ids are sorted and unique, otherwise they are made unique when the counts are read
+    """
+
+    __slots__ = ("_ids", "_counts", "pair", "unique", "_dict")
+
+    def __init__(self, ids: np.ndarray, counts: np.ndarray, pair: bool = False, unique: bool = True) -> None:
+        self._ids, self._counts, self.pair, self.unique = ids, counts, pair, unique
+        self._dict: Optional[DefaultDict[str, int]] = None
+
+    @classmethod
+    def from_ids(cls, ids: np.ndarray, ones: np.ndarray, pair: bool = False) -> "CountArray":
+        """The key ids of the tokens of a sentence, counted once each, ones: a count of 1 for every id"""
+        return cls(ids, ones, pair, unique=False)
+
+    @property
+    def ids(self) -> np.ndarray:
+        self._make_unique()
+        return self._ids
+
+    @property
+    def counts(self) -> np.ndarray:
+        self._make_unique()
+        return self._counts
+
+    def _make_unique(self) -> None:
+        if not self.unique:
+            self._ids, self._counts = self._merge_ids([self])
+            self.unique = True
+
+    @classmethod
+    def from_keys(
+        cls, keys: Sequence[Union[str, Tuple[str, str]]], counts: Sequence[int], pair: bool = False
+    ) -> "CountArray":
+        """The count array of decoded keys, strings or pairs of a string and a tag"""
+        if pair:
+            ids = VOCABULARY.encode(key for key, _ in keys) << PAIR_SHIFT | VOCABULARY.encode(tag for _, tag in keys)
+        else:
+            ids = VOCABULARY.encode(keys)
+        order = np.argsort(ids)
+        return cls(ids[order], np.array(counts, dtype=np.int64)[order], pair)
+
+    @classmethod
+    def merge(cls, arrays: List["CountArray"]) -> "CountArray":
+        """Merge the count arrays of the elements of a unit"""
+        if len(arrays) == 1:
+            return arrays[0]
+        return cls(*cls._merge_ids(arrays), arrays[0].pair)
+
+    @staticmethod
+    def _merge_ids(arrays: List["CountArray"]) -> Tuple[np.ndarray, np.ndarray]:
+        ids, inverse = np.unique(np.concatenate([array._ids for array in arrays]), return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=np.concatenate([array._counts for array in arrays]))
+        return ids, counts.astype(np.int64)
+
+    def _decode(self) -> List[Union[str, Tuple[str, str]]]:
+        strings = VOCABULARY.strings
+        if self.pair:
+            return [(strings[key_id >> PAIR_SHIFT], strings[key_id & TAG_MASK]) for key_id in self.ids.tolist()]
+        return [strings[key_id] for key_id in self.ids.tolist()]
+
+    def to_dict(self) -> DefaultDict[str, int]:
+        """The counts by the keys of the dict engine, e.g. "hund_NOUN", decoded once"""
+        if self._dict is None:
+            keys = [f"{key}_{tag}" for key, tag in self._decode()] if self.pair else self._decode()
+            self._dict = defaultdict(int, zip(keys, self.counts.tolist()))
+        return self._dict
+
+    def __getitem__(self, key: str) -> int:
+        return self.to_dict()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.to_dict()
+
+    def get(self, key: str, default: Optional[int] = None) -> Optional[int]:
+        return self.to_dict().get(key, default)
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def values(self):
+        return self.to_dict().values()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.to_dict()})"
+
+    def __reduce__(self):
+        return self.__class__.from_keys, (self._decode(), self.counts.tolist(), self.pair)
+
+
+def count_token_keys(token_keys: List[Tuple[str, str, str, str, str]]) -> List[CountArray]:
+    """The count arrays of the freq dicts of CountFeatures, from the form, norm, lemma, upos and xpos of the tokens"""
+    ids = VOCABULARY.encode(chain.from_iterable(token_keys)).reshape(len(token_keys), 5)
+    form_ids, norm_ids, lemma_ids, upos_ids, xpos_ids = ids.T
+    word_ids = np.where(norm_ids != 0, norm_ids, form_ids)  # the norm, or the form without a norm "_"
+    ones = np.ones(len(token_keys), dtype=np.int64)
+    return [
+        *(
+            CountArray.from_ids(string_ids << PAIR_SHIFT | tag_ids, ones, pair=True)
+            for tag_ids in (upos_ids, xpos_ids) for string_ids in (form_ids, norm_ids, lemma_ids)
+        ),
+        CountArray.from_ids(upos_ids, ones), CountArray.from_ids(xpos_ids, ones), CountArray.from_ids(word_ids, ones)
+    ]
+
+
+def get_count_engine() -> str:
+    return _COUNT_ENGINE
+
+
+def set_count_engine(engine: str) -> None:
+    """Set the count engine of the process and its worker processes, dict or numpy"""
+    global _COUNT_ENGINE  # pylint: disable=global-statement
+    if engine not in COUNT_ENGINES:
+        raise ValueError(f"Unknown count engine {engine}, choose one of {', '.join(COUNT_ENGINES)}")
+    _COUNT_ENGINE = engine
+    os.environ[COUNT_ENGINE_ENV] = engine
+
+
+_COUNT_ENGINE = "dict"
+
+if os.environ.get(COUNT_ENGINE_ENV):
+    set_count_engine(os.environ[COUNT_ENGINE_ENV])
@@ -0,0 +1,76 @@
+"""Module of the dependency tree index of a sentence
+
+The syntactic features of a sentence read the path from every token to the
+root, and the subtrees of the case, subordinate and relative clause tokens.
+The tree is indexed once per sentence: the children of every node, the order
+of the nodes in a depth-first walk from the root, where the subtree of a node
+is the span of the walk from the node to the end of its subtree, and the paths
+to the root, each from the path of its head. A sentence is then indexed in
+linear time, apart from the paths themselves, which are kept in the depth_list.
+"""
+from typing import Iterable, List, Optional, Set, Tuple
+
+
+class DependencyTree:
+    """Dependency tree index of a sentence
+
+    heads: the head of every token by its index, from 1, with None at index 0 for the root
+    """
+
+    __slots__ = ("heads", "children", "order", "starts", "ends", "paths")
+
+    def __init__(self, heads: List[Optional[int]]) -> None:
+        self.heads = heads
+        self.children: List[List[int]] = [[] for _ in heads]
+        for index in range(1, len(heads)):
+            self.children[heads[index]].append(index)
+
+        # depth-first walk from the root, children in the order of the sentence
+        self.order: List[int] = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            self.order.append(node)
+            stack.extend(reversed(self.children[node]))
+        if len(self.order) != len(heads):
+            raise ValueError(f"Not a dependency tree, nodes not reached from the root in heads {heads}")
+
+        sizes = [1] * len(heads)
+        for node in reversed(self.order[1:]):
+            sizes[heads[node]] += sizes[node]
+        self.starts = [0] * len(heads)
+        for position, node in enumerate(self.order):
+            self.starts[node] = position
+        self.ends = [start + size for start, size in zip(self.starts, sizes)]
+
+        self.paths: List[Tuple[int, ...]] = [(0,)] * len(heads)
+        for node in self.order[1:]:
+            self.paths[node] = (node, *self.paths[heads[node]])
+
+    def get_path(self, index: int) -> Tuple[int, ...]:
+        """The path from the node to the root, the node and its heads"""
+        return self.paths[index]
+
+    def get_depth(self, index: int) -> int:
+        return len(self.paths[index]) - 1
+
+    def get_subtree_size(self, index: int) -> int:
+        return self.ends[index] - self.starts[index]
+
+    def get_child_nodes(self, index: int) -> List[int]:
+        """All direct and indirect child nodes of the node"""
+        return self.order[self.starts[index] + 1:self.ends[index]]
+
+    def get_subtree_nodes(self, indices: Iterable[int], include_roots: bool = True) -> Set[int]:
+        """The nodes of the union of the subtrees of the nodes, with or without the nodes themselves"""
+        # +1 at the start and -1 at the end of every subtree span, covered where the sum is positive
+        boundaries = [0] * (len(self.order) + 1)
+        for index in indices:
+            boundaries[self.starts[index] + (0 if include_roots else 1)] += 1
+            boundaries[self.ends[index]] -= 1
+        nodes, covering = set(), 0
+        for position, node in enumerate(self.order):
+            covering += boundaries[position]
+            if covering:
+                nodes.add(node)
+        return nodes
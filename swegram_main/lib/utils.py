@@ -4,10 +4,11 @@ import os
 import shutil
 import tempfile
 from collections import Counter, OrderedDict, defaultdict
+from functools import partial
 from hashlib import md5
 from pathlib import Path
 from typing import (
-    Any, Callable, Dict, Generator, Iterator, List, Optional,
+    Any, Callable, Dict, Generator, Iterable, Iterator, List, NamedTuple, Optional,
     TextIO, TypeVar, Tuple, Union
 )
 
@@ -17,14 +18,15 @@ from openpyxl.reader.excel import load_workbook
 from swegram_main.config import XLSX_CONLL_SHEET_PREFIX
 from swegram_main.data.metadata import convert_xlsx_labels_to_string, parse_metadata
 from swegram_main.lib.converter import Converter
+from swegram_main.lib.counts import CountArray
 from swegram_main.lib.logger import get_logger
 
 
 FT = TypeVar("FT", bound=Iterator[Union[Dict[str, str], str]])
 FP = TypeVar("FP", bound=Tuple[str, callable, Optional[callable], Dict[str, List[Tuple[str, Any]]], Dict[str, Any]]) # Feature Parameters
-K = TypeVar("K", bound=Dict[str, List[Tuple[str, Any]]])
 N = TypeVar("N", List[Union[int, float]], Counter)
 T = TypeVar("T", bound=List[Tuple[List[List[List[str]]], Dict[str, str]]])
+CONLL_BLOCK_SIZE = 1024 ** 2  # characters read at a time by iter_conll_texts
 logger = get_logger(__name__)
 
 
@@ -158,8 +160,11 @@ def convert_sheet2conll(sheet: worksheet, output_file: TextIO) -> None:
 
 def get_md5(filepath: Path) -> str:
     """Get md5 value"""
+    md5_hash = md5()
     with codecs.open(filepath, "rb") as inputfile:
-        return md5(inputfile.read()).hexdigest()
+        for block in iter(lambda: inputfile.read(1024 ** 2), b""):
+            md5_hash.update(block)
+    return md5_hash.hexdigest()
 
 
 def get_conll_md5(filepath: Path) -> str:
@@ -195,75 +200,213 @@ def read(filepath: Path) -> Generator:
             line = input_file.readline()
 
 
-def _initialize_conllu_reading(file_content: FT) -> Tuple[Union[None, Dict[str, str]], Union[str, Dict[str, str]]]:
-    component = next(file_content)
-    while True:
-        # Skip blank lines in the beginning of the file content
-        if isinstance(component, str):
-            if not component.strip():
-                component = next(file_content)
-            else:
-                return None, component
-        elif isinstance(component, dict):
-            return component, next(file_content)
-        else:
-            raise MetaFormatError(f"Invalid format, got {type(component)}:{component}")
-    
+def _read_line_blocks(input_path: Path) -> Iterator[Tuple[List[str], str]]:
+    """Read the lines of the file in blocks, yield the lines without and the end of the lines"""
+    with open(input_path, mode="r", encoding="utf-8") as input_file:
+        rest = ""
+        for block in iter(partial(input_file.read, CONLL_BLOCK_SIZE), ""):
+            lines = (rest + block).split("\n")
+            rest = lines.pop()
+            yield lines, "\n"
+        if rest:
+            # the last line without a newline
+            yield [rest], ""
+
+
+class ConllText(NamedTuple):
+    """A text of a conll file
+
+    paragraphs: the sentences of every paragraph, the tokens of every sentence, a token
+        is the line, or the columns of the line if split
+    text_id: md5 of the token lines of the text
+    """
+    paragraphs: List[List[List[Union[str, List[str]]]]]
+    metadata: Optional[Dict[str, str]]
+    text_id: str
+
+
+def _read_range_lines(input_path: Path, start: int, end: int) -> Iterator[Tuple[List[str], str]]:
+    """Read the lines between the byte offsets start and end, as _read_line_blocks"""
+    with open(input_path, mode="rb") as input_file:
+        input_file.seek(start)
+        content = input_file.read(end - start).decode("utf-8")
+    lines = content.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    rest = lines.pop()
+    yield lines, "\n"
+    if rest:
+        yield [rest], ""
+
+
+class ConllLineScanner:
+    """Classify the lines of a conll file as the texts, paragraphs and sentences are split
+
+    A metadata line starts a new text, a blank line ends a sentence, two end a
+    paragraph, comment lines and the blank lines in the beginning of the file are
+    skipped. Shared by iter_conll_texts and the index of conll files, see conll_index.py.
+    """
+    TEXT, SKIPPED, TOKEN, SENTENCE, PARAGRAPH = "text", "skipped", "token", "sentence", "paragraph"
+
+    def __init__(self) -> None:
+        self.started = False
+        self.newline = 0
+        self.in_sentence = False
+        self.metadata: Optional[Dict[str, str]] = None
+
+    def scan(self, line: str) -> str:
+        """The kind of the line without its newline, the metadata of a TEXT line is kept in metadata
+
+        A token line is a TOKEN of the current sentence, or the first token of a new
+        SENTENCE or PARAGRAPH.
+        """
+        first = line[:1]
+        if first == "<" or (first.isspace() and line.lstrip().startswith("<")):
+            metadata = parse_metadata(line)
+            if metadata is not None:
+                self.started, self.newline, self.in_sentence = True, 0, False
+                self.metadata = metadata
+                return self.TEXT
+        if not line:
+            # a blank line, the newline was removed
+            if self.started:
+                self.newline += 1
+            return self.SKIPPED
+        if first == "#" and self.started:
+            return self.SKIPPED
+        if not self.started:
+            # blank lines are skipped in the beginning of the file
+            if not line.strip():
+                return self.SKIPPED
+            self.started = True
+            if first == "#":
+                return self.SKIPPED
+        if not self.newline:
+            self.in_sentence = True
+            return self.TOKEN
+        return self._get_boundary_kind()
+
+    def _get_boundary_kind(self) -> str:
+        """The kind of the first token line after blank lines"""
+        newline, in_sentence = self.newline, self.in_sentence
+        self.newline, self.in_sentence = 0, True
+        if newline == 2:
+            return self.PARAGRAPH
+        if newline == 1 and in_sentence:
+            return self.SENTENCE
+        raise ConllFormatError(f"Too many blank lines, max 2 newlines , but got {newline}")
+
+
+class ConllParagraphs:
+    """The sentences of every paragraph of a text, built from the kinds of ConllLineScanner"""
+
+    def __init__(self) -> None:
+        self.paragraphs: List[List[List[Any]]] = []
+        self.sentences: List[List[Any]] = []
+        self.sentence: List[Any] = []
+
+    def add(self, kind: str, token: Any) -> None:
+        """Add the token of a token line of the kind"""
+        if kind == ConllLineScanner.TOKEN:
+            self.sentence.append(token)
+            return
+        if kind == ConllLineScanner.PARAGRAPH:
+            self._end_paragraph()
+        elif kind == ConllLineScanner.SENTENCE:
+            self.sentences.append(self.sentence)
+            self.sentence = []
+        self.sentence.append(token)
+
+    def _end_paragraph(self) -> None:
+        if self.sentence:
+            self.sentences.append(self.sentence)
+        if self.sentences:
+            self.paragraphs.append(self.sentences)
+        self.sentences, self.sentence = [], []
+
+    def close(self) -> List[List[List[Any]]]:
+        """The paragraphs of the text, the next tokens start a new text"""
+        self._end_paragraph()
+        paragraphs, self.paragraphs = self.paragraphs, []
+        return paragraphs
+
+
+def iter_conll_texts(
+    input_path: Path, split_columns: bool = True, byte_range: Optional[Tuple[int, int]] = None
+) -> Iterator[ConllText]:
+    """Read the texts of a conll file one by one
+
+    The file is read in blocks of CONLL_BLOCK_SIZE characters, and only the lines
+    starting with < are parsed as metadata. The paragraphs, sentences and texts are
+    split as by the earlier line-by-line reader, see ConllLineScanner.
+
+    byte_range: only read the lines between the byte offsets, e.g. of a text in the
+    index of the conll file, see conll_index.py
+    """
+    blocks = _read_line_blocks(input_path) if byte_range is None else _read_range_lines(input_path, *byte_range)
+    scanner, paragraphs = ConllLineScanner(), ConllParagraphs()
+    meta: Optional[Dict[str, str]] = None
+    lines: List[str] = []
+
+    def _text() -> Optional[ConllText]:
+        text_paragraphs = paragraphs.close()
+        if text_paragraphs:
+            return ConllText(text_paragraphs, meta, get_content_md5("".join(lines).encode()))
+        if meta:
+            logger.warning(f"Medata data {meta}: text is empty")
+        return None
+
+    scan, add = scanner.scan, paragraphs.add
+    for block_lines, end in blocks:
+        for line in block_lines:
+            kind = scan(line)
+            if kind == ConllLineScanner.TEXT:
+                text = _text()
+                if text:
+                    yield text
+                meta, lines = scanner.metadata, []
+            elif kind != ConllLineScanner.SKIPPED:
+                add(kind, tuple(line.strip().split("\t")) if split_columns else f"{line}{end}")
+                lines.append(f"{line}{end}")
+    text = _text()
+    if text:
+        yield text
+
 
 def read_conll_file(input_path: Path) -> T:
     """Read conllu text"""
-    texts: T = []
-    paragraphs, sentences, sentence, = [], [], []
-    file_content = FileContent(input_path).get()
-
-    def _append_paragraph() -> None:
-        if sentence:
-            sentences.append(sentence)
-        if sentences:
-            paragraphs.append(sentences)
-
-    def _append_text(meta: Dict[str, str]) -> None:
-        _append_paragraph()
-        if paragraphs:
-            texts.append((paragraphs, meta))
-        elif meta:
-            logger.warning(f"Medata data {meta}: text is empty")
+    return [(text.paragraphs, text.metadata) for text in iter_conll_texts(input_path, split_columns=False)]
 
-    try:  # pylint: disable=too-many-try-statements
-        meta, component = _initialize_conllu_reading(file_content)
-        while True:
-            newline = 0
-            while True:
-                if isinstance(component, str):
-                    if component == "\n":
-                        newline += 1
-                    elif component.startswith("#"):
-                        pass
-                    elif not newline:
-                        sentence.append(component)
-                    elif newline == 2:
-                        _append_paragraph()
-                        sentences, sentence = [], [component]
-                        newline = 0
-                    elif newline == 1 and sentence:
-                        sentences.append(sentence)
-                        sentence = [component]
-                        newline = 0
-                    else:
-                        raise ConllFormatError(f"Too many blank lines, max 2 newlines , but got {newline}")
-                elif isinstance(component, dict):
-                    _append_text(meta)
-                    meta = component
-                    paragraphs, sentences, sentence = [], [], []
-                    break
-                else:
-                    raise MetaFormatError(f"Invalid format, got {type(component)}:{component}")
-                component = next(file_content)
-            component = next(file_content)
 
-    except StopIteration:
-        _append_text(meta)
-    return texts
+def cut_lines(
+    func: Callable, lines: Iterable[str], append_token_index: bool = False, append_text_index: bool = False
+) -> Iterator[str]:
+    """insertion in the annotation lines, see cut"""
+    index = 0
+    paragraph_index, sentence_index = 1, 1
+    num_newlines = 0
+    for line in lines:
+        if line.strip() and not line.strip().startswith("#"):
+            line = func(line)
+            if append_token_index:
+                if num_newlines > 0:
+                    index = 1
+                else:
+                    index += 1
+                line = "\t".join([str(index), line])
+
+            if append_text_index:
+                if num_newlines > 1:
+                    paragraph_index += 1
+                    sentence_index = 1
+                    num_newlines = 0
+                elif num_newlines == 1:
+                    sentence_index += 1
+                    num_newlines = 0
+                line = "\t".join([f"{paragraph_index}.{sentence_index}", line])
+            yield line
+        else:
+            yield line
+            if line == "\n":
+                num_newlines += 1
 
 
 def cut(
@@ -271,43 +414,13 @@ def cut(
     append_text_index: bool = False
 ) -> None:
     """insertion in the annotation files"""
-    lines = read(filepath)
-    index = 0
-    paragraph_index, sentence_index = 1, 1
-    num_newlines = 0
     with tempfile.NamedTemporaryFile(mode="w", encoding="utf-8") as output_file:
-        try:  # pylint: disable=too-many-try-statements
-            while True:
-                line = next(lines)
-                if line.strip() and not line.strip().startswith("#"):
-                    line = func(line)
-                    if append_token_index:
-                        if num_newlines > 0:
-                            index = 1
-                        else:
-                            index += 1
-                        line = "\t".join([str(index), line])
-                            
-                    if append_text_index:
-                        if num_newlines > 1:
-                            paragraph_index += 1
-                            sentence_index = 1
-                            num_newlines = 0
-                        elif num_newlines == 1:
-                            sentence_index += 1
-                            num_newlines = 0
-                        line = "\t".join([f"{paragraph_index}.{sentence_index}", line])
-                    output_file.write(line)
-                else:
-                    output_file.write(line)
-                    if line == "\n":
-                        num_newlines += 1
-        except StopIteration:
-            output_file.flush()
-            if output_path:
-                shutil.copy(output_file.name, output_path)
-            else:
-                shutil.copy(output_file.name, filepath)
+        output_file.writelines(cut_lines(func, read(filepath), append_token_index, append_text_index))
+        output_file.flush()
+        if output_path:
+            shutil.copy(output_file.name, output_path)
+        else:
+            shutil.copy(output_file.name, filepath)
 
 
 def change_suffix(filepath: Path, suffix: str) -> Path:
@@ -355,7 +468,10 @@ def merge_counters_for_fields(blocks: List[object], fields: List[str]) -> List[C
     return [merge_counters(blocks, field) for field in fields]
 
 
-def merge_dicts(blocks: List[object], field: str, data_type: type = int) -> defaultdict:
+def merge_dicts(blocks: List[object], field: str, data_type: type = int) -> Union[defaultdict, CountArray]:
+    values = [getattr(block, field) for block in blocks]
+    if values and all(isinstance(value, CountArray) for value in values):
+        return CountArray.merge(values)
     df = defaultdict(data_type)
     for block in blocks:
         for key, value in getattr(block, field).items():
@@ -397,50 +513,44 @@ def mixin_merge_digits_or_dicts(
     blocks: List[object], field: str,
     operation: callable = sum, data_type: type = int
 ) -> Any:
-    if isinstance(getattr(blocks[0], field), defaultdict):
+    if isinstance(getattr(blocks[0], field), (defaultdict, CountArray)):
         return merge_dicts(blocks, field, data_type) 
     return merge_digits(blocks, field, operation)
 
 
-def get_path(index: int, heads: List[Union[int, None]]) -> List[int]:
-    path = [index]
-    while index:
-        path.append(heads[index])
-        if len(path) > len(heads):
-            raise AnnotationError(f"Failed to get dependency path for index {index} in heads {heads}")
-        index = heads[index]
-    return path
-
-
-def get_child_nodes(index: int, heads: List[Union[int, None]]) -> List[int]:
-    """Get all direct and indirect child nodes given index node"""
-    child_nodes = []
-    while index in heads:
-        child = heads.index(index)
-        child_nodes.append(child)
-        heads[child] = None
-        for c in get_child_nodes(child, heads):
-            child_nodes.append(c)
-    return child_nodes
-
-
 def is_a_ud_tree(heads: List[str], error_prefix: str = "") -> Union[bool, str]:
     heads = [int(head) for head in heads]
-    children = list(range(1, len(heads)+1))
     if 0 not in heads:
         return f"{error_prefix} Root is missing."
-    if Counter(heads)[0] > 1:
+    if heads.count(0) > 1:
         return f"{error_prefix} More than one roots in sentence"
-    if len(children) > len(set(children)):
-        return f"{error_prefix} Same indeces for two nodes in sentence."
+    if not all(0 <= head <= len(heads) for head in heads):
+        return _walk_head_paths(heads, error_prefix)
+
+    # every node reaches the root unless it is on or below a cycle, each node is walked once
+    reaches_root = [True] + [False] * len(heads)
+    on_path = [False] * (len(heads) + 1)
+    for node in range(1, len(heads) + 1):
+        path = []
+        while not reaches_root[node]:
+            if on_path[node]:
+                return f"{error_prefix} Cycle Error in sentence."
+            on_path[node] = True
+            path.append(node)
+            node = heads[node - 1]
+        for visited in path:
+            reaches_root[visited] = True
+    return True
+
 
-    for i in children:
+def _walk_head_paths(heads: List[int], error_prefix: str) -> Union[bool, str]:
+    """Walk the heads from every node, for heads out of the sentence"""
+    for i in range(1, len(heads) + 1):
         head = [heads[i - 1]]
         while 0 not in head:
             if heads[head[-1] - 1] in head:
                 return f"{error_prefix} Cycle Error in sentence."
             head.append(heads[head[-1] - 1])
-        head = []
     return True
 
 
@@ -467,17 +577,6 @@ def prepare_feature(*args: Union[str, callable]) -> FP:
     return feature_name, feature_func, attribute_func, kwargs, attribute_kwargs
 
 
-def parse_args(kwarg_list: K, func: callable, content: Any, **kwargs) -> Dict[str, Any]:
-    args = kwarg_list.get("arg", [])
-    args.extend([
-        (
-            key,
-            func(content, attribute, **kwargs)
-        ) for key, attribute in kwarg_list.get("attribute", [])
-    ])
-    return dict(args)
-
-
 def incsc(c: Union[int, float], t: Union[int, float]) -> float:
     try:
         return r2(c * 1000, t)
@@ -0,0 +1,206 @@
+"""Module of the annotation cache
+
+The same texts are often annotated again, e.g. a class set of essays uploaded
+twice. The cache stores the annotation files of a text (.tok, .spell, .tag and
+.conll) after each stage, keyed by
+
+    md5 of the preprocessed text (.txt), model, model version, stage,
+    md5 of the existing .tok and .spell
+
+where the model version covers the swegram version and the model files used by
+the annotation tools, every file of the model directories, e.g. the scripts and
+resources of the normalizers, and the .spell hash stands for the normalization, which
+also tells uploaded normalized texts apart. Pipeline restores the cached files
+of a text before a stage and only runs the stage on the texts that were not
+cached. Texts which already have the output of the stage are left alone.
+
+The cache directory has one directory per entry, cache_dir/ab/abcdef.../,
+whose modification time is updated on every hit. When the size of the cache
+exceeds the limit, the least recently used entries are removed.
+"""
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from swegram_main.config import EFSELAB_DIR, HISTNORM_EN_DIR, HISTNORM_SV, UDPIPE_MODEL
+from swegram_main.data.texts import TextDirectory as TD
+from swegram_main.lib.logger import get_logger
+from swegram_main.lib.utils import get_content_md5, get_md5
+from swegram_main.version import VERSION
+
+
+ANNOTATION_SUFFIXES = ["tok", "spell", "tag", "conll"]
+STAGE_OUTPUTS = {"tokenize": "tok", "normalize": "spell", "tag": "tag", "parse": "conll"}
+DEFAULT_CACHE_SIZE = 1024 ** 3  # 1 GB
+MODEL_FILES = {
+    "efselab": [
+        EFSELAB_DIR.joinpath("suc.bin"),
+        EFSELAB_DIR.joinpath("suc-ud.bin"),
+        EFSELAB_DIR.joinpath("swe-pipeline", "old-swe-ud.mco"),
+        HISTNORM_SV
+    ],
+    "udpipe": [UDPIPE_MODEL, HISTNORM_EN_DIR]
+}
+NEWDOC_ID = "# newdoc id = "
+
+logger = get_logger(__name__)
+
+
+def get_model_version(model: str) -> str:
+    """Fingerprint of the swegram version and the size and modification time of the model files"""
+    fingerprint = [VERSION]
+    for path in MODEL_FILES.get(model, []):
+        for filepath in _iter_model_files(path):
+            name = filepath.relative_to(path.parent)
+            try:
+                stat = os.stat(filepath)
+                fingerprint.append(f"{name}:{stat.st_size}:{int(stat.st_mtime)}")
+            except OSError:
+                fingerprint.append(f"{name}:missing")
+    return get_content_md5("|".join(fingerprint).encode())
+
+
+def _iter_model_files(path: Path) -> Iterator[Path]:
+    """The model file, or the files in the model directory without the compiled python files"""
+    if not path.is_dir():
+        yield path
+        return
+    for filepath in sorted(path.rglob("*")):
+        if filepath.is_file() and "__pycache__" not in filepath.parts:
+            yield filepath
+
+
+class AnnotationCache:
+    """On-disk LRU cache of annotation files"""
+
+    def __init__(self, cache_dir: Path, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+        self.hits, self.misses = 0, 0
+        self.lock = threading.Lock()
+        self._model_versions: Dict[str, str] = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._entries: Dict[str, Tuple[float, int]] = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        """Read the last access time and size of all the entries"""
+        entries = {}
+        for prefix_dir in self.cache_dir.iterdir():
+            if not prefix_dir.is_dir():
+                continue
+            for entry_dir in prefix_dir.iterdir():
+                if entry_dir.name.startswith("."):
+                    continue
+                entries[entry_dir.name] = (
+                    entry_dir.stat().st_mtime, sum(path.stat().st_size for path in entry_dir.iterdir())
+                )
+        return entries
+
+    @property
+    def size(self) -> int:
+        return sum(size for _, size in self._entries.values())
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "size": self.size}
+
+    def key(self, text: TD, model: str, stage: str) -> Optional[str]:
+        """Cache key of the text, None if there is no raw text to annotate"""
+        if not text.filepath.exists():
+            return None
+        if model not in self._model_versions:
+            self._model_versions[model] = get_model_version(model)
+        inputs = [get_md5(path) if path.exists() else "-" for path in (text.tok, text.spell)]
+        return get_content_md5(
+            "|".join([get_md5(text.filepath), model, self._model_versions[model], stage, *inputs]).encode()
+        )
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir.joinpath(key[:2], key)
+
+    def restore(self, key: Optional[str], text: TD) -> bool:
+        """Copy the cached annotation files of the text into place, return whether it is a hit"""
+        entry_dir = self._entry_dir(key) if key else None
+        with self.lock:
+            if not entry_dir or not entry_dir.exists():
+                self.misses += 1
+                return False
+            for suffix in ANNOTATION_SUFFIXES:
+                cached_path = entry_dir.joinpath(suffix)
+                if cached_path.exists():
+                    _copy_annotation(cached_path, text.generate_path(suffix), text.filepath)
+            now = time.time()
+            os.utime(entry_dir, (now, now))
+            self._entries[key] = (now, self._entries.get(key, (now, 0))[1])
+            self.hits += 1
+            return True
+
+    def store(self, key: Optional[str], text: TD) -> None:
+        """Store the annotation files of the text"""
+        if not key:
+            return
+        entry_dir = self._entry_dir(key)
+        tmp_dir = entry_dir.parent.joinpath(f".{key}.{os.getpid()}")
+        with self.lock:
+            os.makedirs(tmp_dir, exist_ok=True)
+            size = 0
+            for suffix in ANNOTATION_SUFFIXES:
+                if text.generate_path(suffix).exists():
+                    shutil.copy(text.generate_path(suffix), tmp_dir.joinpath(suffix))
+                    size += tmp_dir.joinpath(suffix).stat().st_size
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # another process stored the entry in the meantime, it is kept
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                if not entry_dir.exists():
+                    raise
+                size = sum(path.stat().st_size for path in entry_dir.iterdir())
+            self._entries[key] = (time.time(), size)
+            self._evict()
+
+    def _evict(self) -> None:
+        total_size = self.size
+        for key, (_, size) in sorted(self._entries.items(), key=lambda entry: entry[1][0]):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            del self._entries[key]
+            total_size -= size
+
+    def restore_texts(self, texts: List[TD], model: str, stage: str) -> Tuple[List[TD], List[Optional[str]]]:
+        """Restore the cached texts, return the texts left to annotate and their keys"""
+        texts_to_annotate, keys = [], []
+        for text in texts:
+            if text.generate_path(STAGE_OUTPUTS[stage]).exists():
+                texts_to_annotate.append(text)
+                keys.append(None)
+                continue
+            key = self.key(text, model, stage)
+            if self.restore(key, text):
+                if stage == "normalize":
+                    # as in normalize, the tags and parses of the original tokens are outdated
+                    text.tag.unlink(missing_ok=True)
+                    text.conll.unlink(missing_ok=True)
+            else:
+                texts_to_annotate.append(text)
+                keys.append(key)
+        return texts_to_annotate, keys
+
+    def store_texts(self, texts: List[TD], keys: List[Optional[str]]) -> None:
+        for text, key in zip(texts, keys):
+            self.store(key, text)
+
+
+def _copy_annotation(cached_path: Path, target_path: Path, text_path: Path) -> None:
+    """Copy the cached file, with the udpipe document id pointing to the current text"""
+    with open(cached_path, mode="r", encoding="utf-8", newline="") as input_file:
+        with open(target_path, mode="w", encoding="utf-8", newline="") as output_file:
+            for line in input_file:
+                if line.startswith(NEWDOC_ID):
+                    line = f"{NEWDOC_ID}{text_path}\n"
+                output_file.write(line)
@@ -1,18 +1,59 @@
+"""Module of checking uploaded annotated texts
+
+The tags, deprels and features are looked up in sets, and the feature columns,
+which repeat a lot, are checked once per distinct value. A text can be checked
+in chunks of sentences by worker processes, with the errors reported in the
+order of the text, and the check stops after max_errors errors. The worker
+processes are shared by the texts of an upload, see preprocess.
+"""
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Tuple, List, Iterator
+from typing import Deque, Tuple, List, Iterator, Optional
 
 from swegram_main.config import UD_TAGS, PT_TAGS, SUC_TAGS, DEPRELS, XFEATS, FEATS
 from swegram_main.lib.utils import read, is_a_ud_tree
 
 
+UD_TAG_SET = frozenset(UD_TAGS)
+PT_TAG_SET = frozenset(PT_TAGS)
+SUC_TAG_SET = frozenset(SUC_TAGS)
+DEPREL_SET = frozenset(DEPRELS)
+XFEAT_SET = frozenset(XFEATS)
+FEAT_SETS = {key: frozenset(values) for key, values in FEATS.items()}
+SENTENCES_PER_CHUNK = 1000
+
+SentenceResult = Tuple[bool, bool, bool, List[str]]
+
+
 class UploadedTextValidationError(Exception):
     """Uploaded text validation error"""
 
 
-def checker(filepath: Path, model: str) -> Tuple[bool, bool, bool]:
+def checker(
+    filepath: Path, model: str, max_errors: Optional[int] = None, jobs: int = 1
+) -> Tuple[bool, bool, bool]:
     """check the status of uploaded text
     """
-    return check_text(model, read(filepath))
+    return check_text(model, read(filepath), max_errors, jobs)
+
+
+@lru_cache(maxsize=4096)
+def _unknown_xfeats(suc_features: str) -> Tuple[str, ...]:
+    return tuple(suc_feat for suc_feat in suc_features.split("|") if suc_feat not in XFEAT_SET)
+
+
+@lru_cache(maxsize=4096)
+def _unknown_ufeats(ud_features: str) -> Tuple[str, ...]:
+    unknown_ufeats = []
+    for ud_feat in ud_features.split("|"):
+        ud_feat_key, ud_feat_value = ud_feat.split("=", maxsplit=1)
+        if ud_feat_value not in FEAT_SETS.get(ud_feat_key, ()):
+            unknown_ufeats.append(f"{ud_feat_key}={ud_feat_value}")
+    return tuple(unknown_ufeats)
 
 
 def check_line(line: str, index: str, text_index: str, model: str) -> Tuple[bool, bool, bool, List[str]]:  # pylint: disable=too-many-locals
@@ -45,25 +86,22 @@ def check_line(line: str, index: str, text_index: str, model: str) -> Tuple[bool
     tagged = upos_tag != "_" and xpos_tag != "_"
     if tagged:
         parsed = head != "_" and deprel != "_"
-        if upos_tag not in UD_TAGS:
+        if upos_tag not in UD_TAG_SET:
             errors.append(f"{reference} COLUMN_UPOS_ERROR: Unknown upos {upos_tag}")
 
         if model.lower() == "efselab":
-            if xpos_tag not in SUC_TAGS:
+            if xpos_tag not in SUC_TAG_SET:
                 errors.append(f"{reference} COLUMN_XPOS_ERROR: Unknown xpos {xpos_tag}")
-            for suc_feat in suc_features.split("|"):
-                if suc_feat not in XFEATS:
-                    errors.append(f"{reference} COLUMN_XFEAT_ERROR: Unknown xfeat: {suc_feat}")
-        elif xpos_tag not in PT_TAGS:
+            for suc_feat in _unknown_xfeats(suc_features):
+                errors.append(f"{reference} COLUMN_XFEAT_ERROR: Unknown xfeat: {suc_feat}")
+        elif xpos_tag not in PT_TAG_SET:
             errors.append(f"{reference} COLUMN_XPOS_ERROR: Unknown xpos {xpos_tag}")
 
         if ud_features != "_":
-            for ud_feat in ud_features.split("|"):
-                ud_feat_key, ud_feat_value = ud_feat.split("=", maxsplit=1)
-                if ud_feat_key not in FEATS or ud_feat_value not in FEATS[ud_feat_key]:
-                    errors.append(f"{reference} COLUMN_FEAT_ERROR: Unknown ufeat: {ud_feat_key}={ud_feat_value}")
+            for ud_feat in _unknown_ufeats(ud_features):
+                errors.append(f"{reference} COLUMN_FEAT_ERROR: Unknown ufeat: {ud_feat}")
 
-        if parsed and deprel not in DEPRELS:
+        if parsed and deprel not in DEPREL_SET:
             errors.append(f"{reference} COLUMN_DEPREL_ERROR: Unknown deprel {deprel}")
         if parsed and not head.isdigit():
             errors.append(f"{reference} COLUMN_HEAD_ERROR: Expected to have digit, but got {head}")
@@ -93,37 +131,128 @@ def check_sentence(model: str, word_list: List[str], text_index: str):
     return all(normalized), all(tagged), parsed, errors
 
 
-def check_text(model: str, text: Iterator) -> None:
+def check_sentences(model: str, sentences: List[Tuple[List[str], str]]) -> List[SentenceResult]:
+    """Check a chunk of sentences with their text indices, in a worker process in the parallel mode"""
+    return [check_sentence(model, word_list, text_index) for word_list, text_index in sentences]
+
+
+@dataclass
+class SentenceBuffer:
+    """The lines of the current sentence, with the paragraph and sentence index in the text"""
+    lines: List[str] = field(default_factory=list)
+    p_index: int = 1
+    s_index: int = 1
+    newlines: int = 0
+
+    @property
+    def text_index(self) -> str:
+        return f"{self.p_index}.{self.s_index}"
+
+
+class TextChecker:
+    """Check an uploaded text line by line, see check_text
+
+    The lines of a sentence are checked when the sentence ends with a blank line,
+    or with an executor, a chunk of sentences is checked in a worker process.
+    """
+
+    def __init__(self, model: str, max_errors: Optional[int] = None, executor: Optional[Executor] = None) -> None:
+        self.model = model
+        self.max_errors = max_errors
+        self.buffer = SentenceBuffer()
+        self.normalized, self.tagged, self.parsed, self.errors = [], [], [], []
+        self.executor = executor
+        self.chunk: List[Tuple[List[str], str]] = []
+        self.pending: Deque[Future] = deque()
+        self.skipped = False
+
+    def __enter__(self) -> "TextChecker":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    @property
+    def stopped(self) -> bool:
+        return self.max_errors is not None and len(self.errors) >= self.max_errors
+
+    def feed(self, line: str) -> None:
+        buffer = self.buffer
+        if line.strip() and not line.startswith("#"):
+            buffer.lines.append(line)
+        elif line == "\n":
+            if buffer.lines:
+                self._check_sentence(buffer.lines, buffer.text_index)
+                buffer.s_index += 1
+                buffer.newlines = 1
+                buffer.lines = []
+            else:
+                if buffer.newlines == 1:
+                    buffer.p_index += 1
+                    buffer.s_index = 1
+                buffer.newlines += 1
+
+    def _check_sentence(self, word_list: List[str], text_index: str) -> None:
+        if self.stopped:
+            self.skipped = True
+            return
+        if self.executor is None:
+            self._add(check_sentence(self.model, word_list, text_index))
+            return
+        self.chunk.append((word_list, text_index))
+        if len(self.chunk) >= SENTENCES_PER_CHUNK:
+            self._submit()
+
+    def _submit(self) -> None:
+        if self.chunk:
+            self.pending.append(self.executor.submit(partial(check_sentences, self.model, self.chunk)))
+            self.chunk = []
+        # collect the finished chunks in order, so that a full error list stops the check early
+        while self.pending and self.pending[0].done():
+            for result in self.pending.popleft().result():
+                self._add(result)
+
+    def _add(self, result: SentenceResult) -> None:
+        _normalized, _tagged, _parsed, _errors = result
+        self.normalized.append(_normalized)
+        self.tagged.append(_tagged)
+        self.parsed.append(_parsed)
+        self.errors.extend(_errors)
+
+    def close(self) -> None:
+        """Cancel the chunks left, the executor is shut down by its owner"""
+        if self.executor:
+            for future in self.pending:
+                future.cancel()
+            self.executor = None
+
+    def result(self) -> Tuple[bool, bool, bool]:
+        """Return whether the text is normalized, tagged and parsed, raise the format errors if there are any"""
+        if self.executor:
+            try:
+                self._submit()
+                while self.pending and not self.stopped:
+                    for result in self.pending.popleft().result():
+                        self._add(result)
+                self.skipped = self.skipped or bool(self.pending)
+            finally:
+                self.close()
+        if self.errors:
+            errors = self.errors
+            if self.stopped and (self.skipped or len(errors) > self.max_errors):
+                errors = [*errors[:self.max_errors], f"Stopped checking after {self.max_errors} errors."]
+            raise UploadedTextValidationError("\n".join(errors))
+        return any(self.normalized), any(self.tagged), any(self.parsed)
+
+
+def check_text(
+    model: str, text: Iterator, max_errors: Optional[int] = None, jobs: int = 1
+) -> Tuple[bool, bool, bool]:
     """Check uploaded text if it is normalized, tagged or parsed, and check if there is any format error
     """
-    newlines = 0
-    p_index, s_index = 1, 1
-    sentence = []
-    line = next(text)
-    normalized, tagged, parsed, errors = [], [], [], []
-    try:
-        while True:
-            if line.strip() and not line.startswith("#"):
-                sentence.append(line)
-            elif line == "\n":
-                if sentence:
-                    _normalized, _tagged, _parsed, _errors = check_sentence(model, sentence, f"{p_index}.{s_index}")
-                    normalized.append(_normalized)
-                    tagged.append(_tagged)
-                    parsed.append(_parsed)
-                    errors.extend(_errors)
-                    s_index += 1
-                    newlines = 1
-                    sentence = []
-                else:
-                    if newlines == 1:
-                        p_index += 1
-                        s_index = 1
-                    newlines += 1
-            line = next(text)
-    except StopIteration:
+    with ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else nullcontext() as executor, \
+            TextChecker(model, max_errors, executor) as text_checker:
+        for line in text:
+            text_checker.feed(line)
         print("Process checking uploaded text done.")
-
-    if errors:
-        raise UploadedTextValidationError("\n".join(errors))
-    return any(normalized), any(tagged), any(parsed)
+        return text_checker.result()
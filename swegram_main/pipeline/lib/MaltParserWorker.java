@@ -0,0 +1,93 @@
+/*
+ * Long-lived MaltParser worker
+ *
+ * The parsing model is loaded once when the worker starts. After the model
+ * is loaded, the worker prints a ready line and then serves requests from
+ * stdin until stdin is closed.
+ *
+ * Request:  tab separated token lines as in the .tag file, sentences separated
+ *           by blank lines, terminated by a line containing only <EOT>.
+ * Response: the parsed sentences, each followed by a blank line, terminated by
+ *           a line containing only <EOT>. If parsing fails, a single line
+ *           starting with <ERR> is sent before <EOT> instead.
+ *
+ * The worker is started from swegram_main/pipeline/lib/parse.py with the java
+ * source launcher (java 11 or newer), e.g.
+ *     java -cp maltparser-1.9.0.jar MaltParserWorker.java old-swe-ud.mco
+ */
+import java.io.BufferedReader;
+import java.io.BufferedWriter;
+import java.io.File;
+import java.io.InputStreamReader;
+import java.io.OutputStreamWriter;
+import java.io.PrintWriter;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.List;
+
+import org.maltparser.concurrent.ConcurrentMaltParserModel;
+import org.maltparser.concurrent.ConcurrentMaltParserService;
+
+
+public class MaltParserWorker {
+
+    private static final String READY = "<READY>";
+    private static final String END_OF_TEXT = "<EOT>";
+    private static final String ERROR = "<ERR>";
+
+    public static void main(String[] args) throws Exception {
+        ConcurrentMaltParserModel model = ConcurrentMaltParserService.initializeParserModel(
+            new File(args[0]).toURI().toURL()
+        );
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        PrintWriter writer = new PrintWriter(
+            new BufferedWriter(new OutputStreamWriter(System.out, StandardCharsets.UTF_8))
+        );
+        writer.println(READY);
+        writer.flush();
+
+        List<String> sentence = new ArrayList<>();
+        StringBuilder response = new StringBuilder();
+        String error = null;
+        String line;
+        while ((line = reader.readLine()) != null) {
+            if (line.equals(END_OF_TEXT)) {
+                if (error == null) {
+                    error = parseSentence(model, sentence, response);
+                }
+                if (error == null) {
+                    writer.print(response);
+                } else {
+                    writer.println(ERROR + " " + error);
+                }
+                writer.println(END_OF_TEXT);
+                writer.flush();
+                sentence.clear();
+                response.setLength(0);
+                error = null;
+            } else if (line.trim().isEmpty()) {
+                if (error == null) {
+                    error = parseSentence(model, sentence, response);
+                }
+                sentence.clear();
+            } else {
+                sentence.add(line);
+            }
+        }
+    }
+
+    private static String parseSentence(ConcurrentMaltParserModel model, List<String> sentence, StringBuilder response) {
+        if (sentence.isEmpty()) {
+            return null;
+        }
+        try {
+            for (String token : model.parseTokens(sentence.toArray(new String[0]))) {
+                response.append(token).append('\n');
+            }
+            response.append('\n');
+            return null;
+        } catch (Exception err) {
+            return String.valueOf(err.getMessage()).replace('\n', ' ');
+        }
+    }
+}
@@ -0,0 +1,148 @@
+"""Module of the in-process efselab engine
+
+Running swe_pipeline.py for every text starts a new python interpreter and
+loads the tokenizer, the SUC tagger and the lemmatizer from disk each time.
+The engine loads these models once per process and annotates a batch of texts
+with them, so that the pipeline and the server only pay the start-up cost once.
+
+The output is written in the same files and formats as the subprocess mode:
+.tok for tokenization and .tag (the .tag.conll columns, see write_tagged_conll)
+for tagging. If the efselab modules can not be imported, or the environment
+variable SWEGRAM_IN_PROCESS_EFSELAB=0 is set, the subprocess mode is used.
+
+Attention: export pythonpath for efselab directory
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from swegram_main.config import EFSELAB_DIR
+from swegram_main.lib.logger import get_logger
+from swegram_main.lib.utils import AnnotationError, change_suffix, read
+from swegram_main.pipeline.cache import get_model_version
+from swegram_main.pipeline.lib.memo import get_memo
+from swegram_main.pipeline.lib.tag import tagged_conll_lines
+
+
+SUC_TAGGER_MODEL = os.path.join(EFSELAB_DIR, "suc.bin")
+LEMMATIZER_MODEL = os.path.join(EFSELAB_DIR, "suc-saldo.lemmas")
+IN_PROCESS_EFSELAB = os.environ.get("SWEGRAM_IN_PROCESS_EFSELAB", "1") != "0"
+
+logger = get_logger(__name__)
+
+
+class EfselabEngine:
+    """efselab tokenizer, SUC tagger and lemmatizer loaded once
+
+    The UD tagger is shared with write_tagged_conll, see get_ud_tagger.
+    Annotation is serialized with a lock so that one engine can be shared
+    by the threads of the server.
+    """
+
+    def __init__(self) -> None:
+        # pylint: disable=import-outside-toplevel
+        from tools.efselab import lemmatize, tagger, tokenizer
+
+        self.lock = threading.Lock()
+        self.tokenizer = tokenizer
+        self.suc_tagger = tagger.SucTagger(SUC_TAGGER_MODEL)
+        self.lemmatizer = lemmatize.SUCLemmatizer()
+        self.lemmatizer.load(LEMMATIZER_MODEL)
+
+    def tokenize_text(self, text: str) -> List[List[str]]:
+        """Segment and tokenize the text into sentences of tokens, as swe_pipeline.py does"""
+        return list(self.tokenizer.build_sentences(text))
+
+    def tag_sentence(self, words: List[str]) -> List[str]:
+        """Tag and lemmatize one sentence, return the lines of .tag.conll"""
+        if not words:
+            return []
+        suc_tags_list = self.suc_tagger.tag(words)
+        lemmas = [self.lemmatizer.predict(word, suc_tags) for word, suc_tags in zip(words, suc_tags_list)]
+        return tagged_conll_lines(words, lemmas, suc_tags_list)
+
+    def tag_sentences(self, sentences: List[List[str]]) -> List[List[str]]:
+        """Tag the sentences, the repeated ones are copied from the sentence memo if it is enabled"""
+        memo = get_memo()
+        if memo is None:
+            return [self.tag_sentence(words) for words in sentences]
+        return memo.annotate(
+            f"efselab:tag:{get_model_version('efselab')}",
+            [[f"{word}\n" for word in words] for words in sentences],
+            lambda unseen: [self.tag_sentence([line.rstrip("\n") for line in lines]) for lines in unseen]
+        )
+
+    def annotate(self, filepaths: Iterable[Path], tag: bool = False) -> None:
+        """Annotate a batch of texts
+
+        A .txt file is tokenized into .tok, and tagged into .tag if tag is set.
+        A .tok or .spell file, i.e. one token per line, is tagged into .tag.
+        """
+        with self.lock:
+            for filepath in filepaths:
+                try:
+                    if filepath.suffix == ".txt":
+                        sentences = self.tokenize_text("".join(read(filepath)))
+                        write_sentences(change_suffix(filepath, "tok"), ([f"{word}\n" for word in sentence]
+                                                                         for sentence in sentences))
+                    else:
+                        sentences = read_sentences(filepath)
+                    if tag:
+                        write_sentences(change_suffix(filepath, "tag"), self.tag_sentences(sentences))
+                except Exception as err:
+                    raise AnnotationError(f"Failed to annotate {filepath.name}, {err}") from err
+
+
+def read_sentences(filepath: Path) -> List[List[str]]:
+    """Read a file with one token per line and sentences separated by blank lines"""
+    return split_sentences(read(filepath))
+
+
+def split_sentences(lines: Iterable[str]) -> List[List[str]]:
+    sentences, words = [], []
+    for line in lines:
+        if line.strip():
+            words.append(line.strip())
+        elif words:
+            sentences.append(words)
+            words = []
+    if words:
+        sentences.append(words)
+    return sentences
+
+
+def write_sentences(filepath: Path, sentences: Iterable[List[str]]) -> None:
+    with open(filepath, mode="w", encoding="utf-8") as output_file:
+        for lines in sentences:
+            output_file.writelines(lines)
+            output_file.write("\n")
+
+
+_ENGINE: Optional[EfselabEngine] = None
+_ENGINE_LOCK = threading.Lock()
+_ENGINE_DISABLED = not IN_PROCESS_EFSELAB
+
+
+def get_engine() -> Optional[EfselabEngine]:
+    """Return the shared engine, or None if efselab can not be loaded in-process"""
+    global _ENGINE, _ENGINE_DISABLED  # pylint: disable=global-statement
+    with _ENGINE_LOCK:
+        if _ENGINE is None and not _ENGINE_DISABLED:
+            try:
+                _ENGINE = EfselabEngine()
+            except Exception as err:  # pylint: disable=broad-except
+                logger.warning("Failed to load efselab in-process, fall back to subprocess: %s", err)
+                _ENGINE_DISABLED = True
+        return _ENGINE
+
+
+def annotate(filepaths: Iterable[Path], tag: bool = False) -> bool:
+    """Annotate the texts with the shared engine, return False if the engine is not available
+    so that the caller can fall back to the subprocess mode
+    """
+    engine = get_engine()
+    if engine is None:
+        return False
+    engine.annotate(filepaths, tag=tag)
+    return True
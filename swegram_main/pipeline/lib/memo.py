@@ -0,0 +1,172 @@
+"""Module of sentence memoization
+
+Student corpora and templated texts repeat sentences, e.g. headings, prompts
+and boilerplate. The taggers and parsers annotate one sentence at a time, so an
+identical sentence gets an identical annotation. The memo keeps the annotated
+token lines of every sentence, keyed by the input token lines, and the tagging
+and parsing backends only send the sentences they have not seen to the tools.
+
+Only the token lines are memoized. The comments of a sentence, e.g. sent_id and
+newdoc, belong to its position and are taken from the sentence being annotated,
+and the text indices are added afterwards in postprocess.
+
+The memo is disabled by default. It is kept in memory with enable_memo(), or
+in a sqlite database shared across runs with enable_memo(path); the environment
+variable SWEGRAM_SENTENCE_MEMO does the same, with "1" for the in-memory memo.
+"""
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from swegram_main.lib.utils import get_content_md5
+
+
+Block = Tuple[List[str], List[str]]  # comment lines and token lines of a sentence
+MAX_MEMORY_ENTRIES = 200000
+
+
+class SentenceMemo:
+    """Annotated token lines of sentences, in memory or in a sqlite database"""
+
+    def __init__(self, path: Optional[Path] = None, max_entries: int = MAX_MEMORY_ENTRIES) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits, self.misses = 0, 0
+        self.lock = threading.Lock()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid = os.getpid()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # sqlite connections must not be shared with forked processes
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS memo (key TEXT PRIMARY KEY, value TEXT)")
+            self._pid = os.getpid()
+        return self._connection
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Share of the sentences which were not sent to the tools"""
+        return round(self.hits / max(self.hits + self.misses, 1), 4)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        return {"hits": self.hits, "misses": self.misses, "dedup_ratio": self.dedup_ratio}
+
+    def lookup(self, namespace: str, sentence: str) -> Optional[str]:
+        key = get_content_md5(f"{namespace}\n{sentence}".encode())
+        with self.lock:
+            if self.path:
+                row = self.connection.execute("SELECT value FROM memo WHERE key = ?", (key,)).fetchone()
+                value = row[0] if row else None
+            else:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def store(self, namespace: str, sentence: str, annotation: str) -> None:
+        key = get_content_md5(f"{namespace}\n{sentence}".encode())
+        with self.lock:
+            if self.path:
+                with self.connection:
+                    self.connection.execute("INSERT OR REPLACE INTO memo VALUES (?, ?)", (key, annotation))
+            else:
+                self._entries[key] = annotation
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def annotate(
+        self, namespace: str, sentences: List[List[str]], annotate: Callable[[List[List[str]]], List[List[str]]]
+    ) -> List[List[str]]:
+        """Annotate the token lines of the sentences
+
+        The sentences found in the memo are copied, the others are annotated once
+        each with one call of annotate, which takes and returns token lines.
+        """
+        annotations: List[Optional[List[str]]] = []
+        unseen: Dict[str, int] = {}
+        for lines in sentences:
+            sentence = "".join(lines)
+            annotation = self.lookup(namespace, sentence)
+            if annotation is None:
+                unseen.setdefault(sentence, len(unseen))
+                annotations.append(None)
+            else:
+                annotations.append(split_lines(annotation))
+        # repeated sentences within the call are annotated once as well
+        repeated = annotations.count(None) - len(unseen)
+        with self.lock:
+            self.hits, self.misses = self.hits + repeated, self.misses - repeated
+
+        if unseen:
+            unseen_sentences = list(unseen)
+            new_annotations = annotate([split_lines(sentence) for sentence in unseen_sentences])
+            if len(new_annotations) != len(unseen_sentences):
+                raise ValueError(
+                    f"Expected {len(unseen_sentences)} annotated sentences, got {len(new_annotations)}"
+                )
+            for sentence, lines in zip(unseen_sentences, new_annotations):
+                self.store(namespace, sentence, "".join(lines))
+            annotations = [
+                new_annotations[unseen["".join(lines)]] if annotation is None else annotation
+                for lines, annotation in zip(sentences, annotations)
+            ]
+        return annotations
+
+
+def split_lines(content: str) -> List[str]:
+    """Split into lines ending with "\\n", unlike str.splitlines, other line breaks are kept in the tokens"""
+    lines = content.split("\n")
+    return [f"{line}\n" for line in lines[:-1]] + ([lines[-1]] if lines[-1] else [])
+
+
+def read_blocks(content: str) -> List[Block]:
+    """Split CoNLL content into sentences of comment and token lines"""
+    blocks, comments, tokens = [], [], []
+    for line in split_lines(content):
+        if not line.strip():
+            if comments or tokens:
+                blocks.append((comments, tokens))
+            comments, tokens = [], []
+        elif line.startswith("#"):
+            comments.append(line)
+        else:
+            tokens.append(line)
+    if comments or tokens:
+        blocks.append((comments, tokens))
+    return blocks
+
+
+def write_blocks(blocks: List[Block]) -> str:
+    return "".join("".join([*comments, *tokens, "\n"]) for comments, tokens in blocks)
+
+
+_MEMO: Optional[SentenceMemo] = None
+
+
+def enable_memo(path: Optional[Path] = None) -> SentenceMemo:
+    """Enable the sentence memo of the process, persistent if a path of a sqlite database is given"""
+    global _MEMO  # pylint: disable=global-statement
+    if _MEMO is None or _MEMO.path != path:
+        _MEMO = SentenceMemo(path)
+    return _MEMO
+
+
+def get_memo() -> Optional[SentenceMemo]:
+    return _MEMO
+
+
+if os.environ.get("SWEGRAM_SENTENCE_MEMO"):
+    enable_memo(
+        None if os.environ["SWEGRAM_SENTENCE_MEMO"] == "1" else Path(os.environ["SWEGRAM_SENTENCE_MEMO"])
+    )
@@ -8,38 +8,163 @@ histnorm_en:
     3. engGramp2.py
 
 histnorm_sv:
+    1. normalise_levenshtein_elevtexter.perl
+    2. swedish.dic, swedish.train.txt, swedish.corp, threshold.swedish.elevtexter.txt
 
+Loading the dictionary of histnorm_sv into a trie takes far longer than
+normalizing a short text. Therefore, a long-lived perl worker (the --worker mode
+of the script) keeps the resources loaded and normalizes the texts of a run, and
+of later server requests, over stdin/stdout. The worker also keeps the
+candidates of every misspelled word it has looked up, so that a word is only
+looked up once across the corpus. Set the environment variable
+SWEGRAM_PERSISTENT_NORMALIZER=0 to always use the one-shot mode.
 """
+import atexit
 import os
 import subprocess
+import threading
 
 from pathlib import Path
+from typing import Optional
+from swegram_main.lib.logger import get_logger
 from swegram_main.lib.utils import write, AnnotationError
 from swegram_main.config import HISTNORM_SV
 from tools.udpipe.histnorm.engGramp2 import enggram_spellcheck
 
 
 RESOURCE = os.path.join(HISTNORM_SV, "resources", "swedish", "levenshtein")
+HISTNORM_SV_SCRIPT = os.path.join(HISTNORM_SV, "scripts", "normalise_levenshtein_elevtexter.perl")
+HISTNORM_SV_RESOURCES = [
+    os.path.join(RESOURCE, "swedish.dic"),
+    os.path.join(RESOURCE, "swedish.train.txt"),
+    os.path.join(RESOURCE, "swedish.corp"),
+    "noweights",
+    os.path.join(RESOURCE, "threshold.swedish.elevtexter.txt")
+]
+PERSISTENT_NORMALIZER = os.environ.get("SWEGRAM_PERSISTENT_NORMALIZER", "1") != "0"
+
+logger = get_logger(__name__)
+
+
+class NormalizationError(Exception):
+    """Error of the histnorm_sv worker"""
+
+
+class HistNormWorker:
+    """Long-lived histnorm_sv process which keeps the dictionary loaded
+
+    The protocol is described in the script. Requests are serialized with a lock
+    so that one worker can be shared by the threads of the server.
+    """
+
+    READY = b"<READY>\n"
+    END_OF_TEXT = b"<EOT>\n"
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        # a forked process, e.g. a pipeline job, must not share the pipes of its parent's worker
+        self.pid = os.getpid()
+        # the script reports every token on stderr, which is not read by anyone
+        self.process = subprocess.Popen(  # pylint: disable=consider-using-with
+            ["perl", "-CSAD", HISTNORM_SV_SCRIPT, "--worker", *HISTNORM_SV_RESOURCES],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        response = self.process.stdout.readline()
+        if response != self.READY:
+            self.close()
+            raise NormalizationError(f"Failed to start histnorm worker, got {response!r}")
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def normalize(self, filepath: Path, output_path: Path) -> bool:
+        """Normalize the tokens of the file and write the normalized tokens into output path
+
+        Return False if the file has a line <EOT>, which cannot be sent to the worker.
+        """
+        with open(filepath, mode="rb") as input_file:
+            content = input_file.read()
+        # the lines as the script reads them from the file
+        if content and not content.endswith(b"\n"):
+            content += b"\n"
+        if self.END_OF_TEXT in (b"\n" + content):
+            return False
+
+        with self.lock:
+            if not self.alive:
+                raise NormalizationError("Histnorm worker is not running.")
+            # the output is read while the text is written, the pipes would fill up on long texts
+            writer = threading.Thread(target=self._write, args=(content + self.END_OF_TEXT,))
+            writer.start()
+            normalized_lines = []
+            line = self.process.stdout.readline()
+            while line and line != self.END_OF_TEXT:
+                normalized_lines.append(line)
+                line = self.process.stdout.readline()
+            writer.join()
+            if not line:
+                raise NormalizationError(f"Histnorm worker exited while normalizing {filepath}")
+        write(filepath=output_path, context=b"".join(normalized_lines).decode())
+        return True
+
+    def _write(self, content: bytes) -> None:
+        try:
+            self.process.stdin.write(content)
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            pass
+
+    def close(self) -> None:
+        if self.alive:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+_worker: Optional[HistNormWorker] = None
+_worker_lock = threading.Lock()
+_worker_disabled = not PERSISTENT_NORMALIZER
+
+
+def get_normalizer_worker() -> Optional[HistNormWorker]:
+    """Get the shared histnorm_sv worker of the process, None if it is not available"""
+    global _worker, _worker_disabled  # pylint: disable=global-statement
+    with _worker_lock:
+        if _worker_disabled:
+            return None
+        if _worker is None or _worker.pid != os.getpid() or not _worker.alive:
+            try:
+                _worker = HistNormWorker()
+            except (OSError, NormalizationError) as err:
+                logger.warning(f"Histnorm worker is not available, fall back to one-shot mode: {err}")
+                _worker_disabled = True
+                return None
+            atexit.register(_worker.close)
+        return _worker
+
+
+def _normalize_sv(filepath: Path, output_file: Path) -> None:
+    worker = get_normalizer_worker()
+    if worker is not None and worker.normalize(filepath, output_file):
+        return
+    response = subprocess.run(
+        ["perl", "-CSAD", HISTNORM_SV_SCRIPT, str(filepath), *HISTNORM_SV_RESOURCES],
+        capture_output = True, check=False
+    )
+    if response.returncode != 0:
+        raise NormalizationError(response.stderr)
+    write(filepath=output_file, context=response.stdout.decode())
 
 
 def normalize(normalizer: str, filepath: Path) -> None:
+    output_file = filepath.parent.joinpath(os.path.extsep.join([filepath.stem, 'spell']))
     try:
-        output_file = filepath.parent.joinpath(os.path.extsep.join([filepath.stem, 'spell']))
         if normalizer.lower() == "histnorm_sv":
-            response = subprocess.run(
-                f"perl -CSAD {os.path.join(HISTNORM_SV, 'scripts', 'normalise_levenshtein_elevtexter.perl')} " \
-                f"{filepath} {os.path.join(RESOURCE, 'swedish.dic')} " \
-                f"{os.path.join(RESOURCE, 'swedish.train.txt')} " \
-                f"{os.path.join(RESOURCE, 'swedish.corp')} noweights " \
-                f"{os.path.join(RESOURCE, 'threshold.swedish.elevtexter.txt')}".split(),
-                capture_output = True, check=False
-            )
-            if response.returncode != 0:
-                raise AnnotationError(f"Failed to normalize, {response.stderr}")
-            write(filepath=output_file, context=response.stdout.decode())
-
+            _normalize_sv(filepath, output_file)
         elif normalizer.lower() == "histnorm_en":
             enggram_spellcheck(filepath, output_file)
-
     except Exception as err:
         raise AnnotationError(f"Failed to normalize, {err}") from err
@@ -6,40 +6,197 @@ The parse action is built on top of tagging. Here we assume that the user
 has file.tag and want to parse alone. We break up the code and provide a
 workaround solution for parsing according to efselab coding
 
+Starting maltparser means starting a JVM and loading the parsing model, which
+takes far longer than parsing a short text. Therefore, a long-lived maltparser
+worker (MaltParserWorker.java) keeps the model loaded and parses the texts of a
+run, and of later server requests, over stdin/stdout. Set the environment
+variable SWEGRAM_PERSISTENT_PARSER=0 to always use the one-shot mode.
+
 Attention: export pythonpath for efselab directory
 """
+import atexit
 import os
 import shutil
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
+from typing import Iterable, List, Optional
 
 
+from swegram_main.pipeline.cache import get_model_version
+from swegram_main.pipeline.lib.memo import get_memo, read_blocks, split_lines, write_blocks
 from swegram_main.pipeline.lib.tag import write_tagged_conll, TaggingError
-from swegram_main.lib.utils import write, AnnotationError
+from swegram_main.lib.logger import get_logger
+from swegram_main.lib.utils import change_suffix, read, write, AnnotationError
 from swegram_main.config import EFSELAB_DIR, UDPIPE, UDPIPE_MODEL
 
 
 EFSELAB_MODEL = os.path.join(EFSELAB_DIR, "swe-pipeline")
 MALT = os.path.join(EFSELAB_MODEL, "maltparser-1.9.0/maltparser-1.9.0.jar")
 PARSING_MODEL = os.path.join(EFSELAB_MODEL, "old-swe-ud")
+MALT_WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "MaltParserWorker.java")
+PERSISTENT_PARSER = os.environ.get("SWEGRAM_PERSISTENT_PARSER", "1") != "0"
+
+logger = get_logger(__name__)
 
 
 class ParsingError(Exception):
     """Error for standalone parse action"""
 
 
-def parse_from_tagged_file(filepath: Path) -> None:
+class MaltParserWorker:
+    """Long-lived maltparser process which keeps the parsing model loaded
+
+    The protocol is described in MaltParserWorker.java. Requests are serialized
+    with a lock so that one worker can be shared by the threads of the server.
+    """
+
+    READY = "<READY>"
+    END_OF_TEXT = "<EOT>"
+    ERROR = "<ERR>"
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        # a forked process, e.g. a pipeline job, must not share the pipes of its parent's worker
+        self.pid = os.getpid()
+        self.process = subprocess.Popen(  # pylint: disable=consider-using-with
+            ["java", "-Xmx2000m", "-cp", MALT, MALT_WORKER, f"{PARSING_MODEL}.mco"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, encoding="utf-8"
+        )
+        response = self.process.stdout.readline().strip()
+        if response != self.READY:
+            self.close()
+            raise ParsingError(f"Failed to start maltparser worker, got {response!r}")
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def parse(self, filepath: Path, output_path: Path) -> None:
+        """Parse the tagged conll file and write the parsed sentences into output path"""
+        write(filepath=output_path, context=self.parse_lines(read(filepath), str(filepath)))
+
+    def parse_lines(self, lines: Iterable[str], name: str = "text") -> str:
+        """Parse the lines of a tagged conll file, return the parsed sentences"""
+        with self.lock:
+            if not self.alive:
+                raise ParsingError("Maltparser worker is not running.")
+            for line in lines:
+                if line.strip() != self.END_OF_TEXT:
+                    self.process.stdin.write(line)
+            self.process.stdin.write(f"\n{self.END_OF_TEXT}\n")
+            self.process.stdin.flush()
+
+            parsed_lines = []
+            line = self.process.stdout.readline()
+            while line and line.rstrip("\n") != self.END_OF_TEXT:
+                parsed_lines.append(line)
+                line = self.process.stdout.readline()
+            if not line:
+                raise ParsingError(f"Maltparser worker exited while parsing {name}")
+        if parsed_lines and parsed_lines[0].startswith(self.ERROR):
+            raise ParsingError(f"Failed to parse {name}: {parsed_lines[0][len(self.ERROR):].strip()}")
+        return "".join(parsed_lines)
+
+    def close(self) -> None:
+        if self.alive:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+_worker: Optional[MaltParserWorker] = None
+_worker_lock = threading.Lock()
+_worker_disabled = not PERSISTENT_PARSER
+
+
+def get_parser_worker() -> Optional[MaltParserWorker]:
+    """Get the shared maltparser worker of the process, None if it is not available"""
+    global _worker, _worker_disabled  # pylint: disable=global-statement
+    with _worker_lock:
+        if _worker_disabled:
+            return None
+        if _worker is None or _worker.pid != os.getpid() or not _worker.alive:
+            try:
+                _worker = MaltParserWorker()
+            except (OSError, ParsingError) as err:
+                logger.warning(f"Maltparser worker is not available, fall back to one-shot mode: {err}")
+                _worker_disabled = True
+                return None
+            atexit.register(_worker.close)
+        return _worker
+
+
+def parse_from_tagged_file(filepath: Path, persistent: bool = True) -> None:
     """parse swedish text given a .tag file
     """
     if filepath.suffix != ".tag":
         raise ParsingError(f"Expected to get .tag, but got {filepath.suffix}.")
 
-    with tempfile.TemporaryDirectory() as tagged_conll_dir:
+    try:
+        write_tagged_conll(filepath)
+    except TaggingError:
+        print("Try with original tag file.")
+
+    output_path = change_suffix(filepath, "conll")
+    if get_memo() is None:
+        _parse_file(filepath, output_path, persistent)
+    else:
+        write(filepath=output_path, context=parse_tagged_content("".join(read(filepath)), persistent))
+
+
+def parse_tagged_content(content: str, persistent: bool = True) -> str:
+    """Parse the content of a .tag.conll file in memory, return the parsed content"""
+    memo = get_memo()
+    if memo is None:
+        return _parse_content(content, persistent)
+
+    annotations = memo.annotate(
+        f"maltparser:parse:{get_model_version('efselab')}",
+        [tokens for _, tokens in read_blocks(content) if tokens],
+        lambda sentences: _parse_sentences(sentences, persistent)
+    )
+    return write_blocks([([], tokens) for tokens in annotations])
+
+
+def _parse_sentences(sentences: List[List[str]], persistent: bool) -> List[List[str]]:
+    """Parse the token lines of the sentences, used by the sentence memo"""
+    content = _parse_content(write_blocks([([], tokens) for tokens in sentences]), persistent)
+    return [tokens for _, tokens in read_blocks(content)]
+
+
+def _parse_content(content: str, persistent: bool) -> str:
+    worker = get_parser_worker() if persistent else None
+    if worker:
         try:
-            write_tagged_conll(filepath)
-        except TaggingError:
-            print("Try with original tag file.")
+            return worker.parse_lines(split_lines(content))
+        except (OSError, ParsingError) as err:
+            logger.warning(f"{err}, retry in one-shot mode.")
+
+    # maltparser only reads files in one-shot mode
+    with tempfile.TemporaryDirectory() as sentence_dir:
+        filepath = Path(sentence_dir).joinpath(f"sentences{os.path.extsep}tag")
+        write(filepath=filepath, context=content)
+        _parse_one_shot(filepath, change_suffix(filepath, "conll"))
+        return "".join(read(change_suffix(filepath, "conll")))
+
+
+def _parse_file(filepath: Path, output_path: Path, persistent: bool) -> None:
+    worker = get_parser_worker() if persistent else None
+    if worker:
+        try:
+            worker.parse(filepath, output_path)
+            return
+        except (OSError, ParsingError) as err:
+            logger.warning(f"{err}, retry in one-shot mode.")
+    _parse_one_shot(filepath, output_path)
+
+
+def _parse_one_shot(filepath: Path, output_path: Path) -> None:
+    with tempfile.TemporaryDirectory() as tagged_conll_dir:
         shutil.copy(PARSING_MODEL + ".mco", tagged_conll_dir)
         parsed_filename = os.path.join(tagged_conll_dir, f"{filepath.stem}{os.path.extsep}conll")
         parser_cmdline = [
@@ -53,7 +210,7 @@ def parse_from_tagged_file(filepath: Path) -> None:
             "-c", os.path.basename(PARSING_MODEL)
         ]
         subprocess.run(parser_cmdline, check=False)
-        shutil.copy(parsed_filename, filepath.parent)
+        shutil.copy(parsed_filename, output_path)
 
 
 def parse(parser: str, filepath: Path) -> None:
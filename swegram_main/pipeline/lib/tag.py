@@ -5,8 +5,9 @@ import os
 import shutil
 import subprocess
 import tempfile
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 from swegram_main.lib.utils import AnnotationError, change_suffix, cut, write
 from swegram_main.config import EFSELAB_DIR, EFSELAB, UDPIPE, UDPIPE_MODEL
@@ -23,7 +24,23 @@ class TaggingError(Exception):
     """Tagging Error"""
 
 
-def write_tagged_conll(filepath: Path, tagged_path: Optional[Path] = None) -> None:  # pylint: disable=too-many-locals
+@lru_cache(maxsize=None)
+def get_ud_tagger() -> "tagger.UDTagger":
+    """Load the suc-to-ud tagger once per process"""
+    return tagger.UDTagger(UD_TAGGER_MODEL)
+
+
+def tagged_conll_lines(words: List[str], lemmas: List[str], suc_tags_list: List[str]) -> List[str]:
+    """Convert one tagged sentence into the lines of .tag.conll, see write_tagged_conll"""
+    lines = []
+    ud_tags_list = get_ud_tagger().tag(words, lemmas, suc_tags_list)
+    for index, (word, lemma, ud_tags, suc_tags) in enumerate(zip(words, lemmas, ud_tags_list, suc_tags_list), 1):
+        ud_tag, ud_features = ud_tags.split("|", maxsplit=1)
+        lines.append("\t".join([str(index), word, lemma, ud_tag, suc_tags, ud_features]) + "\n")
+    return lines
+
+
+def write_tagged_conll(filepath: Path, tagged_path: Optional[Path] = None) -> None:
     """Align the order of columns from .tag and convert it into .tag.conll
     which makes it possible to be parsed from efselab.
     
@@ -33,10 +50,9 @@ def write_tagged_conll(filepath: Path, tagged_path: Optional[Path] = None) -> No
     word, suc_tag, ud_tag, lemma
     Återupptagande	NN|NEU|SIN|IND|NOM	NOUN	återupptagande
     """
-    ud_tagger = tagger.UDTagger(UD_TAGGER_MODEL)
     # ud_tags_list is not extracted directly from .tag file
-    # Instead, ud_tags_list is generated from ud_tagger    
-    words, lemmas, ud_tags_list, suc_tags_list = [], [], [], []
+    # Instead, ud_tags_list is generated from ud_tagger
+    words, lemmas, suc_tags_list = [], [], []
     if not tagged_path:
         tagged_path = filepath.parent.joinpath(f"{filepath.stem}{os.path.extsep}tag")
     with tempfile.NamedTemporaryFile() as tmp_file:
@@ -51,16 +67,9 @@ def write_tagged_conll(filepath: Path, tagged_path: Optional[Path] = None) -> No
                             lemmas.append(lemma)
                             suc_tags_list.append(suc_tag)
                         elif not line.strip() and words:
-                            ud_tags_list = ud_tagger.tag(words, lemmas, suc_tags_list)
-                            for index, (word, lemma, ud_tags, suc_tags) in enumerate(
-                                zip(words, lemmas, ud_tags_list, suc_tags_list), 1
-                            ):
-                                ud_tag, ud_features = ud_tags.split("|", maxsplit=1)
-                                output_file.write(
-                                    "\t".join([str(index), word, lemma, ud_tag, suc_tags, ud_features]) + "\n"
-                                )
+                            output_file.writelines(tagged_conll_lines(words, lemmas, suc_tags_list))
                             output_file.write("\n")
-                            words, lemmas, ud_tags_list, suc_tags_list = [], [], [], []
+                            words, lemmas, suc_tags_list = [], [], []
                         line = input_file.readline()
 
                 except Exception as err:
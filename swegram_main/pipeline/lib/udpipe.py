@@ -0,0 +1,204 @@
+"""Module of batched udpipe annotation
+
+Every udpipe call loads the English model, which takes longer than annotating
+a short text. Here all the texts of a run are annotated with one udpipe process
+per stage, and the output is split back into the .tok, .tag and .conll files of
+each text, with the same content as one udpipe call per text would produce.
+
+tokenize: all the .txt files are given to the same udpipe call. udpipe starts
+          every input file with a new document, "# newdoc id = <filepath>",
+          which is used to split the output.
+tag, parse: the CoNLL-U files are concatenated into one stream, and each text
+          starts with a boundary comment which is kept by udpipe, and removed
+          when the output is split.
+
+If the sentence memo is enabled (see memo.py), tagging and parsing only send the
+sentences which have not been annotated before to udpipe.
+
+tokenize_file and annotate_content annotate a single text in memory, for the
+streaming mode of the pipeline (see stream.py).
+
+With the environment variable SWEGRAM_UDPIPE_BINDINGS=1 and the ufal.udpipe
+package installed, the model is loaded once per process with the python
+bindings instead of running the udpipe binary.
+"""
+import os
+import re
+import subprocess
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List
+
+from swegram_main.config import UDPIPE, UDPIPE_MODEL
+from swegram_main.lib.utils import AnnotationError, change_suffix, write
+from swegram_main.pipeline.cache import get_model_version
+from swegram_main.pipeline.lib.memo import SentenceMemo, get_memo, read_blocks, write_blocks
+
+
+TEXT_BOUNDARY = "# swegram text boundary = "
+TEXT_BOUNDARY_PATTERN = re.compile(rf"(?m)^{TEXT_BOUNDARY}(\d+)\n")
+NEWDOC_PATTERN = re.compile(r"(?m)^# newdoc id = (.*)\n")
+UDPIPE_BINDINGS = os.environ.get("SWEGRAM_UDPIPE_BINDINGS", "0") == "1"
+STAGES = {"tokenize": "tok", "tag": "tag", "parse": "conll"}
+
+
+class UDPipeModel:
+    """udpipe model loaded with the python bindings"""
+
+    def __init__(self) -> None:
+        from ufal import udpipe  # pylint: disable=import-outside-toplevel
+
+        self.udpipe = udpipe
+        self.model = udpipe.Model.load(str(UDPIPE_MODEL))
+        if not self.model:
+            raise AnnotationError(f"Failed to load udpipe model {UDPIPE_MODEL}")
+        self.lock = threading.Lock()
+
+    def _next_sentences(self, input_format: object) -> List[object]:
+        sentences, error = [], self.udpipe.ProcessingError()
+        sentence = self.udpipe.Sentence()
+        while input_format.nextSentence(sentence, error):
+            sentences.append(sentence)
+            sentence = self.udpipe.Sentence()
+        if error.occurred():
+            raise AnnotationError(error.message)
+        return sentences
+
+    def run(self, stage: str, content: str, document_id: str = "") -> str:
+        with self.lock:
+            if stage == "tokenize":
+                input_format = self.model.newTokenizer(self.udpipe.Model.DEFAULT)
+                input_format.resetDocument(document_id)
+            else:
+                input_format = self.udpipe.InputFormat.newConlluInputFormat()
+            input_format.setText(content)
+            output_format = self.udpipe.OutputFormat.newConlluOutputFormat()
+            output = []
+            for sentence in self._next_sentences(input_format):
+                if stage == "tag":
+                    self.model.tag(sentence, self.udpipe.Model.DEFAULT)
+                elif stage == "parse":
+                    self.model.parse(sentence, self.udpipe.Model.DEFAULT)
+                output.append(output_format.writeSentence(sentence))
+            output.append(output_format.finishDocument())
+        return "".join(output)
+
+
+@lru_cache(maxsize=None)
+def get_model() -> UDPipeModel:
+    return UDPipeModel()
+
+
+def _run_udpipe(stage: str, args: List[str], stdin: str = None) -> str:
+    response = subprocess.run(
+        [str(UDPIPE), f"--{stage}", *args], input=stdin.encode() if stdin is not None else None,
+        capture_output=True, check=False
+    )
+    if response.returncode != 0:
+        raise AnnotationError(f"Failed to {stage}: {response.stderr.decode()}")
+    return response.stdout.decode()
+
+
+def _split_documents(output: str, filepaths: List[Path]) -> Dict[Path, str]:
+    """Split tokenized output on the newdoc comments, which carry the input filepaths"""
+    ids = {str(filepath): filepath for filepath in filepaths}
+    matches = list(NEWDOC_PATTERN.finditer(output))
+    documents = {}
+    for match, next_match in zip(matches, [*matches[1:], None]):
+        if match.group(1) not in ids:
+            raise AnnotationError(f"Unexpected document in udpipe output: {match.group(1)}")
+        documents[ids[match.group(1)]] = output[match.start():next_match.start() if next_match else len(output)]
+    return documents
+
+
+def _read(filepath: Path) -> str:
+    with open(filepath, mode="r", encoding="utf-8") as input_file:
+        return input_file.read()
+
+
+def _concatenate(filepaths: List[Path]) -> str:
+    stream = []
+    for index, filepath in enumerate(filepaths):
+        content = _read(filepath).rstrip("\n")
+        stream.append(f"{TEXT_BOUNDARY}{index}\n")
+        if content:
+            stream.append(f"{content}\n\n")
+    return "".join(stream)
+
+
+def _split_stream(output: str, filepaths: List[Path]) -> Dict[Path, str]:
+    """Split the output on the boundary comments and remove them"""
+    matches = list(TEXT_BOUNDARY_PATTERN.finditer(output))
+    documents = {}
+    for match, next_match in zip(matches, [*matches[1:], None]):
+        documents[filepaths[int(match.group(1))]] = output[
+            match.end():next_match.start() if next_match else len(output)
+        ]
+    return documents
+
+
+def _annotate_sentences(stage: str, sentences: List[List[str]]) -> List[List[str]]:
+    """Annotate the token lines of the sentences with one udpipe call"""
+    content = write_blocks([([], tokens) for tokens in sentences])
+    if UDPIPE_BINDINGS:
+        output = get_model().run(stage, content)
+    else:
+        output = _run_udpipe(stage, ["--input=conllu", str(UDPIPE_MODEL)], stdin=content)
+    return [tokens for _, tokens in read_blocks(output)]
+
+
+def _annotate_with_memo(memo: SentenceMemo, stage: str, contents: List[str]) -> List[str]:
+    """Annotate the sentences not found in the memo, and put the comments of each sentence back"""
+    texts = [[block for block in read_blocks(content) if block[1]] for content in contents]
+    annotations = iter(memo.annotate(
+        f"udpipe:{stage}:{get_model_version('udpipe')}",
+        [tokens for blocks in texts for _, tokens in blocks],
+        lambda sentences: _annotate_sentences(stage, sentences)
+    ))
+    return [write_blocks([(comments, next(annotations)) for comments, _ in blocks]) for blocks in texts]
+
+
+def tokenize_file(filepath: Path) -> str:
+    """Tokenize one .txt file in memory, return the content of its .tok"""
+    if UDPIPE_BINDINGS:
+        return get_model().run("tokenize", _read(filepath), str(filepath))
+    return _run_udpipe("tokenize", [str(UDPIPE_MODEL), str(filepath)])
+
+
+def annotate_content(stage: str, content: str) -> str:
+    """Tag or parse CoNLL-U content in memory, return the annotated content"""
+    memo = get_memo()
+    if memo:
+        return _annotate_with_memo(memo, stage, [content])[0]
+    if UDPIPE_BINDINGS:
+        return get_model().run(stage, content)
+    return _run_udpipe(stage, ["--input=conllu", str(UDPIPE_MODEL)], stdin=content)
+
+
+def annotate(stage: str, filepaths: List[Path]) -> None:
+    """Annotate the files with one udpipe call, write each output next to its input file
+
+    stage: tokenize (.txt -> .tok), tag (.tok or .spell -> .tag), parse (.tag -> .conll)
+    """
+    if stage not in STAGES:
+        raise AnnotationError(f"Unknown udpipe stage: {stage}")
+    if not filepaths:
+        return
+
+    memo = get_memo()
+    if memo and stage != "tokenize":
+        documents = dict(zip(filepaths, _annotate_with_memo(memo, stage, [_read(path) for path in filepaths])))
+    elif UDPIPE_BINDINGS:
+        documents = {filepath: get_model().run(stage, _read(filepath), str(filepath)) for filepath in filepaths}
+    elif stage == "tokenize":
+        documents = _split_documents(
+            _run_udpipe(stage, [str(UDPIPE_MODEL), *[str(filepath) for filepath in filepaths]]), filepaths
+        )
+    else:
+        documents = _split_stream(
+            _run_udpipe(stage, ["--input=conllu", str(UDPIPE_MODEL)], stdin=_concatenate(filepaths)), filepaths
+        )
+
+    for filepath in filepaths:
+        write(filepath=change_suffix(filepath, STAGES[stage]), context=documents.get(filepath, ""))
@@ -1,24 +1,36 @@
 """Module of pipeline
 
-
-Unclear how compound check performs
+The stages tokenize, normalize, tag and parse write the annotation files of
+every text. The optional compound stage marks the split compounds of the tagged
+Swedish texts, see compounds.py.
 """
 
 import os
 import shutil
+import time
 
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 from shutil import SameFileError
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 from swegram_main.data.texts import TextDirectory as TD
+from swegram_main.pipeline.cache import AnnotationCache
 from swegram_main.pipeline.preprocess import preprocess
+from swegram_main.pipeline.shard import remove_shards, shard_text, stitch
+from swegram_main.pipeline.stream import stream_text
 from swegram_main.pipeline.postprocess import aggregate_conlls, save
 from swegram_main.pipeline.postprocess import postprocess as _postprocess
+from swegram_main.pipeline.lib import udpipe
+from swegram_main.pipeline.lib.compounds import mark_compounds_in_file
+from swegram_main.pipeline.lib.engine import annotate, get_engine
+from swegram_main.pipeline.lib.memo import get_memo
 from swegram_main.pipeline.lib.normalize import normalize as normalize_
 from swegram_main.pipeline.lib.parse import parse as parse_
 from swegram_main.pipeline.lib.tokenize import tokenize as tokenize_
-from swegram_main.pipeline.lib.tag import tag as tag_
+from swegram_main.pipeline.lib.tag import tag as tag_, restore_en_norm_file
 from swegram_main.lib.logger import get_logger
+from swegram_main.lib.utils import AnnotationError
 
 
 logger = get_logger(__name__)
@@ -33,12 +45,18 @@ class Pipeline:
     default_output_dir = "output"
 
     def __init__(
-        self, input_path: Path, output_dir: Optional[Path] = None, language: str = "sv"
+        self, input_path: Path, output_dir: Optional[Path] = None, language: str = "sv", jobs: int = 1,
+        cache: Optional[AnnotationCache] = None, shard_size: Optional[int] = None
     ) -> None:
         if not input_path.exists():
             raise FileNotFoundError(input_path)
 
         self.model = "efselab" if language == "sv" else "udpipe"
+        # number of worker processes annotating different texts at the same time
+        self.jobs = jobs
+        self.cache = cache
+        # texts larger than shard_size (characters) are split at paragraphs and annotated in shards
+        self.shard_size = shard_size
         self.input_path = input_path
         self.customized_output_dir = output_dir
         if self.customized_output_dir:
@@ -56,31 +74,83 @@ class Pipeline:
             pass
 
         self._preprocess()
+        self.aggregated_conll: Optional[Path] = None
         logger.debug(f"Working Directory: {self.output_dir}")
 
     def tokenize(self) -> None:
-        for text in self.texts:
-            if not text.tok.exists():
-                tokenize(self.model, text)
+        self._run_stage("tokenize")
 
     def normalize(self) -> None:
-        normalizer = "histnorm_en" if self.model in {"histnorm_en", "udpipe"} else "histnorm_sv"
-        for text in self.texts:
-            if not text.spell.exists():
-                normalize(normalizer, text)
+        self._run_stage("normalize")
 
     def tag(self) -> None:
-        for text in self.texts:
-            if not text.tag.exists():
-                tag(self.model, text)
+        self._run_stage("tag")
 
     def parse(self) -> None:
+        self._run_stage("parse")
+
+    def compounds(self) -> None:
+        """Mark the split compounds in the last annotation file of every tagged text"""
+        if self.model != "efselab":
+            raise PipelineError("Compounds are only detected in Swedish texts")
+        start = time.perf_counter()
+        num_compounds = 0
         for text in self.texts:
-            if not text.conll.exists():
-                parse(self.model, text)
+            if text.conll.exists():
+                num_compounds += mark_compounds_in_file(text.conll)
+            elif text.tag.exists():
+                num_compounds += mark_compounds_in_file(text.tag)
+            else:
+                raise PipelineError(f"Compounds are detected in tagged texts, {text.filepath.name} is not tagged")
+        logger.info(
+            f"Compounds: {num_compounds} split compounds in {len(self.texts)} texts, "
+            f"{time.perf_counter() - start:.2f}s"
+        )
+
+    def _run_stage(self, action: str) -> None:
+        """Run the stage over all texts, one batch in this process, or one batch per worker in a process pool
+        The texts found in the annotation cache are restored instead.
+        """
+        stage = STAGES[action]
+        texts, keys = self.texts, []
+        if self.cache:
+            texts, keys = self.cache.restore_texts(self.texts, self.model, action)
+            logger.debug(f"Annotation cache {action}: {self.cache.stats}")
+
+        # large texts are annotated in shards, see shard.py
+        shards = {}
+        for text in texts if self.shard_size else []:
+            text_shards = shard_text(text, self.shard_size)
+            if len(text_shards) > 1:
+                shards[text.filepath] = text_shards
+        units = [shard for text in texts for shard in shards.get(text.filepath, [text])]
+
+        memo = get_memo()
+        if self.jobs <= 1:
+            _run_stage_on_texts(stage, self.model, units)
+        else:
+            # one batch per worker, e.g. one udpipe process and model load for all texts of the batch
+            size = max(1, -(-len(units) // self.jobs))
+            batches = [units[index:index + size] for index in range(0, len(units), size)]
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                for hits, misses in executor.map(partial(_run_stage_on_texts, stage, self.model), batches):
+                    if memo:
+                        memo.hits, memo.misses = memo.hits + hits, memo.misses + misses
+
+        for text in texts:
+            if text.filepath in shards:
+                stitch(text, shards[text.filepath])
+        if self.cache:
+            self.cache.store_texts(texts, keys)
+        if memo:
+            logger.info(f"Sentence memo after {action}: {memo.stats}")
+
+    @property
+    def _chunksize(self) -> int:
+        return max(1, len(self.texts) // (self.jobs * 4))
 
     def _preprocess(self) -> None:
-        self.texts = preprocess(self.input_path, self.output_dir, self.model)
+        self.texts = preprocess(self.input_path, self.output_dir, self.model, self.jobs)
         self.output_dir.joinpath(self.input_path.name).unlink(missing_ok=True)
 
     def postprocess(self, save_as: str = "txt", aggregate: bool = False) -> None:
@@ -92,10 +162,54 @@ class Pipeline:
         if not conll, convert to .conll
         """
         cache_save_as = save_as if not aggregate else "txt"
-        normalization_tags, annotation_tags = [], []
-
         for text in self.texts:
-            normalized, annotated = _postprocess(text, self.model, cache_save_as)
+            remove_shards(text)
+        self._finalize(partial(_postprocess, model=self.model, save_as=cache_save_as), save_as, aggregate)
+
+    def stream(
+        self, action: str, normalize_tokens: bool = False, save_as: str = "txt", aggregate: bool = False,
+        compounds: bool = False
+    ) -> None:
+        """Annotate the texts up to action in memory and write the final files only, see stream.py
+
+        This replaces running the stages and postprocess. The file-based stages are run instead
+        if the texts have annotation files from the input, if the annotation cache is used,
+        which stores the files of every stage, if efselab can not be loaded in-process, or if
+        the compounds are marked in the annotation files.
+        """
+        if action not in STAGES:
+            raise PipelineError(f"{action} is not valid. Choose tokenize, normalize, tag or parse")
+        if (
+            self.cache or compounds or (self.model == "efselab" and get_engine() is None)
+            or any(text.tok.exists() or text.spell.exists() or text.tag.exists() for text in self.texts)
+        ):
+            if normalize_tokens:
+                self.normalize()
+            self.run(action, post_action=False)
+            if compounds:
+                self.compounds()
+            self.postprocess(save_as, aggregate)
+            return
+
+        self._finalize(
+            partial(
+                stream_text, model=self.model, action=action, normalize_tokens=normalize_tokens,
+                save_as=save_as if not aggregate else "txt"
+            ), save_as, aggregate
+        )
+        memo = get_memo()
+        if memo:
+            logger.info(f"Sentence memo after {action}: {memo.stats}")
+
+    def _finalize(self, finalize: Callable[[TD], Tuple[bool, str]], save_as: str, aggregate: bool) -> None:
+        """Finalize every text, check that the texts are annotated alike and aggregate them"""
+        normalization_tags, annotation_tags = [], []
+        if self.jobs <= 1:
+            tags = [finalize(text) for text in self.texts]
+        else:
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                tags = list(executor.map(finalize, self.texts, chunksize=self._chunksize))
+        for normalized, annotated in tags:
             normalization_tags.append(normalized)
             annotation_tags.append(annotated)
 
@@ -109,6 +223,7 @@ class Pipeline:
 
         if aggregate:
             conll_filename = aggregate_conlls([text.conll for text in self.texts])
+            self.aggregated_conll = Path(conll_filename)
             if save_as != "txt":
                 save(save_as, Path(conll_filename), self.model, normalization_tags[0], annotation_tags[0])
 
@@ -148,6 +263,85 @@ def normalize(normalizer: str, text: TD) -> None:
     text.conll.unlink(missing_ok=True)
 
 
+def tokenize_texts(model: str, texts: List[TD]) -> None:
+    texts = [text for text in texts if not text.tok.exists()]
+    if model == "efselab" and annotate([text.filepath for text in texts]):
+        return
+    if model == "udpipe":
+        udpipe.annotate("tokenize", [text.filepath for text in texts])
+        return
+    for text in texts:
+        tokenize(model, text)
+
+
+def normalize_texts(model: str, texts: List[TD]) -> None:
+    normalizer = "histnorm_en" if model in {"histnorm_en", "udpipe"} else "histnorm_sv"
+    texts = [text for text in texts if not text.spell.exists()]
+    tokenize_texts(model, texts)
+    for text in texts:
+        normalize(normalizer, text)
+
+
+def tag_texts(model: str, texts: List[TD]) -> None:
+    texts = [text for text in texts if not text.tag.exists()]
+    if model == "efselab" and annotate([get_tagging_input(text) for text in texts], tag=True):
+        return
+    if model == "udpipe":
+        tokenize_texts(model, [text for text in texts if not text.spell.exists()])
+        filepaths = [get_tagging_input(text) for text in texts]
+        for filepath in filepaths:
+            if filepath.suffix == ".spell":
+                restore_en_norm_file(filepath)
+        udpipe.annotate("tag", filepaths)
+        return
+    for text in texts:
+        tag(model, text)
+
+
+def parse_texts(model: str, texts: List[TD]) -> None:
+    # tag the texts in one batch before parsing them
+    tag_texts(model, texts)
+    texts = [text for text in texts if not text.conll.exists()]
+    if model == "udpipe":
+        udpipe.annotate("parse", [text.tag for text in texts])
+        return
+    for text in texts:
+        parse(model, text)
+
+
+STAGES = {"tokenize": tokenize_texts, "normalize": normalize_texts, "tag": tag_texts, "parse": parse_texts}
+
+
+def _run_stage_on_texts(stage: Callable[[str, List[TD]], None], model: str, texts: List[TD]) -> Tuple[int, int]:
+    """Run the stage on a batch of texts, the error carries the name of the text which fails
+    If the batch fails, its texts are annotated one by one to find the text.
+    Return the sentence memo hits and misses of the texts, to be reported by the main process of the workers
+    """
+    memo = get_memo()
+    hits, misses = (memo.hits, memo.misses) if memo else (0, 0)
+    try:
+        stage(model, texts)
+    except Exception as err:
+        if len(texts) == 1:
+            raise AnnotationError(f"{texts[0].filepath.name}: {err}") from err
+        for text in texts:
+            _run_stage_on_texts(stage, model, [text])
+        raise AnnotationError(f"{', '.join(text.filepath.name for text in texts)}: {err}") from err
+    return (memo.hits - hits, memo.misses - misses) if memo else (0, 0)
+
+
+def get_tagging_input(text: TD) -> Path:
+    """Return the file to be tagged in a batch: .spell, .tok or .txt to be tokenized first"""
+    if text.spell.exists():
+        # in case the uploaded normalized texts
+        if not text.tok.exists():
+            shutil.copy(text.spell, text.tok)
+        return text.spell
+    if text.tok.exists():
+        return text.tok
+    return text.filepath
+
+
 def tag(tagger: str, text: TD) -> None:
     if not text.tok.exists() and not text.spell.exists():
         tokenize_(tagger, text.filepath)
@@ -2,19 +2,21 @@
 
 """
 import fileinput
+import io
 import json
 import os
 import shutil
 from datetime import datetime
 from pathlib import Path
-from typing import Iterator, Optional, List, Dict, Tuple
+from typing import Callable, Iterable, Iterator, Optional, List, Dict, Tuple
 
 from swegram_main.config import (
     AGGREGATION_CONLLS, EMPTY_METADATA, JSON_CONLL_CORPUS_KEY, JSON_CONLL_METADATA_KEY, JSON_CONLL_TEXT_KEY
 )
 from swegram_main.data.metadata import parse_metadata, convert_labels_to_string
 from swegram_main.data.texts import TextDirectory as TD
-from swegram_main.lib.utils import change_suffix, cut, read, read_conll_file, XlsxAnnotationClient
+from swegram_main.lib.conll_index import load_index
+from swegram_main.lib.utils import change_suffix, cut, cut_lines, read, read_conll_file, XlsxAnnotationClient
 
 
 class EmptyConllFile(Exception):
@@ -118,6 +120,7 @@ def aggregate_conlls(file_paths: List[Path]) -> str:
     with open(filename, "w", encoding="utf-8") as output_file:
         for file_path in file_paths:
             output_file.write(get_conll(file_path))
+    load_index(Path(filename))
     return filename
 
 
@@ -125,10 +128,43 @@ def postprocess_helper(
     model: str, filepath: Path, split_suc_tags: bool, normalized: bool,
     tokens: Optional[Iterator] = None
 ) -> None:
-    copy_to_conll = True
     file_type = filepath.suffix.lstrip(os.path.extsep)
+    merge_func = get_merge_func(model, file_type, split_suc_tags, normalized, tokens)
+
+    if file_type == "tok" and model.lower() in {"histnorm_sv", "efselab"}:
+        cut(merge_func, filepath, append_token_index=True, append_text_index=True)
+    else:
+        cut(merge_func, filepath, append_text_index=True)
+    if file_type != "conll":
+        shutil.copy(filepath, change_suffix(filepath, "conll"))
+
+
+def postprocess_lines(
+    model: str, file_type: str, lines: Iterable[str], normalized: bool, tokens: Optional[Iterator] = None
+) -> Iterator[str]:
+    """postprocess of the lines of the .tok, .tag or .conll in memory, used by the streaming mode"""
+    if file_type == "tok":
+        split_suc_tags = model.lower() in {"efselab", "histnorm_sv"}
+    else:
+        split_suc_tags = model.lower() == "efselab"
+    merge_func = get_merge_func(model, file_type, split_suc_tags, normalized, tokens)
+    return cut_lines(
+        merge_func, lines, append_token_index=file_type == "tok" and split_suc_tags, append_text_index=True
+    )
+
+
+def insert_metadata_lines(content: str, metadata: Dict[str, str]) -> Iterator[str]:
+    """insert_metadata in memory, the lines are split as fileinput does"""
+    for index, line in enumerate(io.StringIO(content, newline=None)):
+        if index == 0:
+            yield f"{convert_labels_to_string(metadata)}\n"
+        yield f"{line.strip()}\n"
+
+
+def get_merge_func(
+    model: str, file_type: str, split_suc_tags: bool, normalized: bool, tokens: Optional[Iterator] = None
+) -> Callable[[str], str]:
     if file_type == "conll":
-        copy_to_conll = False
         def merge_func(line: str) -> str:
             return _post_file(line, split_suc_tags, normalized, False, model, tokens)
     elif file_type == "tag":
@@ -138,14 +174,8 @@ def postprocess_helper(
         def merge_func(line: str) -> str:
             return _post_tok_file(line, split_suc_tags, normalized, model, tokens)
     else:
-        raise TypeError(f"Unsupported file type: {file_type} for {filepath}")
-
-    if file_type == "tok" and model.lower() in {"histnorm_sv", "efselab"}:
-        cut(merge_func, filepath, append_token_index=True, append_text_index=True)
-    else:
-        cut(merge_func, filepath, append_text_index=True)
-    if copy_to_conll:
-        shutil.copy(filepath, change_suffix(filepath, "conll"))
+        raise TypeError(f"Unsupported file type: {file_type}")
+    return merge_func
 
 
 def _get_next_token(tokens: Iterator, model: str) -> str:
@@ -171,7 +201,8 @@ def _post_file(
         else:
             suc_tag, suc_features = suc_tags, "_"
         if from_tag:
-            rest_columns.extend(["_"] * 3 + ["_\n"])
+            # a .tag only has the MISC column of the split compounds, see compounds.py
+            rest_columns = ["_"] * 3 + (rest_columns or ["_\n"])
         if normalized:
             return "\t".join([
                 index, _get_next_token(tokens, model), word, lemma, ud_tag,
@@ -4,17 +4,23 @@ import json
 import os
 import shutil
 import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import ExitStack, nullcontext
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
-from swegram_main.config import JSON_CONLL_CORPUS_KEY, JSON_CONLL_METADATA_KEY, JSON_CONLL_TEXT_KEY
+from swegram_main.config import (
+    JSON_CONLL_CORPUS_KEY, JSON_CONLL_METADATA_KEY, JSON_CONLL_TEXT_KEY, MAX_VALIDATION_ERRORS
+)
 from swegram_main.data.metadata import convert_labels_to_string
 from swegram_main.data.texts import TextDirectory as TD
-from swegram_main.pipeline.checker import checker
-from swegram_main.lib.utils import cut, FileContent, MetaFormatError, XlsxAnnotationClient
+from swegram_main.pipeline.checker import TextChecker
+from swegram_main.lib.utils import read, FileContent, MetaFormatError, XlsxAnnotationClient
 
 
 TEXT_TYPE = Dict[str, Union[Dict[str, str], List[List[List[str]]]]]
+NORMALIZED_TAG = f"normalized{os.path.extsep}tag"
+RESTORED_SUFFIXES = ("tok", "spell", "tag", NORMALIZED_TAG)  # the files an uploaded annotated text is restored into
 
 
 class RestoreFileError(Exception):
@@ -46,7 +52,7 @@ def convert_json_conll(filepath: Path, output_dir: Path) -> Path:
         return output_path
 
 
-def preprocess(input_path: Path, output_dir: Path, model: str) -> List[TD]:
+def preprocess(input_path: Path, output_dir: Path, model: str, jobs: int = 1) -> List[TD]:
     text_index = 0
     text_instances: List[TD] = []
     if input_path.suffix == ".json":
@@ -80,12 +86,12 @@ def preprocess(input_path: Path, output_dir: Path, model: str) -> List[TD]:
     except StopIteration:
         text_instances.append(text)
 
-    def restore_text(text: TD) -> TD:
-        if input_path.suffix != ".conll":
-            return text
-        return restore(text, output_dir, model)
-
-    return [restore_text(text) for text in text_instances if os.path.getsize(text.filepath)]
+    texts = [text for text in text_instances if os.path.getsize(text.filepath)]
+    if input_path.suffix != ".conll":
+        return texts
+    # the worker processes checking the sentences are shared by the texts
+    with ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else nullcontext() as executor:
+        return [restore(text, output_dir, model, executor) for text in texts]
 
 
 def restore_tokenized_line(line: str, model: str) -> str:
@@ -132,68 +138,76 @@ def restore_tagged_line(line: str, model: str, normalized: bool) -> str:
     raise RestoreFileError(f"Unknow model to restore tagged line: {model}")
 
 
-def _restore(
-    from_: str, filepath: Path, workspace: Path, model: str = "efselab",
-    normalized: Optional[bool] = None
+def _keep_restored_files(
+    workspace: Path, stem: str, state: Tuple[bool, bool, bool], failures: Dict[str, Exception]
 ) -> None:
-    """Restore the uploaded annotated text into a format that allows pipeline process further
-    """
-    def restore_tokenized_line_helper(line: str) -> str:
-        return restore_tokenized_line(line, model)
-    def restore_normalized_line_helper(line: str) -> str:
-        return restore_normalized_line(line, model)
-
-    if from_ == "tokenized":
-        cut(
-            restore_tokenized_line_helper, filepath,
-            output_path=workspace.joinpath(f"{filepath.stem}{os.path.extsep}tok")
-        )
-
-    elif from_ == "normalized":
-        cut(
-            restore_tokenized_line_helper, filepath,
-            output_path=workspace.joinpath(f"{filepath.stem}{os.path.extsep}tok")
-        )
-        cut(
-            restore_normalized_line_helper, filepath,
-            output_path=workspace.joinpath(f"{filepath.stem}{os.path.extsep}spell")
-        )
+    """Keep the restored files of the annotation state, normalized, tagged and parsed, and remove the others
 
-    elif from_ == "tagged":
-        if normalized:
-            cut(
-                restore_tokenized_line_helper, filepath,
-                output_path=workspace.joinpath(f"{filepath.stem}{os.path.extsep}tok")
-            )
-            cut(
-                restore_normalized_line_helper, filepath,
-                output_path=workspace.joinpath(f"{filepath.stem}{os.path.extsep}spell")
-            )
-        cut(
-            lambda line: restore_tagged_line(line, model, normalized),
-            filepath,
-            output_path=workspace.joinpath(f"{filepath.stem}{os.path.extsep}tag")
-        )
+    Raise the failure of a line which could not be restored into a file that is kept.
+    """
+    normalized, tagged, parsed = state
+    if parsed:
+        raise RestoreFileError("Unknown state for annotation: parsed")
+    if tagged:
+        suffixes = ("tok", "spell", NORMALIZED_TAG) if normalized else ("tag",)
+    elif normalized:
+        suffixes = ("tok", "spell")
     else:
-        raise RestoreFileError(f"Unknown state for annotation: {from_}")
+        suffixes = ("tok",)
+    for suffix in suffixes:
+        if suffix in failures:
+            raise failures[suffix]
+
+    for suffix in RESTORED_SUFFIXES:
+        if suffix not in suffixes:
+            workspace.joinpath(f"{stem}{os.path.extsep}{suffix}").unlink()
+    if NORMALIZED_TAG in suffixes:
+        workspace.joinpath(f"{stem}{os.path.extsep}{NORMALIZED_TAG}").rename(
+            workspace.joinpath(f"{stem}{os.path.extsep}tag")
+        )
 
 
-def restore(text: TD, output_dir: Path, model: str) -> TD:
+def restore(text: TD, output_dir: Path, model: str, executor: Optional[Executor] = None) -> TD:
     """restore annotated text
+
+    The uploaded text is read once. Every line is checked, and restored into each of
+    .tok, .spell and .tag at the same time, since the files to keep depend on the
+    annotation state of the whole text:
+        tokenized: .tok
+        normalized: .tok, .spell
+        tagged: .tag, and .tok, .spell with the normalized tokens in .tag if normalized
+    With an executor, the sentences are checked in its worker processes.
     """
     input_path = text.filepath
+    restorers = {
+        "tok": lambda line: restore_tokenized_line(line, model),
+        "spell": lambda line: restore_normalized_line(line, model),
+        "tag": lambda line: restore_tagged_line(line, model, False),
+        NORMALIZED_TAG: lambda line: restore_tagged_line(line, model, True),
+    }
+    # a line which can not be restored into a file is only an error if the file is kept
+    failures: Dict[str, Exception] = {}
 
     with tempfile.TemporaryDirectory() as temp_dir:
         workspace = Path(temp_dir)
-        normalized, tagged, parsed = checker(input_path, model)
-        if parsed:
-            from_ = "parsed"
-        elif tagged:
-            from_ = "tagged"
-        elif normalized:
-            from_ = "normalized"
-        else:
-            from_= "tokenized"
-        _restore(from_, input_path, workspace, model, normalized)
+        with TextChecker(model, MAX_VALIDATION_ERRORS, executor) as text_checker, ExitStack() as stack:
+            output_files = {
+                suffix: stack.enter_context(open(
+                    workspace.joinpath(f"{input_path.stem}{os.path.extsep}{suffix}"), mode="w", encoding="utf-8"
+                )) for suffix in restorers
+            }
+            for line in read(input_path):
+                text_checker.feed(line)
+                is_token_line = line.strip() and not line.strip().startswith("#")
+                for suffix, restore_line in restorers.items():
+                    if suffix in failures:
+                        continue
+                    try:
+                        output_files[suffix].write(restore_line(line) if is_token_line else line)
+                    except (ValueError, RestoreFileError) as err:
+                        failures[suffix] = err
+            state = text_checker.result()
+
+        _keep_restored_files(workspace, input_path.stem, state, failures)
         shutil.copytree(workspace, output_dir, dirs_exist_ok=True)
         return text
@@ -0,0 +1,114 @@
+"""Module of sharding large texts
+
+A large text, e.g. a novel without metadata lines, is one TextDirectory and
+would be annotated by one tagger/parser call. Pipeline splits such a text into
+shards at paragraph boundaries, annotates the shards like separate texts (in
+parallel with jobs), and stitches the annotation files of the shards back into
+the files of the text, before postprocess adds the p.s text index. Hence the
+paragraph and sentence numbering is the same as without sharding.
+
+A shard only ends at a blank line after sentence-final punctuation, so that a
+tokenizer could not have continued the sentence in the next paragraph. The
+whitespace between paragraphs stays at the end of the previous shard, where
+udpipe records it in SpacesAfter as for the unsharded text.
+
+udpipe starts every document with "# newdoc id = <filepath>" and numbers the
+sentences of each document from 1. When stitching, the document id of the
+first shard is set back to the text, the newdoc lines of the other shards are
+removed, and the sentence ids are continued.
+"""
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import List
+
+from swegram_main.data.texts import TextDirectory as TD
+
+
+SHARD_DIR = ".shards"
+ANNOTATION_SUFFIXES = ["tok", "spell", "tag", "conll"]
+PARAGRAPH_BREAK = re.compile(r"[.!?…][\"'”’»)\]]*[ \t]*\n[ \t]*\n\s*")
+NEWDOC_ID = "# newdoc id = "
+SENT_ID = "# sent_id = "
+
+
+def get_shard_dir(text: TD) -> Path:
+    return text.filepath.parent.joinpath(SHARD_DIR, text.filepath.stem)
+
+
+def split_paragraphs(content: str, shard_size: int) -> List[str]:
+    """Split the content into shards of at least shard_size characters at paragraph breaks"""
+    shards, start = [], 0
+    for match in PARAGRAPH_BREAK.finditer(content):
+        if match.end() - start >= shard_size and match.end() < len(content):
+            shards.append(content[start:match.end()])
+            start = match.end()
+    shards.append(content[start:])
+    return shards
+
+
+def shard_text(text: TD, shard_size: int) -> List[TD]:
+    """Return the shards of the text, a single shard means that the text is not sharded
+
+    The shards of an earlier stage are reused. A text is only sharded before it is
+    tokenized, so that the shards are annotated from the raw text.
+    """
+    shard_dir = get_shard_dir(text)
+    if shard_dir.exists():
+        return sorted(
+            (TD(filepath=filepath) for filepath in shard_dir.glob("*.txt")),
+            key=lambda shard: int(shard.filepath.stem.rsplit("_", maxsplit=1)[-1])
+        )
+    if text.tok.exists() or text.spell.exists() or os.path.getsize(text.filepath) <= shard_size:
+        return [text]
+
+    with open(text.filepath, mode="r", encoding="utf-8", newline="") as input_file:
+        contents = split_paragraphs(input_file.read(), shard_size)
+    if len(contents) == 1:
+        return [text]
+
+    os.makedirs(shard_dir)
+    shards = []
+    for index, content in enumerate(contents):
+        shard = TD(filepath=shard_dir.joinpath(f"{text.filepath.stem}_{index}.txt"))
+        with open(shard.filepath, mode="w", encoding="utf-8", newline="") as output_file:
+            output_file.write(content)
+        shards.append(shard)
+    return shards
+
+
+def stitch(text: TD, shards: List[TD]) -> None:
+    """Concatenate the annotation files of the shards into the files of the text
+
+    A file which is missing in any of the shards is removed from the text as well,
+    e.g. the tags after normalization.
+    """
+    for suffix in ANNOTATION_SUFFIXES:
+        target_path = text.generate_path(suffix)
+        if not all(shard.generate_path(suffix).exists() for shard in shards):
+            target_path.unlink(missing_ok=True)
+            continue
+        sentence_offset = 0
+        with open(target_path, mode="w", encoding="utf-8", newline="") as output_file:
+            for index, shard in enumerate(shards):
+                num_sentences = 0
+                with open(shard.generate_path(suffix), mode="r", encoding="utf-8", newline="") as input_file:
+                    for line in input_file:
+                        if line.startswith(NEWDOC_ID):
+                            if index > 0:
+                                continue
+                            line = f"{NEWDOC_ID}{text.filepath}\n"
+                        elif line.startswith(SENT_ID) and line[len(SENT_ID):].strip().isdigit():
+                            num_sentences += 1
+                            line = f"{SENT_ID}{int(line[len(SENT_ID):]) + sentence_offset}\n"
+                        output_file.write(line)
+                sentence_offset += num_sentences
+
+
+def remove_shards(text: TD) -> None:
+    shutil.rmtree(get_shard_dir(text), ignore_errors=True)
+    try:
+        get_shard_dir(text).parent.rmdir()
+    except OSError:
+        pass
@@ -0,0 +1,107 @@
+"""Module of the streaming annotation
+
+The stages of Pipeline exchange files next to the input, .txt -> .tok -> .spell
+-> .tag -> .conll, and postprocess rewrites the final file a few times. In the
+streaming mode, every stage passes the lines of a text to the next stage in
+memory, and only the final .conll (and .json or .xlsx) of the text is written.
+
+The lines are split as read() splits the files of the file-based stages, so the
+.conll is the same in both modes. The normalizers only read and write files,
+hence they run on a temporary copy of the tokens, as maltparser does without
+the parser worker (see parse.py).
+
+Swedish texts are annotated with the in-process efselab engine (see engine.py),
+English texts with udpipe (see udpipe.py). Large texts are not sharded.
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import List, NamedTuple, Tuple
+
+from swegram_main.data.texts import TextDirectory as TD
+from swegram_main.lib.utils import change_suffix, cut_lines, read, write
+from swegram_main.pipeline.lib import udpipe
+from swegram_main.pipeline.lib.engine import get_engine, split_sentences
+from swegram_main.pipeline.lib.normalize import normalize as normalize_
+from swegram_main.pipeline.lib.parse import parse_tagged_content
+from swegram_main.pipeline.lib.tag import restore_en_original_norm_line
+from swegram_main.pipeline.postprocess import insert_metadata_lines, postprocess_lines, save
+
+
+class Annotation(NamedTuple):
+    """The file type of the final file of an action for postprocess_lines, and its annotation tag"""
+    file_type: str
+    tag: str
+
+
+ANNOTATIONS = {
+    "tokenize": Annotation("tok", "tokenized"),
+    "tag": Annotation("tag", "tagged"),
+    "parse": Annotation("conll", "parsed")
+}
+
+
+def _split(content: str) -> List[str]:
+    # the same lines as read() gives from a file with the content
+    return content.splitlines(keepends=True)
+
+
+def tokenize(model: str, text: TD) -> List[str]:
+    if model == "efselab":
+        with get_engine().lock:
+            sentences = get_engine().tokenize_text("".join(read(text.filepath)))
+        return [line for sentence in sentences for line in (*(f"{word}\n" for word in sentence), "\n")]
+    return _split(udpipe.tokenize_file(text.filepath))
+
+
+def normalize(model: str, lines: List[str]) -> List[str]:
+    normalizer = "histnorm_en" if model == "udpipe" else "histnorm_sv"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filepath = Path(tmp_dir).joinpath(f"text{os.path.extsep}tok")
+        write(filepath=filepath, context="".join(lines))
+        normalize_(normalizer, filepath)
+        return list(read(change_suffix(filepath, "spell")))
+
+
+def tag(model: str, lines: List[str], normalized: bool) -> List[str]:
+    if model == "efselab":
+        with get_engine().lock:
+            sentences = get_engine().tag_sentences(split_sentences(lines))
+        return [line for tagged_lines in sentences for line in (*tagged_lines, "\n")]
+    if normalized:
+        lines = cut_lines(restore_en_original_norm_line, lines)
+    return _split(udpipe.annotate_content("tag", "".join(lines)))
+
+
+def parse(model: str, lines: List[str]) -> List[str]:
+    if model == "efselab":
+        return _split(parse_tagged_content("".join(lines)))
+    return _split(udpipe.annotate_content("parse", "".join(lines)))
+
+
+def stream_text(
+    text: TD, model: str, action: str, normalize_tokens: bool = False, save_as: str = "txt"
+) -> Tuple[bool, str]:
+    """Annotate the text up to action in memory, write the .conll as postprocess does
+
+    action: tokenize, normalize, tag or parse, normalize_tokens normalizes before tagging
+    Return the normalization and annotation tags as postprocess.
+    """
+    tokens = tokenize(model, text)
+    normalized = normalize_tokens or action == "normalize"
+    if action in {"tokenize", "normalize"}:
+        # as postprocess, the .tok is the final file, which holds the original tokens
+        file_type, annotation = ANNOTATIONS["tokenize"]
+        lines = tokens
+    else:
+        file_type, annotation = ANNOTATIONS[action]
+        lines = tag(model, normalize(model, tokens) if normalized else tokens, normalized)
+        if action == "parse":
+            lines = parse(model, lines)
+
+    content = "".join(postprocess_lines(model, file_type, lines, normalized, iter(tokens) if normalized else None))
+    if text.meta:
+        content = "".join(insert_metadata_lines(content, text.meta))
+    write(filepath=text.conll, context=content)
+    save(save_as, text.conll, model, normalized, annotation)
+    return normalized, annotation
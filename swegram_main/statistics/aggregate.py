@@ -0,0 +1,97 @@
+"""Module of the mergeable aggregate of the fields of CountFeatures
+
+The fields of a paragraph, text or corpus are the fields of its elements merged
+by _serialize, which merges all elements again. FieldAggregate keeps the merged
+fields of a set of blocks, e.g. the texts of a corpus, so that a block is added
+or removed in the time of its own fields, and aggregates are merged or
+subtracted, e.g. when texts are activated or deactivated in the server.
+
+The scalars are summed, the counts of the freq dicts and counters are added and
+subtracted, and a key is dropped when its count is 0 again. The types are kept
+with the number of blocks containing them, a type is dropped with the last of
+its blocks. The depth list is not kept, it is only read from the texts by the
+features of the corpus, see CorpusAggregate.
+"""
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from swegram_main.statistics.features.general import CountFeatures as CF
+
+
+ADDITIVE_FIELDS = [*CF.SCALAR_FIELDS, *CF.FREQ_FIELDS, *CF.COUNTER_FIELDS]
+
+
+class FieldAggregate:
+    """Merged fields of CountFeatures of a set of blocks
+
+    fields: the fields aggregated, all fields but the depth list by default
+    """
+
+    def __init__(self, fields: Optional[Iterable[str]] = None) -> None:
+        fields = set(ADDITIVE_FIELDS + [CF.UNION_FIELD] if fields is None else fields)
+        self.blocks = 0
+        self.fields: Dict[str, Any] = {
+            **{field: 0 for field in CF.SCALAR_FIELDS if field in fields},
+            **{field: defaultdict(int) for field in CF.FREQ_FIELDS if field in fields},
+            **{field: Counter() for field in CF.COUNTER_FIELDS if field in fields},
+            **({CF.UNION_FIELD: Counter()} if CF.UNION_FIELD in fields else {})
+        }
+
+    def add(self, block: Any) -> None:
+        """Add the fields of a block, e.g. a text"""
+        self._update(self._get_block_fields(block), 1, 1)
+
+    def remove(self, block: Any) -> None:
+        """Remove the fields of a block added before"""
+        self._update(self._get_block_fields(block), -1, -1)
+
+    def merge(self, other: "FieldAggregate") -> "FieldAggregate":
+        self._update(other.fields, 1, other.blocks)
+        return self
+
+    def subtract(self, other: "FieldAggregate") -> "FieldAggregate":
+        """Subtract the aggregate of blocks added before"""
+        self._update(other.fields, -1, -other.blocks)
+        return self
+
+    def _get_block_fields(self, block: Any) -> Dict[str, Any]:
+        fields = {field: getattr(block, field) for field in self.fields}
+        if CF.UNION_FIELD in fields:
+            fields[CF.UNION_FIELD] = dict.fromkeys(fields[CF.UNION_FIELD], 1)
+        return fields
+
+    def _update(self, fields: Mapping[str, Any], sign: int, blocks: int) -> None:
+        self.blocks += blocks
+        for field, value in self.fields.items():
+            if isinstance(value, int):
+                self.fields[field] += sign * fields[field]
+            else:
+                _update_counts(value, fields[field], sign)
+
+    @property
+    def types(self) -> List[str]:
+        return list(self.fields[CF.UNION_FIELD])
+
+    def get_fields(self) -> Dict[str, Any]:
+        """Copies of the merged fields, as the fields of a block merged by _serialize, without the depth list"""
+        fields = {}
+        for field, value in self.fields.items():
+            if field == CF.UNION_FIELD:
+                fields[field] = self.types
+            elif isinstance(value, Counter):
+                fields[field] = Counter(value)
+            elif isinstance(value, defaultdict):
+                fields[field] = defaultdict(int, value)
+            else:
+                fields[field] = value
+        return fields
+
+
+def _update_counts(counts: Dict[Any, int], other: Mapping[Any, int], sign: int) -> None:
+    """Add or subtract the counts, the keys are dropped at 0"""
+    for key, value in other.items():
+        count = counts.get(key, 0) + sign * value
+        if count:
+            counts[key] = count
+        else:
+            counts.pop(key, None)
@@ -13,21 +13,22 @@ paragraph length (n sentences)
 import math
 import re
 from collections import Counter, OrderedDict, defaultdict
-from copy import copy
-from typing import List, Tuple, Any
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from swegram_main.config import (
     KELLY_EN, KELLY_SV, ADVANCE_CEFR_LEVELS, WPM_SV,
     MODIFIER_DEPREL_LABELS, SUBORDINATION_DEPREL_LABELS,
-    LONG_ARC_THRESHOLD
+    LONG_ARC_THRESHOLD, SPLIT_COMPOUND
 )
 from swegram_main.data.features import Feature
 from swegram_main.data.paragraphs import Paragraph
 from swegram_main.data.sentences import Sentence
 from swegram_main.data.texts import Text, Corpus
 from swegram_main.data.tokens import Token
+from swegram_main.lib.counts import count_token_keys, get_count_engine
+from swegram_main.lib.dependency_tree import DependencyTree
 from swegram_main.lib.utils import (
-    get_path, get_child_nodes, is_a_ud_tree,
+    is_a_ud_tree,
     merge_digits_for_fields,
     mean, median, r2, merge_dicts_for_fields
 )
@@ -68,8 +69,14 @@ def _syllable_count_sv(word: str) -> int:
     return 1
 
 
-def _serialize_tokens(tokens: List[Token], lang: str) -> S:  # pylint: disable=too-many-locals, too-many-branches, too-many-statements
-
+def _serialize_tokens(  # pylint: disable=too-many-locals, too-many-branches, too-many-statements
+    tokens: List[Token], lang: str, fields: Optional[Set[str]] = None
+) -> S:
+    """The fields of a sentence, fields: only the groups of these fields are counted, the others are left empty"""
+    computed = {
+        group: fields is None or not fields.isdisjoint(group_fields)
+        for group, group_fields in CountFeatures.FIELD_GROUPS.items()
+    }
     _syllable_count = _syllable_count_en if lang == "en" else _syllable_count_sv
     polysyllables, syllables, misspells, compounds, words = 0, 0, 0, 0, len(tokens)
     # The following scalars are used for morphological feature calculation
@@ -81,6 +88,9 @@ def _serialize_tokens(tokens: List[Token], lang: str) -> S:  # pylint: disable=t
     freq_form_dict_upos, freq_norm_dict_upos, freq_lemma_dict_upos = [defaultdict(int) for _ in range(3)]
     freq_form_dict_xpos, freq_norm_dict_xpos, freq_lemma_dict_xpos = [defaultdict(int) for _ in range(3)]
     upos_dict, xpos_dict, word_dict = [defaultdict(int) for _ in range(3)]  # used for readability features
+    # With the numpy count engine, the keys are counted after the loop, see counts.py
+    count_arrays = get_count_engine() == "numpy" and (computed["pairs"] or computed["tags"] or computed["words"])
+    token_keys: List[Tuple[str, ...]] = []
 
     token_length_list = [] # the length of each token
 
@@ -92,43 +102,53 @@ def _serialize_tokens(tokens: List[Token], lang: str) -> S:  # pylint: disable=t
     # Syntactical features related
     depth_list: List[Tuple[int, ...]] = []
     long_arcs, left_arcs, right_arcs, pre_modifier, post_modifier = 0, 0, 0, 0, 0
-    subordinate_nodes, relative_clause_nodes, preposition_nodes = [set() for _ in range(3)]
-
-    try:
-        response = is_a_ud_tree([token.head for token in tokens])
-        if response is not True:
-            raise ValueError(response)
-    except ValueError:
-        heads = None
-    else:
-        heads = [None, *[int(token.head) for token in tokens]]
+    # the heads of the subtrees of the subordinate, relative clause and prepositional nodes
+    subordinate_heads, relative_clause_heads, preposition_heads = [], [], []
+
+    heads, tree = None, None
+    if computed["syntactic"]:
+        try:
+            response = is_a_ud_tree([token.head for token in tokens])
+            if response is not True:
+                raise ValueError(response)
+        except ValueError:
+            pass
+        else:
+            heads = [None, *[int(token.head) for token in tokens]]
+            tree = DependencyTree(heads)
 
     for index, token in enumerate(tokens, 1):
         form, norm, lemma = token.form.lower(), token.norm.lower(), token.lemma.lower()
         upos, xpos, feats = token.upos, token.xpos, token.feats
-        freq_form_dict_upos[f"{form}_{upos}"] += 1
-        freq_norm_dict_upos[f"{norm}_{upos}"] += 1
-        freq_lemma_dict_upos[f"{lemma}_{upos}"] += 1
-        freq_form_dict_xpos[f"{form}_{xpos}"] += 1
-        freq_norm_dict_xpos[f"{norm}_{xpos}"] += 1
-        freq_lemma_dict_xpos[f"{lemma}_{xpos}"] += 1
-        upos_dict[upos] += 1
-        xpos_dict[xpos] += 1
-
         word = norm if norm != "_" else form
-        word_dict[word] += 1
-
-        syllable_length = _syllable_count(word)
-        syllables += syllable_length
-
-        if syllable_length > 2:
-            polysyllables += 1
+        if count_arrays:
+            token_keys.append((form, norm, lemma, upos, xpos))
+        else:
+            if computed["pairs"]:
+                freq_form_dict_upos[f"{form}_{upos}"] += 1
+                freq_norm_dict_upos[f"{norm}_{upos}"] += 1
+                freq_lemma_dict_upos[f"{lemma}_{upos}"] += 1
+                freq_form_dict_xpos[f"{form}_{xpos}"] += 1
+                freq_norm_dict_xpos[f"{norm}_{xpos}"] += 1
+                freq_lemma_dict_xpos[f"{lemma}_{xpos}"] += 1
+            if computed["tags"]:
+                upos_dict[upos] += 1
+                xpos_dict[xpos] += 1
+            if computed["words"]:
+                word_dict[word] += 1
+
+        if computed["syllables"]:
+            syllable_length = _syllable_count(word)
+            syllables += syllable_length
+
+            if syllable_length > 2:
+                polysyllables += 1
         token_length_list.append(len(word))
 
         if norm not in [form, "_"]:
             misspells += 1
 
-        if "-" in token.token_index:
+        if "-" in token.token_index or f"{SPLIT_COMPOUND}=" in token.misc:
             compounds += 1
 
         if norm != "_":
@@ -140,48 +160,50 @@ def _serialize_tokens(tokens: List[Token], lang: str) -> S:  # pylint: disable=t
             words -= 1
 
         #<start----------used for morph features-----------start>
-        if "Gender=Neut" in feats and upos == "NOUN":
-            neut_noun += 1
-        elif "Number=Sing" in feats and upos == "PRON":
-            _3sg_pron += 1
-        elif word.endswith("s") and upos == "VERB":
-            s_verb += 1
-
-        if "VerbForm=Part" in feats:
-            if "Tense=Pres" in feats:
-                pres_pc += 1
-            elif "Tense=Past" in feats:
-                past_pc += 1
-        elif "VerbForm=Fin" in feats:
-            if "Tense=Pres" in feats:
-                pres_verb += 1
-            elif "Tense=Past" in feats:
-                past_verb += 1
-        elif "VerbForm=Sup" in feats:
-            sup_verb += 1 
-
-        if "PronType=Int" in feats or "PronType=Rel" in feats:
-            rel_pron += 1
+        if computed["morph"]:
+            if "Gender=Neut" in feats and upos == "NOUN":
+                neut_noun += 1
+            elif "Number=Sing" in feats and upos == "PRON":
+                _3sg_pron += 1
+            elif word.endswith("s") and upos == "VERB":
+                s_verb += 1
+
+            if "VerbForm=Part" in feats:
+                if "Tense=Pres" in feats:
+                    pres_pc += 1
+                elif "Tense=Past" in feats:
+                    past_pc += 1
+            elif "VerbForm=Fin" in feats:
+                if "Tense=Pres" in feats:
+                    pres_verb += 1
+                elif "Tense=Past" in feats:
+                    past_verb += 1
+            elif "VerbForm=Sup" in feats:
+                sup_verb += 1
+
+            if "PronType=Int" in feats or "PronType=Rel" in feats:
+                rel_pron += 1
         #<end------------used for morph features-------------end>
 
         #<start----------used for lexical features----------start>
-        entry = f"{lemma}|{upos}"
-        cefr = kelly_dict.get(entry)
-        if cefr:
-            cefr_list.append(cefr)
-            if cefr in ADVANCE_CEFR_LEVELS:
-                advance_cefr += 1
-                if upos in {"NOUN", "VERB"}:
-                    advance_noun_or_verb += 1
-        if lang == "sv":
-            wpm = WPM_SV.get(entry)
-            if wpm:
-                wpm_sv_list.append(r2(math.log(wpm)))
+        if computed["lexical"]:
+            entry = f"{lemma}|{upos}"
+            cefr = kelly_dict.get(entry)
+            if cefr:
+                cefr_list.append(cefr)
+                if cefr in ADVANCE_CEFR_LEVELS:
+                    advance_cefr += 1
+                    if upos in {"NOUN", "VERB"}:
+                        advance_noun_or_verb += 1
+            if lang == "sv":
+                wpm = WPM_SV.get(entry)
+                if wpm:
+                    wpm_sv_list.append(r2(math.log(wpm)))
         #<end------------used for lexical features------------end>
 
         #<start----------used for syntactic features--------start>
         if heads:
-            token_depth = tuple(get_path(index, heads))
+            token_depth = tree.get_path(index)
             depth_list.append(token_depth)
             if len(token_depth) > LONG_ARC_THRESHOLD:
                 long_arcs += 1
@@ -203,16 +225,27 @@ def _serialize_tokens(tokens: List[Token], lang: str) -> S:  # pylint: disable=t
                         f"Token head index points to itself: index, {index}, heads, {heads}"
                     )
             elif token.deprel == "case":
-                preposition_nodes.add(index)
-                preposition_nodes = preposition_nodes.union(get_child_nodes(index, copy(heads)))
+                preposition_heads.append(index)
             else:
                 if token.deprel.startswith(tuple(SUBORDINATION_DEPREL_LABELS)):
-                    subordinate_nodes = subordinate_nodes.union(get_child_nodes(index, copy(heads)))
+                    subordinate_heads.append(index)
                 if "rel" in token.deprel:
-                    relative_clause_nodes.add(index)
-                    relative_clause_nodes = relative_clause_nodes.union(get_child_nodes(index, copy(heads)))
+                    relative_clause_heads.append(index)
         #<end------------used for syntactic features----------end>
 
+    if heads:
+        # the child nodes of the subordinate nodes, and the relative clause and prepositional nodes with theirs
+        subordinate_nodes = tree.get_subtree_nodes(subordinate_heads, include_roots=False)
+        relative_clause_nodes = tree.get_subtree_nodes(relative_clause_heads)
+        preposition_nodes = tree.get_subtree_nodes(preposition_heads)
+    else:
+        subordinate_nodes, relative_clause_nodes, preposition_nodes = set(), set(), set()
+
+    freqs = count_token_keys(token_keys) if count_arrays else [
+        freq_form_dict_upos, freq_norm_dict_upos, freq_lemma_dict_upos,
+        freq_form_dict_xpos, freq_norm_dict_xpos, freq_lemma_dict_xpos,
+        upos_dict, xpos_dict, word_dict
+    ]
 
     return  sum(token_length_list), len(tokens), words, syllables, polysyllables, misspells, compounds, \
             _3sg_pron, neut_noun, s_verb, rel_pron, pres_verb, past_verb, sup_verb, pres_pc, past_pc, \
@@ -220,9 +253,7 @@ def _serialize_tokens(tokens: List[Token], lang: str) -> S:  # pylint: disable=t
             long_arcs, left_arcs, right_arcs, pre_modifier, post_modifier, \
             len(subordinate_nodes), len(relative_clause_nodes), len(preposition_nodes), \
             1, \
-            freq_form_dict_upos, freq_norm_dict_upos, freq_lemma_dict_upos, \
-            freq_form_dict_xpos, freq_norm_dict_xpos, freq_lemma_dict_xpos, \
-            upos_dict, xpos_dict, word_dict, \
+            *freqs, \
             Counter(token_length_list), Counter([len(tokens)]), Counter(cefr_list), Counter(wpm_sv_list), \
             list(types), depth_list
 
@@ -245,9 +276,9 @@ def _union(blocks: List[B], field: str) -> List[str]:
     return list(union)
 
 
-def _serialize(blocks: List[B], lang: str) -> S:
+def _serialize(blocks: List[B], lang: str, fields: Optional[Set[str]] = None) -> S:
     if isinstance(blocks[0], Token):
-        return _serialize_tokens(blocks, lang)
+        return _serialize_tokens(blocks, lang, fields)
     if isinstance(blocks[0], Sentence):
         sents = len(blocks)
     elif isinstance(blocks[0], (Paragraph, Text)):
@@ -285,6 +316,21 @@ class CountFeatures:
     UNION_FIELD = "types"
     LIST_FIELD = "depth_list"
     FIELDS = [*SCALAR_FIELDS, *FREQ_FIELDS, *COUNTER_FIELDS, UNION_FIELD, LIST_FIELD]
+    # The fields counted together from the tokens, the other fields are needed by the general features
+    FIELD_GROUPS = {
+        "syllables": ["syllables", "polysyllables"],
+        "morph": [
+            "_3sg_pron", "neut_noun", "s_verb", "rel_pron", "pres_verb", "past_verb", "sup_verb", "pres_pc", "past_pc"
+        ],
+        "lexical": ["advance_cefr", "advance_noun_or_verb", "cefr_counter", "wpm_sv_counter"],
+        "syntactic": [
+            "long_arcs", "left_arcs", "right_arcs", "pre_modifier", "post_modifier",
+            "subordinate_nodes", "relative_clause_nodes", "preposition_nodes", LIST_FIELD
+        ],
+        "pairs": FREQ_FIELDS[:6],
+        "tags": ["upos_dict", "xpos_dict"],
+        "words": ["word_dict"]
+    }
 
     # Feature Declaration
     SENTENCE_FEATURES = [
@@ -301,17 +347,40 @@ class CountFeatures:
     _Paragraphs, _Paragraph_length_word = "Paragraphs", "Paragraph length (n words)"
     _Paragraph_length_sentence = "Paragraph length (n sentences)"
     TEXT_FEATURES = [_Paragraphs, _Paragraph_length_word, _Paragraph_length_sentence]
- 
 
-    def load_instance(self, instance: B, lang: str) -> B:
-        instance = update_instance_with_metadata(instance, lang, getattr(instance, instance.elements))
+    # The scalars of the elements, of which the mean and median are computed
+    ELEMENT_FIELDS = [*(attribute for _, attribute in SENTENCE_FEATURES), "sents"]
+
+    def load_instance(self, instance: B, lang: str, fields: Optional[Set[str]] = None) -> B:
+        """Load the fields and general features of the instance, fields: the fields needed, see StatisticPlan"""
+        elements = getattr(instance, instance.elements)
+        instance = update_instance_with_metadata(instance, lang, elements, fields)
+        element_scalars = {} if isinstance(instance, Sentence) else {
+            field: [getattr(element, field) for element in elements] for field in self.ELEMENT_FIELDS
+        }
+        if isinstance(instance, Text):
+            paragraphs = instance.paragraphs
+        elif isinstance(instance, Corpus):
+            paragraphs = [p for t in instance.texts for p in t.paragraphs]
+        else:
+            paragraphs = []
+        return self.load_features(instance, element_scalars, [(p.token_count, p.sents) for p in paragraphs])
+
+    def load_features(
+        self, instance: B, element_scalars: Dict[str, List[int]], paragraph_sizes: List[Tuple[int, int]]
+    ) -> B:
+        """Load the general features from the fields of the instance
+
+        element_scalars: the scalars of the elements of the instance, e.g. the token count of each text of a corpus
+        paragraph_sizes: (token count, sentences) of each paragraph of a text or corpus
+        """
         instance.general = OrderedDict()  # initialize general orderedDict instance
         if isinstance(instance, (Sentence, Paragraph, Text, Corpus)):
             for feature_name, attribute in self.SENTENCE_FEATURES:
                 if isinstance(instance, Sentence):
                     instance.general[feature_name] = Feature(scalar=getattr(instance, attribute))
                 else:
-                    scalar_list = [getattr(element, attribute) for element in getattr(instance, instance.elements)]
+                    scalar_list = element_scalars[attribute]
                     instance.general[feature_name] = Feature(
                         scalar=getattr(instance, attribute),
                         mean=mean(scalar_list), median=median(scalar_list)
@@ -321,7 +390,7 @@ class CountFeatures:
                 mean=r2(instance.chars, instance.token_count), median=median(instance.token_length_counter)
             )
         if isinstance(instance, (Paragraph, Text, Corpus)):
-            sents_scalar_list = [b.sents for b in getattr(instance, instance.elements)]
+            sents_scalar_list = element_scalars["sents"]
             instance.general[self._Sentences] = Feature(
                 scalar=sum(sents_scalar_list),
                 mean=mean(sents_scalar_list), median=median(sents_scalar_list)
@@ -331,14 +400,9 @@ class CountFeatures:
                 mean=r2(instance.token_count, instance.sents), median=median(instance.sentence_length_counter)
             )
         if isinstance(instance, (Text, Corpus)):
-            if isinstance(instance, Text):
-                paragraphs = instance.paragraphs
-            else:
-                paragraphs = [p for t in instance.texts for p in t.paragraphs]
-
-            token2paragraph = [p.token_count for p in paragraphs]
-            sents2paragraph = [p.sents for p in paragraphs]
-            paragraph_length = len(paragraphs)
+            token2paragraph = [token_count for token_count, _ in paragraph_sizes]
+            sents2paragraph = [sents for _, sents in paragraph_sizes]
+            paragraph_length = len(paragraph_sizes)
             instance.general[self._Paragraphs] = Feature(scalar=paragraph_length)
             instance.general[self._Paragraph_length_word] = Feature(
                 mean=r2(instance.token_count, paragraph_length), median=median(token2paragraph)
@@ -350,8 +414,10 @@ class CountFeatures:
         return instance
 
 
-def update_instance_with_metadata(instance: B, lang: str, components: List[Any]) -> B:
-    for key, value in zip(CountFeatures.FIELDS, _serialize(components, lang)):
+def update_instance_with_metadata(
+    instance: B, lang: str, components: List[Any], fields: Optional[Set[str]] = None
+) -> B:
+    for key, value in zip(CountFeatures.FIELDS, _serialize(components, lang, fields)):
         setattr(instance, key, value)
     setattr(instance, "type_count", len(instance.types))
     return instance
@@ -1,15 +1,37 @@
 """Model of statistic.py
 Create a decorator to append statistic e.g. Text instance
 
+CorpusAggregate computes the statistics of a corpus text by text, so that the
+texts don't need to be kept in memory, and texts are added and removed without
+merging the other texts again. get_unit_statistics keeps the statistics
+of a text, its paragraphs and sentences without the tokens, e.g. to send them
+from a worker process.
+
+Loaded with a StatisticPlan, e.g. by swegram statistic, only the fields of the
+requested features are counted, and the features are computed on first access
+with LazyFeatures, e.g. the features of a corpus only read the scalars of the
+features of its texts, not of their paragraphs and sentences.
+
+The features declared with prepare_feature are compiled once per language into
+CompiledFeature, which computes the scalar of a feature from the fields of a
+unit without parsing its declaration again.
 """
 from collections import OrderedDict
-from typing import Dict
+from operator import attrgetter
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Hashable, List, Mapping, NamedTuple, Optional, Set, Tuple, Union
+from uuid import uuid4
 
-from swegram_main.lib.utils import mean, median, parse_args
+from swegram_main.lib.counts import CountArray
+from swegram_main.lib.utils import (
+    mean, median, merge_counters, merge_dicts, merge_digits, mixin_merge_digits_or_counters,
+    mixin_merge_digits_or_dicts
+)
 from swegram_main.data.features import Feature
 from swegram_main.data.paragraphs import Paragraph
 from swegram_main.data.texts import Text, Corpus
 from swegram_main.data.sentences import Sentence
+from swegram_main.statistics.aggregate import ADDITIVE_FIELDS, FieldAggregate
 from swegram_main.statistics.features.general import CountFeatures as CF
 from swegram_main.statistics.features.lexical import LexicalFeatures as LF
 from swegram_main.statistics.features.morph import MorphFeatures as MF
@@ -19,6 +41,7 @@ from swegram_main.statistics.statistic_types import C, F
 
 
 LINGUISTIC_ASPECTS = [RF, MF, LF, SF]  # CF is loaded separately
+STATISTIC_ASPECTS = [CF.ASPECT, *(aspect.ASPECT for aspect in LINGUISTIC_ASPECTS)]
 
 
 class InvalidWorkingLanguage(Exception):
@@ -48,9 +71,10 @@ class StatisticLoading:
             return instance
 
         if isinstance(instance, (Sentence, Paragraph, Text, Corpus)):
-            instance = CF().load_instance(instance, language)
+            plan = kwargs.get("plan")
+            instance = CF().load_instance(instance, language, None if plan is None else plan.fields)
             if kwargs.get("parsed") is True:
-                instance = load_statistic(instance, language)
+                instance = load_statistic(instance, language, plan)
             return instance
 
         raise InvalidLinguisticUnit(
@@ -58,26 +82,338 @@ class StatisticLoading:
         )
 
 
-def load_statistic(instance: C, language: str) -> C:
+class CompiledFeature:
+    """A feature of an aspect, resolved once from its declaration, see prepare_feature
+
+    args: the constant keyword arguments of the feature function
+    keys, attributes: the keyword arguments given the fields of the unit, e.g. the words of a sentence,
+    or the fields of the elements of a paragraph, text or corpus merged by the attribute function
+    record_keys: the keys of the merged fields in the record of a unit, shared by the features of the unit
+    """
+
+    __slots__ = (
+        "aspect", "language", "name", "func", "attr_func", "args", "keys", "attributes", "attribute_kwargs",
+        "record_keys", "_get_fields"
+    )
+
+    def __init__(self, aspect: str, language: str, feature: F) -> None:
+        self.aspect, self.language = aspect, language
+        self.name, self.func, self.attr_func, kwarg_list, self.attribute_kwargs = feature
+        self.args: Dict[str, Any] = dict(kwarg_list.get("arg", []))
+        attribute_args = kwarg_list.get("attribute", [])
+        self.keys: Tuple[str, ...] = tuple(key for key, _ in attribute_args)
+        self.attributes: Tuple[str, ...] = tuple(attribute for _, attribute in attribute_args)
+        self.record_keys: Tuple[Tuple, ...] = tuple(
+            (self.attr_func, attribute, *sorted(self.attribute_kwargs.items())) for attribute in self.attributes
+        )
+        get_fields = attrgetter(*self.attributes)
+        self._get_fields: Callable[[Sentence], Tuple] = get_fields if len(self.attributes) > 1 else (
+            lambda sentence: (get_fields(sentence),)
+        )
+
+    def get_kwargs(self, values: Any) -> Dict[str, Any]:
+        """The keyword arguments of the feature function, count arrays are given as their dicts, see counts.py"""
+        kwargs = dict(self.args)
+        for key, value in zip(self.keys, values):
+            kwargs[key] = value.to_dict() if isinstance(value, CountArray) else value
+        return kwargs
+
+    def get_scalar(self, instance: C, record: Optional[Dict[Tuple, Any]] = None) -> Any:
+        """The scalar of the feature, from the fields of the sentence or of the elements of the instance
+
+        record: the fields of the elements merged for the features of the instance before, by their record keys
+        """
+        if isinstance(instance, Sentence):
+            values = self._get_fields(instance)
+        elif record is None:
+            elements = getattr(instance, instance.elements)
+            values = [self.attr_func(elements, attribute, **self.attribute_kwargs) for attribute in self.attributes]
+        else:
+            values = []
+            for record_key, attribute in zip(self.record_keys, self.attributes):
+                if record_key not in record:
+                    elements = getattr(instance, instance.elements)
+                    record[record_key] = self.attr_func(elements, attribute, **self.attribute_kwargs)
+                values.append(record[record_key])
+        return self.func(**self.get_kwargs(values))
+
+    def __reduce__(self):
+        """Pickle the compiled feature by its name, e.g. in the plan sent to a worker process"""
+        return get_compiled_feature, (self.aspect, self.language, self.name)
+
+
+COMPILED_FEATURES: Dict[Tuple[str, str], List[CompiledFeature]] = {
+    (aspect.ASPECT, language): [
+        CompiledFeature(aspect.ASPECT, language, feature)
+        for feature in getattr(aspect, f"{'ENGLISH' if language == 'en' else 'SWEDISH'}_FEATURES")
+    ] for aspect in LINGUISTIC_ASPECTS for language in ("en", "sv")
+}
+
+
+def get_language_features(aspect: Any, language: str) -> List[CompiledFeature]:
+    return COMPILED_FEATURES[aspect.ASPECT, "en" if language == "en" else "sv"]
+
+
+def get_compiled_feature(aspect: str, language: str, feature_name: str) -> CompiledFeature:
+    return next(feature for feature in COMPILED_FEATURES[aspect, language] if feature.name == feature_name)
+
+
+def load_statistic(instance: C, language: str, plan: Optional["StatisticPlan"] = None) -> C:
+    """Load the features of the linguistic aspects, with a plan only the planned features on first access"""
+    record: Dict[Tuple, Any] = {}  # the merged fields of the elements, only kept while the instance is loaded
     for aspect in LINGUISTIC_ASPECTS:
-        feature_lang_suffix = "ENGLISH" if language == "en" else "SWEDISH"
-        features = getattr(aspect, f"{feature_lang_suffix}_FEATURES")
-        data = get_features_data(instance, aspect.ASPECT, features)
+        if plan is None:
+            data = get_features_data(instance, aspect.ASPECT, get_language_features(aspect, language), record)
+        else:
+            data = LazyFeatures(instance, aspect.ASPECT, plan.features[aspect.ASPECT])
         setattr(instance, aspect.ASPECT, data)
     return instance
 
 
-def get_features_data(instance: C, aspect: str, features: F) -> Dict[str, Feature]:
+def get_features_data(
+    instance: C, aspect: str, features: List[CompiledFeature], record: Optional[Dict[Tuple, Any]] = None
+) -> Dict[str, Feature]:
     data: Dict[str, Feature] = OrderedDict()
-    for feature_name, func, attr_func, kwarg_list, attribute_kwargs in features:
-        if isinstance(instance, Sentence):
-            kwargs = parse_args(kwarg_list, getattr, instance)
-            data[feature_name] = Feature(scalar=func(**kwargs))
-        else:
-            blocks = getattr(instance, instance.elements)
-            kwargs = parse_args(kwarg_list, attr_func, blocks, **attribute_kwargs)
-            scalar_list = [getattr(block, aspect)[feature_name].scalar for block in blocks]
-            data[feature_name] = Feature(
-                scalar=func(**kwargs), mean=mean(scalar_list), median=median(scalar_list)
-            )
+    for feature in features:
+        data[feature.name] = get_feature(instance, aspect, feature.name, feature.get_scalar(instance, record))
     return data # setup for token property after computation for sentence
+
+
+def get_feature(instance: C, aspect: str, feature_name: str, scalar: Any) -> Feature:
+    """The feature with its scalar, and the mean and median of the scalars of the elements of the instance"""
+    if isinstance(instance, Sentence):
+        return Feature(scalar=scalar)
+    scalar_list = [get_feature_scalar(block, aspect, feature_name) for block in getattr(instance, instance.elements)]
+    return Feature(scalar=scalar, mean=mean(scalar_list), median=median(scalar_list))
+
+
+def get_feature_scalar(instance: Any, aspect: str, feature_name: str) -> Any:
+    """The scalar of a feature of the instance, of the lazy features without their mean and median"""
+    features = getattr(instance, aspect)
+    if isinstance(features, LazyFeatures):
+        return features.get_scalar(feature_name)
+    return features[feature_name].scalar
+
+
+class LazyFeatures(OrderedDict):
+    """The features of an aspect of a unit, computed on first access
+
+    features: the features which can be computed, in their order, the other features are missing
+    scalars: the scalars read without the features, e.g. by the mean of the unit above
+    """
+
+    def __init__(self, instance: C, aspect: str, features: List[CompiledFeature]) -> None:
+        super().__init__()
+        self.instance, self.aspect = instance, aspect
+        self.features = OrderedDict((feature.name, feature) for feature in features)
+        self.scalars: Dict[str, Any] = {}
+
+    def __missing__(self, feature_name: str) -> Feature:
+        if feature_name not in self.features:
+            raise KeyError(feature_name)
+        feature = get_feature(self.instance, self.aspect, feature_name, self.get_scalar(feature_name))
+        self[feature_name] = feature
+        return feature
+
+    def get_scalar(self, feature_name: str) -> Any:
+        if feature_name in self:
+            return self[feature_name].scalar
+        if feature_name not in self.scalars:
+            self.scalars[feature_name] = self.features[feature_name].get_scalar(self.instance)
+        return self.scalars[feature_name]
+
+    def __reduce__(self):
+        """Pickle the computed features without the instance"""
+        return OrderedDict, (list(self.items()),)
+
+
+class StatisticPlan:
+    """The units, aspects and features requested, e.g. by swegram statistic
+
+    fields: the fields counted from the tokens for the features, see CountFeatures.FIELD_GROUPS
+    features: the features of every linguistic aspect, the features of the other aspects are not computed
+    The general features are always loaded, the fields they need are counted anyway.
+    """
+
+    def __init__(
+        self, language: str, units: List[str], aspects: List[str],
+        include_features: Optional[List[str]] = None, exclude_features: Optional[List[str]] = None
+    ) -> None:
+        self.units, self.aspects = units, aspects
+        self.include_features, self.exclude_features = include_features or [], exclude_features or []
+        self.fields: Set[str] = set(CF.FIELDS).difference(*CF.FIELD_GROUPS.values())
+        self.features: Dict[str, List[CompiledFeature]] = {}
+        for aspect in LINGUISTIC_ASPECTS:
+            self.features[aspect.ASPECT] = [
+                feature for feature in get_language_features(aspect, language)
+                if aspect.ASPECT in aspects and self.is_selected(feature.name)
+            ]
+            for feature in self.features[aspect.ASPECT]:
+                self.fields.update(
+                    CF.UNION_FIELD if attribute == "type_count" else attribute for attribute in feature.attributes
+                )
+
+    def is_selected(self, feature_name: str) -> bool:
+        if self.include_features and feature_name not in self.include_features:
+            return False
+        return feature_name not in self.exclude_features
+
+    def select(self, features: Mapping[str, Feature]) -> Dict[str, Feature]:
+        """The selected features of an aspect of a unit, the lazy features are computed"""
+        feature_names = features.features if isinstance(features, LazyFeatures) else list(features)
+        return OrderedDict(
+            (feature_name, features[feature_name]) for feature_name in feature_names if self.is_selected(feature_name)
+        )
+
+
+def get_unit_statistics(
+    instance: Union[Text, Paragraph, Sentence], plan: Optional[StatisticPlan] = None
+) -> SimpleNamespace:
+    """The statistics of the aspects of a text, paragraph or sentence, and of its paragraphs and sentences
+
+    plan: only the selected features of the planned units and aspects, the others are left empty
+    """
+    if plan is None:
+        statistics = SimpleNamespace(**{aspect: getattr(instance, aspect) for aspect in STATISTIC_ASPECTS})
+    else:
+        unit = "text" if isinstance(instance, Text) else "paragraph" if isinstance(instance, Paragraph) else "sentence"
+        statistics = SimpleNamespace(**{
+            aspect: plan.select(getattr(instance, aspect)) if unit in plan.units and aspect in plan.aspects
+            else OrderedDict() for aspect in STATISTIC_ASPECTS
+        })
+    if isinstance(instance, Text):
+        statistics.paragraphs = [get_unit_statistics(paragraph, plan) for paragraph in instance.paragraphs]
+    elif isinstance(instance, Paragraph):
+        statistics.sentences = [get_unit_statistics(sentence, plan) for sentence in instance.sentences]
+    return statistics
+
+
+class TextEntry(NamedTuple):
+    """What a CorpusAggregate keeps of a text for the means and medians of the corpus
+
+    element_scalars: the scalars of CountFeatures.ELEMENT_FIELDS of the text
+    paragraph_sizes: (token count, sentences) of each paragraph of the text
+    feature_scalars: the scalars of the features of the text by aspect and feature name
+    attribute_values: the values of the attributes which are not summed in the fields, by their record keys
+    """
+    element_scalars: Dict[str, int]
+    paragraph_sizes: List[Tuple[int, int]]
+    feature_scalars: Dict[Tuple[str, str], Any]
+    attribute_values: Dict[Tuple, Any]
+
+
+SUM_ATTRIBUTE_FUNCTIONS = (
+    merge_digits, merge_dicts, merge_counters, mixin_merge_digits_or_counters, mixin_merge_digits_or_dicts
+)
+
+
+def is_summed(record_key: Tuple) -> bool:
+    """The attribute function sums the field over the texts, see CompiledFeature.record_keys"""
+    attr_func, attribute, *attribute_kwargs = record_key
+    return attr_func in SUM_ATTRIBUTE_FUNCTIONS and not attribute_kwargs and attribute in ADDITIVE_FIELDS
+
+
+class CorpusAggregate:
+    """Mergeable aggregate of the statistics of the texts of a corpus
+
+    The fields of the texts are summed in a FieldAggregate, which gives the same
+    values as the attribute functions applied to all texts at once, e.g. merge_digits
+    and merge_dicts. Of the other attributes, e.g. the longest dependency of the
+    texts, the value of each text is kept. Of each text, only these values, the
+    scalars of its features and the sizes of its paragraphs are kept for the means
+    and medians, by the key of the text, so that the texts can be removed again.
+    The depth list of the tokens is not kept, the corpus is the top of the hierarchy
+    where no features are computed from it. With a plan, only the planned features
+    are aggregated.
+    """
+
+    def __init__(self, language: str, plan: Optional[StatisticPlan] = None) -> None:
+        self.language = language
+        self.plan = plan
+        self.fields = FieldAggregate()
+        self.entries: Dict[Hashable, TextEntry] = {}
+
+    @property
+    def texts(self) -> int:
+        return len(self.entries)
+
+    def aspect_features(self) -> List[Tuple[str, CompiledFeature]]:
+        return [
+            (aspect.ASPECT, feature) for aspect in LINGUISTIC_ASPECTS for feature in (
+                get_language_features(aspect, self.language) if self.plan is None
+                else self.plan.features[aspect.ASPECT]
+            )
+        ]
+
+    def add(self, text: Text, key: Optional[Hashable] = None) -> Hashable:
+        """Add a text loaded with all aspects, the text can be dropped afterwards
+
+        key: the key to remove the text again, e.g. the id of the text in the database, a new key by default
+        """
+        key = uuid4() if key is None else key
+        if key in self.entries:
+            raise ValueError(f"Text {key} is already in the aggregate.")
+        self.fields.add(text)
+        feature_scalars, attribute_values = {}, {}
+        for aspect, feature in self.aspect_features():
+            for record_key, attribute in zip(feature.record_keys, feature.attributes):
+                if not is_summed(record_key) and record_key not in attribute_values:
+                    attribute_values[record_key] = feature.attr_func([text], attribute, **feature.attribute_kwargs)
+            feature_scalars[aspect, feature.name] = get_feature_scalar(text, aspect, feature.name)
+        self.entries[key] = TextEntry(
+            {field: getattr(text, field) for field in CF.ELEMENT_FIELDS},
+            [(p.token_count, p.sents) for p in text.paragraphs], feature_scalars, attribute_values
+        )
+        return key
+
+    def remove(self, text: Text, key: Hashable) -> None:
+        """Remove a text added with the key, its fields are subtracted"""
+        del self.entries[key]
+        self.fields.remove(text)
+
+    def merge(self, other: "CorpusAggregate") -> "CorpusAggregate":
+        """Merge the aggregate of other texts of the corpus"""
+        for key in other.entries:
+            if key in self.entries:
+                raise ValueError(f"Text {key} is already in the aggregate.")
+        self.entries.update(other.entries)
+        self.fields.merge(other.fields)
+        return self
+
+    def subtract(self, other: "CorpusAggregate") -> "CorpusAggregate":
+        """Subtract the aggregate of texts merged before, e.g. a chunk of texts deactivated at once"""
+        for key in other.entries:
+            del self.entries[key]
+        self.fields.subtract(other.fields)
+        return self
+
+    def load_corpus(self) -> Corpus:
+        """Corpus with the statistics of all aspects, without texts"""
+        corpus = Corpus(texts=[], language=self.language)
+        fields = self.fields.get_fields()
+        for field, value in fields.items():
+            setattr(corpus, field, value)
+        corpus.type_count = len(fields[CF.UNION_FIELD])
+        corpus.depth_list = []
+        if not self.entries:
+            return corpus
+
+        entries = list(self.entries.values())
+        CF().load_features(
+            corpus, {field: [entry.element_scalars[field] for entry in entries] for field in CF.ELEMENT_FIELDS},
+            [sizes for entry in entries for sizes in entry.paragraph_sizes]
+        )
+        for aspect in LINGUISTIC_ASPECTS:
+            setattr(corpus, aspect.ASPECT, OrderedDict())
+        for aspect, feature in self.aspect_features():
+            values = [
+                getattr(corpus, attribute) if is_summed(record_key) else feature.attr_func(
+                    [SimpleNamespace(**{attribute: entry.attribute_values[record_key]}) for entry in entries],
+                    attribute, **feature.attribute_kwargs
+                ) for record_key, attribute in zip(feature.record_keys, feature.attributes)
+            ]
+            scalar_list = [entry.feature_scalars[aspect, feature.name] for entry in entries]
+            getattr(corpus, aspect)[feature.name] = Feature(
+                scalar=feature.func(**feature.get_kwargs(values)), mean=mean(scalar_list), median=median(scalar_list)
+            )
+        return corpus
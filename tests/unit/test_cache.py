@@ -0,0 +1,89 @@
+import os
+
+import pytest
+from swegram_main.data.texts import TextDirectory as TD
+from swegram_main.pipeline import cache as cache_module
+from swegram_main.pipeline.cache import AnnotationCache
+
+
+def _write_text(directory, name, content):
+    text = TD(filepath=directory.joinpath(f"{name}.txt"))
+    text.filepath.write_text(content, encoding="utf-8")
+    return text
+
+
+def _tokenize(text):
+    text.tok.write_text(f"# newdoc id = {text.filepath}\n1\t{text.filepath.read_text()}\n\n", encoding="utf-8")
+
+
+@pytest.fixture(scope="function", name="cache")
+def cache_fixture(tmp_path):
+    yield AnnotationCache(tmp_path.joinpath("cache"))
+
+
+def test_restore_cached_text(tmp_path, cache):
+    text = _write_text(tmp_path, "a", "Hej")
+    key = cache.key(text, "efselab", "tokenize")
+    _tokenize(text)
+    cache.store(key, text)
+
+    other = _write_text(tmp_path, "b", "Hej")
+    texts, keys = cache.restore_texts([other], "efselab", "tokenize")
+    assert not texts and not keys
+    assert other.tok.read_text(encoding="utf-8") == f"# newdoc id = {other.filepath}\n1\tHej\n\n"
+    assert cache.stats["hits"] == 1
+
+
+def test_miss_on_other_model(tmp_path, cache):
+    text = _write_text(tmp_path, "a", "Hej")
+    key = cache.key(text, "efselab", "tokenize")
+    _tokenize(text)
+    cache.store(key, text)
+    text.tok.unlink()
+    texts, _ = cache.restore_texts([text], "udpipe", "tokenize")
+    assert texts == [text]
+    assert cache.stats["misses"] == 1
+
+
+def test_evict_least_recently_used(tmp_path):
+    texts = [_write_text(tmp_path, name, name * 10) for name in "abc"]
+    cache = AnnotationCache(tmp_path.joinpath("cache"))
+    keys = [cache.key(text, "efselab", "tokenize") for text in texts]
+    for text in texts:
+        _tokenize(text)
+    cache.max_size = sum(os.path.getsize(text.tok) for text in texts[:2])
+    for key, text in zip(keys, texts):
+        cache.store(key, text)
+    assert cache.stats["entries"] == 2
+    assert not cache.restore(keys[0], texts[0])
+    assert cache.restore(keys[2], texts[2])
+
+
+def test_store_keeps_entry_of_other_process(tmp_path, cache, monkeypatch):
+    text = _write_text(tmp_path, "a", "Hej")
+    key = cache.key(text, "efselab", "tokenize")
+    _tokenize(text)
+    rename = os.rename
+
+    def rename_after_other_process(source, target):
+        # the entry is stored by another process between the removal and the rename
+        os.makedirs(target)
+        target.joinpath("tok").write_text("other", encoding="utf-8")
+        monkeypatch.setattr(os, "rename", rename)
+        rename(source, target)
+
+    monkeypatch.setattr(os, "rename", rename_after_other_process)
+    cache.store(key, text)
+    assert cache.stats["entries"] == 1 and cache.stats["size"] == len("other")
+    assert [path.name for path in cache.cache_dir.joinpath(key[:2]).iterdir()] == [key]
+
+
+def test_model_version_of_model_directory(tmp_path, monkeypatch):
+    model_dir = tmp_path.joinpath("histnorm")
+    model_dir.joinpath("scripts").mkdir(parents=True)
+    script = model_dir.joinpath("scripts", "normalise.perl")
+    script.write_text("1;", encoding="utf-8")
+    monkeypatch.setitem(cache_module.MODEL_FILES, "test", [model_dir])
+    version = cache_module.get_model_version("test")
+    script.write_text("1; 2;", encoding="utf-8")
+    assert cache_module.get_model_version("test") != version
@@ -0,0 +1,44 @@
+import pytest
+from swegram_main.lib.utils import is_a_ud_tree
+from swegram_main.pipeline import checker
+from swegram_main.pipeline.checker import UploadedTextValidationError, check_text
+
+
+SENTENCE = (
+    "{index}\t1\tHello\t_\thello\tINTJ\tUH\t_\t2\tdiscourse\t_\t_\n"
+    "{index}\t2\tworld\t_\tworld\tNOUN\t{xpos}\tNumber=Sing\t0\troot\t_\t_\n\n"
+)
+
+
+def _text(xpos="NN", num_sentences=3):
+    return [
+        line for index in range(1, num_sentences + 1)
+        for line in SENTENCE.format(index=f"1.{index}", xpos=xpos).splitlines(keepends=True)
+    ]
+
+
+def test_is_a_ud_tree():
+    assert is_a_ud_tree(["2", "0", "2"]) is True
+    assert is_a_ud_tree(["2", "3", "1", "0"], "[s]") == "[s] Cycle Error in sentence."
+    assert is_a_ud_tree(["2", "1"], "[s]") == "[s] Root is missing."
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_check_text(monkeypatch, jobs):
+    monkeypatch.setattr(checker, "SENTENCES_PER_CHUNK", 1)
+    assert check_text("udpipe", iter(_text()), jobs=jobs) == (False, True, True)
+    with pytest.raises(UploadedTextValidationError) as err:
+        check_text("udpipe", iter(_text(xpos="ZZ")), jobs=jobs)
+    assert str(err.value).splitlines() == [
+        f"[Line Reference: 1.{index} 2] COLUMN_XPOS_ERROR: Unknown xpos ZZ" for index in range(1, 4)
+    ]
+
+
+def test_stop_after_max_errors():
+    with pytest.raises(UploadedTextValidationError) as err:
+        check_text("udpipe", iter(_text(xpos="ZZ")), max_errors=2)
+    assert str(err.value).splitlines() == [
+        "[Line Reference: 1.1 2] COLUMN_XPOS_ERROR: Unknown xpos ZZ",
+        "[Line Reference: 1.2 2] COLUMN_XPOS_ERROR: Unknown xpos ZZ",
+        "Stopped checking after 2 errors."
+    ]
@@ -0,0 +1,32 @@
+from swegram_main.pipeline.lib.compounds import find_compounds, mark_compounds
+from swegram_main.pipeline.postprocess import postprocess_lines
+
+
+WORDFORMS = frozenset(["bildörren", "stadsparken"])
+TAGGED_LINES = [
+    "1\tBil\tbil\tNOUN\tNN|UTR|SIN|IND|NOM\tCase=Nom|Definite=Ind|Gender=Com|Number=Sing\n",
+    "2\tdörren\tdörr\tNOUN\tNN|UTR|SIN|DEF|NOM\tCase=Nom|Definite=Def|Gender=Com|Number=Sing\n",
+    "3\tgick\tgå\tVERB\tVB|PRT|AKT\tMood=Ind|Tense=Past|VerbForm=Fin|Voice=Act\n",
+    "\n",
+    "1\tdörren\tdörr\tNOUN\tNN|UTR|SIN|DEF|NOM\tCase=Nom|Definite=Def|Gender=Com|Number=Sing\n",
+    "\n",
+]
+
+
+def test_find_compounds():
+    tokens = [
+        ("stads", "NN|UTR|SIN|IND|GEN"), ("parken", "NN|UTR|SIN|DEF|NOM"), ("", ""),
+        ("bil", "NN|UTR|SIN|IND|NOM"), ("", ""), ("dörren", "NN|UTR|SIN|DEF|NOM"),
+        ("stads", "PM|GEN"), ("parken", "NN|UTR|SIN|DEF|NOM"), ("stads", "NN|UTR|SIN|DEF|GEN"), ("parken", "VB")
+    ]
+    assert find_compounds(tokens, WORDFORMS) == [0, 6]
+
+
+def test_mark_compounds_in_tag():
+    lines = list(mark_compounds(TAGGED_LINES, WORDFORMS))
+    assert lines[0] == TAGGED_LINES[0].replace("\n", "\tSplitCompound=Bildörren\n")
+    assert lines[1:] == TAGGED_LINES[1:]
+
+    conll_lines = list(postprocess_lines("efselab", "tag", lines, False))
+    assert conll_lines[0].rstrip("\n").split("\t")[9:] == ["_", "_", "_", "SplitCompound=Bildörren"]
+    assert conll_lines[1].rstrip("\n").split("\t")[9:] == ["_", "_", "_", "_"]
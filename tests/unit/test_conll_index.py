@@ -0,0 +1,51 @@
+import os
+from pathlib import Path
+
+import pytest
+from swegram_main.handler.handler import iter_selected_texts
+from swegram_main.lib.conll_index import get_index_path, load_index, read_sentence
+from swegram_main.lib.utils import iter_conll_texts
+
+
+CONLL = (
+    "<elev: 1>\n1.1\t1\tEn\n1.1\t2\tmening\n\n1.2\t1\tTvå\n\n\n2.1\t1\tStycke\n\n"
+    "<elev: 2; klass: 9>\r\n1.1\t1\tSista\r\n\r\n1.2\t1\trad\r\n"
+)
+
+
+@pytest.fixture(name="conll")
+def fixture_conll(tmp_path) -> Path:
+    filepath = tmp_path.joinpath("text.conll")
+    filepath.write_bytes(CONLL.encode("utf-8"))
+    return filepath
+
+
+def test_load_index(conll):
+    index = load_index(conll)
+    assert get_index_path(conll).exists()
+    assert load_index(conll) == index
+    assert [text.labels for text in index] == [{"elev": "1"}, {"elev": "2", "klass": "9"}]
+
+    for indexed_text, text in zip(index, iter_conll_texts(conll)):
+        ranged_text, = iter_conll_texts(conll, byte_range=(indexed_text.start, indexed_text.end))
+        assert ranged_text.paragraphs == text.paragraphs
+        assert ranged_text.metadata == text.metadata
+        assert indexed_text.text_id == text.text_id
+
+
+def test_read_sentence(conll):
+    assert read_sentence(conll, 0, 0, 1) == [("1.2", "1", "Två")]
+    assert read_sentence(conll, 1, 0, 1, split_columns=False) == ["1.2\t1\trad\n"]
+
+
+def test_load_index_rebuilt_after_change(conll):
+    load_index(conll)
+    conll.write_bytes(CONLL.replace("Sista", "Första").encode("utf-8"))
+    os.utime(conll, ns=(0, 0))
+    assert read_sentence(conll, 1, 0, 0) == [("1.1", "1", "Första")]
+
+
+def test_iter_selected_texts(conll):
+    text, = iter_selected_texts(conll, ["klass:9"], [])
+    assert text.metadata == {"elev": "2", "klass": "9"}
+    assert [text.metadata for text in iter_selected_texts(conll, [], ["klass:9"])] == [{"elev": "1"}]
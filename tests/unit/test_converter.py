@@ -0,0 +1,65 @@
+import zipfile
+
+import pytest
+from swegram_main.lib import converter
+from swegram_main.lib.converter import Converter
+
+
+DOCX = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+  xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006">
+<w:body>
+<w:p><w:r><w:t>&lt;elev: 1&gt;</w:t></w:r></w:p>
+<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r><w:t>Rubrik</w:t></w:r></w:p>
+<w:p><w:r><w:t xml:space="preserve">Det var en </w:t></w:r><w:r><w:rPr><w:b/></w:rPr><w:t>gång</w:t></w:r>
+<w:del><w:r><w:delText>borttaget</w:delText></w:r></w:del><w:ins><w:r><w:t xml:space="preserve"> en katt</w:t></w:r></w:ins>
+<w:r><w:tab/><w:t>som</w:t><w:br/><w:t>sov.</w:t></w:r></w:p>
+<w:p/>
+<w:p><w:r><mc:AlternateContent><mc:Choice><w:txbxContent><w:p><w:r><w:t>Textruta</w:t></w:r></w:p></w:txbxContent>
+</mc:Choice><mc:Fallback><w:p><w:r><w:t>Textruta</w:t></w:r></w:p></mc:Fallback></mc:AlternateContent></w:r>
+<w:r><w:t>Slut.</w:t></w:r></w:p>
+</w:body>
+</w:document>
+"""
+
+ODT = """<?xml version="1.0" encoding="UTF-8"?>
+<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+  xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0">
+<office:body><office:text>
+<text:tracked-changes><text:changed-region><text:deletion><text:p>Borttaget</text:p></text:deletion>
+</text:changed-region></text:tracked-changes>
+<text:h text:outline-level="1">Rubrik</text:h>
+<text:p>Det var<text:s text:c="2"/>en <text:span>gång</text:span><text:note><text:note-body>
+<text:p>Fotnot</text:p></text:note-body></text:note> en katt<text:tab/>som<text:line-break/>sov.</text:p>
+<text:list><text:list-item><text:p>Punkt</text:p></text:list-item></text:list>
+</office:text></office:body>
+</office:document-content>
+"""
+
+
+@pytest.fixture(scope="function", name="documents")
+def documents_fixture(tmp_path):
+    docx, odt = tmp_path.joinpath("text.docx"), tmp_path.joinpath("text.odt")
+    with zipfile.ZipFile(docx, mode="w") as archive:
+        archive.writestr("word/document.xml", DOCX)
+    with zipfile.ZipFile(odt, mode="w") as archive:
+        archive.writestr("content.xml", ODT)
+    yield docx, odt
+
+
+def test_extract_docx(documents):
+    assert list(Converter(documents[0]).parse()) == [
+        "<elev: 1>\n", "Rubrik\n", "Det var en gång en katt som sov.\n", "Slut.\n", "Textruta\n"
+    ]
+
+
+def test_extract_odt(documents):
+    assert list(Converter(documents[1]).parse()) == ["Rubrik\n", "Det var en gång en katt som sov.\n", "Punkt\n"]
+
+
+def test_conversions_are_cached(documents, monkeypatch):
+    lines = list(Converter(documents[0]).parse())
+    monkeypatch.setitem(converter.EXTRACTORS, "docx", None)
+    copy = documents[0].parent.joinpath("copy.docx")
+    copy.write_bytes(documents[0].read_bytes())
+    assert list(Converter(copy).parse()) == lines
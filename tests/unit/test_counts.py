@@ -0,0 +1,52 @@
+import pickle
+from pathlib import Path
+
+import pytest
+from swegram_main.config import ASPECTS
+from swegram_main.handler.handler import load
+from swegram_main.lib import counts
+from swegram_main.lib.counts import CountArray, count_token_keys
+from swegram_main.statistics.features.general import CountFeatures as CF
+
+
+ANNOTATED = Path(__file__).parents[2].joinpath("resources", "corpus", "annotated")
+SENTENCES = [
+    [("en", "_", "en", "DET", "DT"), ("hund", "_", "hund", "NOUN", "NN"), ("hund", "hunnd", "hund", "NOUN", "NN")],
+    [("en", "_", "en", "NUM", "RG"), ("katt", "_", "katt", "NOUN", "NN")],
+]
+
+
+def _nonzero(counts_: dict) -> dict:
+    return {key: value for key, value in counts_.items() if value}
+
+
+def test_count_token_keys():
+    first, second = (count_token_keys(sentence) for sentence in SENTENCES)
+    form_upos, norm_upos, *_, upos, _, word = first
+    assert form_upos == {"en_DET": 1, "hund_NOUN": 2}
+    assert norm_upos == {"__DET": 1, "__NOUN": 1, "hunnd_NOUN": 1}
+    assert word == {"en": 1, "hund": 1, "hunnd": 1}
+    assert upos["VERB"] == 0
+
+    merged = [CountArray.merge(arrays) for arrays in zip(first, second)]
+    assert merged[0] == {"en_DET": 1, "hund_NOUN": 2, "en_NUM": 1, "katt_NOUN": 1}
+    assert merged[6] == {"DET": 1, "NOUN": 3, "NUM": 1}
+    assert [pickle.loads(pickle.dumps(array)) for array in merged] == merged
+
+
+def test_count_engines(monkeypatch):
+    corpus = load(ANNOTATED.joinpath("10-sv.conll"), "sv", parsed=True)
+    monkeypatch.setattr(counts, "_COUNT_ENGINE", "numpy")
+    numpy_corpus = load(ANNOTATED.joinpath("10-sv.conll"), "sv", parsed=True)
+
+    assert isinstance(numpy_corpus.word_dict, CountArray)
+    for field in CF.FREQ_FIELDS:
+        # the defaultdicts keep the missing keys read by the features, with a count of 0
+        assert _nonzero(getattr(numpy_corpus, field)) == _nonzero(getattr(corpus, field))
+    for aspect in ASPECTS:
+        assert getattr(numpy_corpus, aspect) == getattr(corpus, aspect)
+
+
+def test_set_count_engine():
+    with pytest.raises(ValueError):
+        counts.set_count_engine("pandas")
@@ -0,0 +1,28 @@
+import pytest
+from swegram_main.lib.dependency_tree import DependencyTree
+
+
+# 1 <- 2 -> 3 -> 4, 2 -> 5, 2 is the root
+HEADS = [None, 2, 0, 2, 3, 2]
+
+
+def test_dependency_tree():
+    tree = DependencyTree(HEADS)
+    assert tree.children == [[2], [], [1, 3, 5], [4], [], []]
+    assert [tree.get_path(index) for index in range(1, 6)] == [(1, 2, 0), (2, 0), (3, 2, 0), (4, 3, 2, 0), (5, 2, 0)]
+    assert tree.get_depth(4) == 3
+    assert tree.get_child_nodes(2) == [1, 3, 4, 5]
+    assert tree.get_child_nodes(3) == [4]
+    assert tree.get_subtree_size(3) == 2
+
+
+def test_get_subtree_nodes():
+    tree = DependencyTree(HEADS)
+    assert tree.get_subtree_nodes([3, 4, 1]) == {1, 3, 4}
+    assert tree.get_subtree_nodes([3, 4, 1], include_roots=False) == {4}
+    assert tree.get_subtree_nodes([]) == set()
+
+
+def test_dependency_tree_with_cycle():
+    with pytest.raises(ValueError):
+        DependencyTree([None, 2, 1, 0])
@@ -0,0 +1,37 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+HISTNORM_SV = Path(__file__).parents[2].joinpath("build_dependencies", "sv", "HistNorm")
+SCRIPT = HISTNORM_SV.joinpath("scripts", "normalise_levenshtein_elevtexter.perl")
+THRESHOLD = HISTNORM_SV.joinpath("resources", "swedish", "levenshtein", "threshold.swedish.elevtexter.txt")
+TEXTS = ["Blef\nsyyn\n.\n\nHej\nSyyn\n", "syyn\nemillan\nOslo\n"]
+
+
+@pytest.fixture(scope="function", name="resources")
+def resources_fixture(tmp_path):
+    if shutil.which("perl") is None:
+        pytest.skip("perl is not installed")
+    dictionary = tmp_path.joinpath("swedish.dic")
+    dictionary.write_text("blev\nsyn\nsyn\nhej\nemellan\n", encoding="utf-8")
+    return [str(dictionary), "nostop", str(dictionary), "noweights", str(THRESHOLD)]
+
+
+def test_worker_as_one_shot(tmp_path, resources):
+    expected = []
+    for index, text in enumerate(TEXTS):
+        filepath = tmp_path.joinpath(f"{index}.tok")
+        filepath.write_text(text, encoding="utf-8")
+        expected.append(subprocess.run(
+            ["perl", "-CSAD", str(SCRIPT), str(filepath), *resources], capture_output=True, check=True
+        ).stdout.decode())
+
+    response = subprocess.run(
+        ["perl", "-CSAD", str(SCRIPT), "--worker", *resources], capture_output=True, check=True,
+        input="".join(f"{text}<EOT>\n" for text in TEXTS).encode()
+    )
+    assert response.stdout.decode() == "".join(["<READY>\n", *(f"{output}<EOT>\n" for output in expected)])
+    assert expected[1] == "syn\nemellan\nOslo\n"
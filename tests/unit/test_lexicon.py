@@ -0,0 +1,20 @@
+import difflib
+import random
+
+import pytest
+from build_dependencies.en.histnorm.lexicon import Lexicon
+
+
+@pytest.fixture(scope="module", name="words")
+def words_fixture():
+    rand = random.Random(0)
+    return list(dict.fromkeys("".join(rand.choices("abcdeilnorst", k=rand.randint(2, 9))) for _ in range(3000)))
+
+
+@pytest.mark.parametrize("n", [1, 6])
+def test_close_matches_as_difflib(words, n):
+    lexicon = Lexicon({word: 0 for word in words})
+    rand = random.Random(1)
+    for _ in range(200):
+        word = "".join(rand.choices("abcdeilnorstu", k=rand.randint(1, 10)))
+        assert lexicon.close_matches(word, n) == difflib.get_close_matches(word, words, n)
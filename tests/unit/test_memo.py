@@ -0,0 +1,28 @@
+import pytest
+from swegram_main.pipeline.lib.memo import SentenceMemo, read_blocks, write_blocks
+
+
+def _tag(sentences, calls):
+    calls.append(len(sentences))
+    return [[f"{line.rstrip()}\tTAG\n" for line in lines] for lines in sentences]
+
+
+@pytest.mark.parametrize("persistent", [False, True])
+def test_annotate_repeated_sentences_once(tmp_path, persistent):
+    memo = SentenceMemo(tmp_path.joinpath("memo.db") if persistent else None)
+    sentences = [["1\tHej\n"], ["1\tDå\n"], ["1\tHej\n"]]
+    calls = []
+    annotations = memo.annotate("test", sentences, lambda unseen: _tag(unseen, calls))
+    assert annotations == [["1\tHej\tTAG\n"], ["1\tDå\tTAG\n"], ["1\tHej\tTAG\n"]]
+    assert calls == [2]
+    assert memo.stats == {"hits": 1, "misses": 2, "dedup_ratio": 0.3333}
+
+    assert memo.annotate("test", sentences[:1], lambda unseen: _tag(unseen, calls)) == [["1\tHej\tTAG\n"]]
+    assert calls == [2]
+
+
+def test_blocks_keep_comments():
+    content = "# sent_id = 1\n1\tHej\n\n# sent_id = 2\n1\tDå\n2\t.\n\n"
+    blocks = read_blocks(content)
+    assert blocks == [(["# sent_id = 1\n"], ["1\tHej\n"]), (["# sent_id = 2\n"], ["1\tDå\n", "2\t.\n"])]
+    assert write_blocks(blocks) == content
@@ -0,0 +1,21 @@
+from swegram_main.pipeline.postprocess import (
+    insert_metadata, insert_metadata_lines, postprocess_helper, postprocess_lines
+)
+
+
+TAGGED = (
+    "# newdoc id = a.txt\n# newpar\n# sent_id = 1\n1\tHello\thello\tINTJ\tUH\t_\n\n"
+    "# sent_id = 2\n1\tWorld\tworld\tNOUN\tNN\tNumber=Sing\n\n\n"
+    "# newpar\n# sent_id = 3\n1\tBye\tbye\tINTJ\tUH\t_\n\n"
+)
+
+
+def test_postprocess_lines_as_files(tmp_path):
+    filepath = tmp_path.joinpath("a.tag")
+    filepath.write_text(TAGGED, encoding="utf-8")
+    postprocess_helper("udpipe", filepath, False, False)
+    insert_metadata(tmp_path.joinpath("a.conll"), {"id": "a"})
+
+    content = "".join(postprocess_lines("udpipe", "tag", TAGGED.splitlines(keepends=True), False))
+    assert "".join(insert_metadata_lines(content, {"id": "a"})) == tmp_path.joinpath("a.conll").read_text("utf-8")
+    assert "2.1\t1\tBye\t_\tbye" in content
@@ -0,0 +1,39 @@
+import pytest
+from swegram_main.data.texts import TextDirectory as TD
+from swegram_main.pipeline.checker import UploadedTextValidationError
+from swegram_main.pipeline.preprocess import restore
+
+
+TAGGED = (
+    "1.1\t1\tHej\thej\thej\tINTJ\tIN\t_\t_\t_\t_\t_\t_\n"
+    "1.1\t2\tvärlden\tvärlden\tvärld\tNOUN\tNN\tDefinite=Def\tUTR|SIN|DEF|NOM\t_\t_\t_\t_\n\n"
+)
+
+
+def _restore(tmp_path, content):
+    text = TD(filepath=tmp_path.joinpath("upload", "a_0.txt"))
+    text.filepath.parent.mkdir()
+    text.filepath.write_text(content, encoding="utf-8")
+    output_dir = tmp_path.joinpath("output")
+    restore(text, output_dir, "efselab")
+    return output_dir
+
+
+def test_restore_normalized_tagged_text(tmp_path):
+    output_dir = _restore(tmp_path, TAGGED)
+    assert sorted(path.name for path in output_dir.iterdir()) == ["a_0.spell", "a_0.tag", "a_0.tok"]
+    assert output_dir.joinpath("a_0.tok").read_text(encoding="utf-8") == "Hej\nvärlden\n\n"
+    assert output_dir.joinpath("a_0.tag").read_text(encoding="utf-8") == (
+        "1\thej\thej\tINTJ\tIN\t_\n2\tvärlden\tvärld\tNOUN\tNN|UTR|SIN|DEF|NOM\tDefinite=Def\n\n"
+    )
+
+
+def test_restore_tokenized_text(tmp_path):
+    output_dir = _restore(tmp_path, "1.1\t1\tHej\t_\t_\t_\t_\t_\t_\t_\t_\t_\t_\n\n")
+    assert [path.name for path in output_dir.iterdir()] == ["a_0.tok"]
+
+
+def test_invalid_text_is_not_restored(tmp_path):
+    with pytest.raises(UploadedTextValidationError):
+        _restore(tmp_path, TAGGED.replace("\tNN\t", "\tZZ\t"))
+    assert not tmp_path.joinpath("output").exists()
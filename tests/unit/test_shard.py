@@ -0,0 +1,24 @@
+from swegram_main.data.texts import TextDirectory as TD
+from swegram_main.pipeline.shard import split_paragraphs, shard_text, stitch
+
+
+def test_split_paragraphs_after_sentence_end():
+    content = "En mening.\n\nEn rubrik\n\nTredje stycket!\n\nSista."
+    assert split_paragraphs(content, 1) == ["En mening.\n\n", "En rubrik\n\nTredje stycket!\n\n", "Sista."]
+    assert "".join(split_paragraphs(content, 20)) == content
+
+
+def test_stitch_udpipe_shards(tmp_path):
+    text = TD(filepath=tmp_path.joinpath("a_0.txt"))
+    text.filepath.write_text("Hello.\n\nWorld.\n", encoding="utf-8")
+    shards = shard_text(text, 1)
+    assert len(shards) == 2
+    for index, shard in enumerate(shards):
+        shard.tok.write_text(
+            f"# newdoc id = {shard.filepath}\n# newpar\n# sent_id = 1\n1\tw{index}\n\n", encoding="utf-8"
+        )
+    stitch(text, shards)
+    assert text.tok.read_text(encoding="utf-8") == (
+        f"# newdoc id = {text.filepath}\n# newpar\n# sent_id = 1\n1\tw0\n\n# newpar\n# sent_id = 2\n1\tw1\n\n"
+    )
+    assert not text.tag.exists()
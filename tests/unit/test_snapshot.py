@@ -0,0 +1,46 @@
+import shutil
+from pathlib import Path
+
+import pytest
+from swegram_main.handler import handler
+from swegram_main.handler.handler import iter_file, iter_texts, snapshot_file
+from swegram_main.handler.snapshot import get_snapshot_path, read_snapshot
+
+
+ANNOTATED = Path(__file__).parents[2].joinpath("resources", "corpus", "annotated")
+
+
+@pytest.fixture(scope="function", name="conll")
+def conll_fixture(tmp_path):
+    conll = tmp_path.joinpath("text.conll")
+    shutil.copy(ANNOTATED.joinpath("10-sv-metadata.conll"), conll)
+    yield conll
+
+
+def test_snapshot(conll):
+    texts = list(iter_file(conll, "sv", [], []))
+    assert snapshot_file(conll, "sv") == get_snapshot_path(conll)
+
+    snapshot_texts = list(iter_texts(conll, "sv", use_snapshots=True))
+    assert [t.text_id for t in snapshot_texts] == [t.text_id for t in texts]
+    assert all(t.filename == conll for t in snapshot_texts)
+    for aspect in ("general", "readability", "syntactic"):
+        assert [getattr(t, aspect) for t in snapshot_texts] == [getattr(t, aspect) for t in texts]
+    assert snapshot_texts[0].paragraphs[0].sentences[0].tokens == texts[0].paragraphs[0].sentences[0].tokens
+
+    assert read_snapshot(conll, "en") is None
+    conll.write_text(conll.read_text(encoding="utf-8") + "\n", encoding="utf-8")
+    assert read_snapshot(conll, "sv") is None
+
+
+def test_snapshot_is_opt_in(conll, monkeypatch):
+    snapshot_file(conll, "sv")
+    monkeypatch.setattr(handler, "read_snapshot", None)
+    assert [t.text_id for t in iter_texts(conll, "sv")] == [t.text_id for t in iter_file(conll, "sv", [], [])]
+
+
+def test_snapshot_takes_over_texts(conll, monkeypatch):
+    texts = list(iter_file(conll, "sv", [], []))
+    monkeypatch.setattr(handler, "load_text", None)
+    snapshot_file(conll, "sv", texts)
+    assert [t.general for t in read_snapshot(conll, "sv")] == [t.general for t in texts]
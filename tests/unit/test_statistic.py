@@ -0,0 +1,112 @@
+from pathlib import Path
+
+import pytest
+from swegram_main.config import ASPECTS
+from swegram_main.handler import handler
+from swegram_main.handler.handler import iter_text_statistics, iter_texts, load
+from swegram_main.statistics.aggregate import FieldAggregate
+from swegram_main.statistics.statistic import CorpusAggregate, StatisticPlan
+
+
+ANNOTATED = Path(__file__).parents[2].joinpath("resources", "corpus", "annotated")
+
+
+@pytest.mark.parametrize("filename, language", [("10-sv.conll", "sv"), ("10-en.conll", "en")])
+def test_corpus_aggregate(filename, language):
+    corpus = load(ANNOTATED.joinpath(filename), language, parsed=True)
+    texts = list(iter_texts(ANNOTATED.joinpath(filename), language))
+
+    aggregate, first, second = CorpusAggregate(language), CorpusAggregate(language), CorpusAggregate(language)
+    for index, text in enumerate(texts):
+        aggregate.add(text)
+        (first if index < len(texts) // 2 else second).add(text)
+
+    for streamed in (aggregate.load_corpus(), first.merge(second).load_corpus()):
+        assert streamed.word_dict == corpus.word_dict
+        assert sorted(streamed.types) == sorted(corpus.types)
+        for aspect in ASPECTS:
+            assert getattr(streamed, aspect) == getattr(corpus, aspect)
+
+
+def test_iter_text_statistics(monkeypatch):
+    monkeypatch.setattr(handler, "STATISTIC_CHUNK_TOKENS", 100)
+    input_path = ANNOTATED.joinpath("10-sv-metadata.conll")
+    corpus = load(input_path, "sv", parsed=True)
+
+    aggregate, statistics = CorpusAggregate("sv"), []
+    for chunk_aggregate, chunk_statistics in iter_text_statistics(input_path, "sv", jobs=2):
+        aggregate.merge(chunk_aggregate)
+        statistics.extend(chunk_statistics)
+
+    loaded_corpus = aggregate.load_corpus()
+    assert len(statistics) == len(corpus.texts)
+    for aspect in ASPECTS:
+        assert getattr(loaded_corpus, aspect) == getattr(corpus, aspect)
+        for text_statistics, text in zip(statistics, corpus.texts):
+            assert getattr(text_statistics, aspect) == getattr(text, aspect)
+            assert [getattr(s, aspect) for p in text_statistics.paragraphs for s in p.sentences] == [
+                getattr(s, aspect) for p in text.paragraphs for s in p.sentences
+            ]
+
+
+def test_statistic_plan():
+    plan = StatisticPlan("sv", ["corpus"], ["readability"], include_features=["LIX"])
+    assert [feature.name for feature in plan.features["readability"]] == ["LIX"]
+    assert plan.features["syntactic"] == []
+    assert "word_dict" in plan.fields and "depth_list" not in plan.fields
+
+    corpus = load(ANNOTATED.joinpath("10-sv.conll"), "sv", parsed=True)
+    planned_corpus = load(ANNOTATED.joinpath("10-sv.conll"), "sv", parsed=True, plan=plan)
+    assert plan.select(planned_corpus.readability) == {"LIX": corpus.readability["LIX"]}
+    assert plan.select(planned_corpus.general) == {}
+
+    # the corpus only reads the scalars of its texts, the paragraphs and sentences are not computed
+    text, paragraph = planned_corpus.texts[0], planned_corpus.texts[0].paragraphs[0]
+    assert not text.readability and text.readability.scalars == {"LIX": corpus.texts[0].readability["LIX"].scalar}
+    assert not paragraph.readability and not paragraph.readability.scalars
+    assert paragraph.sentences[0].depth_list == [] and paragraph.sentences[0].word_dict
+
+
+@pytest.fixture(name="texts")
+def fixture_texts(tmp_path):
+    conll = tmp_path.joinpath("texts.conll")
+    conll.write_text("\n\n".join(
+        f"<text: {index}>\n" + ANNOTATED.joinpath(filename).read_text(encoding="utf-8").strip("\n")
+        for index, filename in enumerate(["10-sv.conll", "10-sv-norm.conll", "10-sv.conll"], 1)
+    ) + "\n", encoding="utf-8")
+    return list(iter_texts(conll, "sv"))
+
+
+def test_corpus_aggregate_remove(texts):
+    aggregate, kept = CorpusAggregate("sv"), CorpusAggregate("sv")
+    keys = [aggregate.add(text, key) for key, text in enumerate(texts)]
+    kept.add(texts[1])
+    for key in (0, 2):
+        aggregate.remove(texts[key], key)
+    first, rest = CorpusAggregate("sv"), CorpusAggregate("sv")
+    first.add(texts[1])
+    rest.add(texts[0])
+    rest.add(texts[2])
+
+    expected = kept.load_corpus()
+    assert keys == [0, 1, 2] and aggregate.texts == 1
+    for corpus in (aggregate.load_corpus(), first.merge(rest).subtract(rest).load_corpus()):
+        assert corpus.word_dict == expected.word_dict and corpus.cefr_counter == expected.cefr_counter
+        assert sorted(corpus.types) == sorted(expected.types)
+        for aspect in ASPECTS:
+            assert getattr(corpus, aspect) == getattr(expected, aspect)
+
+    with pytest.raises(ValueError):
+        aggregate.add(texts[1], 1)
+
+
+def test_field_aggregate(texts):
+    aggregate = FieldAggregate()
+    for text in texts:
+        aggregate.add(text)
+    aggregate.remove(texts[0])
+    # the first and the last text are the same, their types are kept with the last text
+    assert sorted(aggregate.types) == sorted(set(texts[1].types).union(texts[2].types))
+    assert aggregate.fields["token_count"] == texts[1].token_count + texts[2].token_count
+    aggregate.remove(texts[2])
+    assert aggregate.get_fields()["word_dict"] == texts[1].word_dict and aggregate.blocks == 1
@@ -0,0 +1,21 @@
+import pickle
+
+from swegram_main.handler.handler import load_token
+
+
+LINE = "1.1\t2\thunden\thunden\thund\tNOUN\tNN\tNN|UTR|SIN|DEF|NOM\tCase=Nom\t3\tnsubj\t_\t_\n"
+COLUMNS = LINE.split("\t")
+
+
+def test_token_slots():
+    token = load_token(COLUMNS, "sv")
+    assert not hasattr(token, "__dict__")
+    assert token.path is None and token.highlight is None
+    assert pickle.loads(pickle.dumps(token)) == token
+
+
+def test_token_columns_are_shared():
+    first, second = load_token(COLUMNS, "sv"), load_token(LINE.split("\t"), "sv")
+    assert first.xpos is second.xpos and first.form is second.form
+    english = load_token(COLUMNS[:8] + COLUMNS[9:], "en")
+    assert english.ufeats is None and english.head == "3"
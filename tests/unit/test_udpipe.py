@@ -0,0 +1,37 @@
+from pathlib import Path
+
+import pytest
+from swegram_main.pipeline.lib.udpipe import _concatenate, _split_documents, _split_stream
+
+
+SENTENCE = "# sent_id = 1\n1\tHello\t_\t_\t_\t_\t_\t_\t_\t_\n\n"
+
+
+@pytest.fixture(scope="function", name="conllu_files")
+def conllu_files_fixture(tmp_path):
+    contents = [f"# newdoc id = a.txt\n{SENTENCE}", "", f"{SENTENCE}{SENTENCE}\n"]
+    filepaths = []
+    for index, content in enumerate(contents):
+        filepath = tmp_path.joinpath(f"{index}.tok")
+        filepath.write_text(content, encoding="utf-8")
+        filepaths.append(filepath)
+    yield filepaths
+
+
+@pytest.mark.en
+def test_split_stream_restores_each_text(conllu_files):
+    documents = _split_stream(_concatenate(conllu_files), conllu_files)
+    assert documents[conllu_files[0]] == f"# newdoc id = a.txt\n{SENTENCE}"
+    assert documents[conllu_files[1]] == ""
+    assert documents[conllu_files[2]] == f"{SENTENCE}{SENTENCE}"
+
+
+@pytest.mark.en
+def test_split_documents_by_newdoc_id():
+    filepaths = [Path("/tmp/a.txt"), Path("/tmp/b.txt"), Path("/tmp/c.txt")]
+    output = f"# newdoc id = /tmp/a.txt\n{SENTENCE}# newdoc id = /tmp/c.txt\n{SENTENCE}"
+    documents = _split_documents(output, filepaths)
+    assert documents == {
+        filepaths[0]: f"# newdoc id = /tmp/a.txt\n{SENTENCE}",
+        filepaths[2]: f"# newdoc id = /tmp/c.txt\n{SENTENCE}",
+    }
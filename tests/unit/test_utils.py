@@ -0,0 +1,36 @@
+from hashlib import md5
+
+import pytest
+from swegram_main.lib import utils
+from swegram_main.lib.utils import iter_conll_texts, read_conll_file
+
+
+CONLL = (
+    "\n<elev: 1>\n1.1\t1\tEn\n1.1\t2\tmening\n\n1.2\t1\tTvå\n\n\n2.1\t1\tStycke\n# kommentar\n"
+    "<elev: 2; klass: 9>\r\n1.1\t1\tSista\r\n\r\n1.2\t1\trad"
+)
+
+
+@pytest.mark.parametrize("block_size", [3, 1024])
+def test_iter_conll_texts(tmp_path, monkeypatch, block_size):
+    monkeypatch.setattr(utils, "CONLL_BLOCK_SIZE", block_size)
+    filepath = tmp_path.joinpath("text.conll")
+    filepath.write_bytes(CONLL.encode("utf-8"))
+
+    first, second = iter_conll_texts(filepath)
+    assert first.metadata == {"elev": "1"}
+    assert first.paragraphs == [
+        [[("1.1", "1", "En"), ("1.1", "2", "mening")], [("1.2", "1", "Två")]], [[("2.1", "1", "Stycke")]]
+    ]
+    assert first.text_id == md5("1.1\t1\tEn\n1.1\t2\tmening\n1.2\t1\tTvå\n2.1\t1\tStycke\n".encode()).hexdigest()
+    assert second.metadata == {"elev": "2", "klass": "9"}
+    assert second.paragraphs == [[[("1.1", "1", "Sista")], [("1.2", "1", "rad")]]]
+
+    assert read_conll_file(filepath)[1] == ([[["1.1\t1\tSista\n"], ["1.2\t1\trad"]]], second.metadata)
+
+
+def test_iter_conll_texts_too_many_blank_lines(tmp_path):
+    filepath = tmp_path.joinpath("text.conll")
+    filepath.write_text("1.1\t1\tEn\n\n\n\n1.2\t1\tTvå\n", encoding="utf-8")
+    with pytest.raises(utils.ConllFormatError):
+        list(iter_conll_texts(filepath))